@@ -6,17 +6,25 @@ from flask_cors import CORS
 from .config import config_by_name
 from .api import api_bp
 from .admin_routes import admin_routes
+from .services.file_service import UploadRequest
+from .services.counter_buffer import counter_buffer
+from .services.event_bus import event_bus
+from .services.tag_suggest import tag_suggestions
 
 migrate = Migrate()
 jwt = JWTManager()
 
 def create_app(config_name='dev'):
     app = Flask(__name__)
+    app.request_class = UploadRequest
     app.config.from_object(config_by_name[config_name])
 
     db.init_app(app)
     migrate.init_app(app, db)
     jwt.init_app(app)
+    counter_buffer.init_app(app)
+    event_bus.init_app(app)
+    tag_suggestions.init_app(app)
     
     # Configure CORS to allow frontend requests
     CORS(app, resources={
@@ -7,9 +7,18 @@ import uuid
 
 from app.extensions import db
 from app.models import User, Note, Comment, Tag, Course
-from app.models.associations import user_bookmarks
+from app.models.associations import user_bookmarks, note_tags
 from app.utils.admin_auth import admin_required, get_current_admin
-from app.services.file_service import fix_file_path
+from app.services.file_service import resolve_path, release_file, remove_files, compressed_siblings
+from app.services.ocr_cache import ocr_cache
+from app.services import search_index
+from app.services.tags import tags_with_counts
+from app.services.recommendations import remove_note_recommendations
+from app.services.tag_suggest import tag_suggestions
+from app.services.statistics import (
+    adjust_note_stats, adjust_user_stats, note_deleted,
+    note_visibility_changed, user_created, user_deleted, rebuild_statistics
+)
 from .dto import (
     admin_ns, dashboard_stats_model, admin_user_list_model, admin_note_list_model,
     user_action_model, note_action_model, paginated_users_model, paginated_notes_model,
@@ -182,6 +191,7 @@ class AdminUserAction(Resource):
                 message = f'User {user.username} demoted from admin'
             elif action == 'delete':
                 username = user.username
+                user_deleted(user)
                 db.session.delete(user)
                 db.session.commit()
                 return {'message': f'User {username} deleted successfully'}, 200
@@ -289,6 +299,7 @@ class AdminNoteAction(Resource):
             if not note:
                 return {'message': 'Note not found'}, 404
             
+            was_public = note.is_public
             if action == 'hide':
                 note.is_public = False
                 message = f'Note "{note.title}" hidden from public view'
@@ -301,26 +312,25 @@ class AdminNoteAction(Resource):
                 message = f'Note "{note.title}" hidden from public (soft delete)'
             elif action == 'force_delete':
                 # Hard delete with file cleanup
-                import os
-                
                 note_title = note.title
                 files_deleted = []
                 
-                if note.file_path:
-                    corrected_file_path = fix_file_path(note.file_path)
-                    if corrected_file_path and os.path.exists(corrected_file_path):
-                        os.remove(corrected_file_path)
-                        files_deleted.append('original file')
-                
-                if note.markdown_path:
-                    corrected_markdown_path = fix_file_path(note.markdown_path)
-                    if corrected_markdown_path and os.path.exists(corrected_markdown_path):
-                        os.remove(corrected_markdown_path)
-                        files_deleted.append('markdown file')
+                # Shared blobs are only unlinked when their last reference goes
+                orphaned_file_path = release_file(note)
+                corrected_markdown_path = resolve_path(note.markdown_path)
                 
+                search_index.remove_note(note)
+                remove_note_recommendations(note)
+                note_deleted(note)
                 db.session.delete(note)
                 db.session.commit()
                 
+                if remove_files([orphaned_file_path]):
+                    files_deleted.append('original file')
+                if remove_files([corrected_markdown_path]):
+                    files_deleted.append('markdown file')
+                remove_files(compressed_siblings(corrected_markdown_path))
+                
                 return {
                     'message': f'Note "{note_title}" permanently deleted',
                     'files_deleted': files_deleted
@@ -328,6 +338,7 @@ class AdminNoteAction(Resource):
             else:
                 return {'message': 'Invalid action'}, 400
             
+            note_visibility_changed(note, was_public)
             db.session.commit()
             return {'message': message}, 200
         
@@ -356,6 +367,60 @@ class AdminSystemCleanup(Resource):
             return {'message': f'Error during system cleanup: {str(e)}'}, 500
 
 
+@admin_ns.route('/system/ocr-cache')
+class AdminOCRCacheStats(Resource):
+    @admin_ns.doc('get_ocr_cache_stats')
+    @jwt_required()
+    @admin_required
+    def get(self):
+        """Get OCR page cache hit/miss counters and size"""
+        try:
+            return ocr_cache.stats(), 200
+        
+        except Exception as e:
+            return {'message': f'Error retrieving OCR cache stats: {str(e)}'}, 500
+
+
+@admin_ns.route('/system/search-index/rebuild')
+class AdminRebuildSearchIndex(Resource):
+    @admin_ns.doc('rebuild_search_index')
+    @jwt_required()
+    @admin_required
+    def post(self):
+        """Rebuild the full-text search index from all notes and their markdown"""
+        try:
+            indexed = search_index.rebuild_index()
+            db.session.commit()
+            return {
+                'message': f'Search index rebuilt with {indexed} notes',
+                'indexed': indexed
+            }, 200
+        
+        except Exception as e:
+            db.session.rollback()
+            return {'message': f'Error rebuilding search index: {str(e)}'}, 500
+
+
+@admin_ns.route('/system/stats/rebuild')
+class AdminRebuildStatistics(Resource):
+    @admin_ns.doc('rebuild_statistics')
+    @jwt_required()
+    @admin_required
+    def post(self):
+        """Recompute the denormalized note and user counters from the source tables"""
+        try:
+            rebuilt = rebuild_statistics()
+            db.session.commit()
+            return {
+                'message': 'Statistics rebuilt',
+                'rebuilt': rebuilt
+            }, 200
+        
+        except Exception as e:
+            db.session.rollback()
+            return {'message': f'Error rebuilding statistics: {str(e)}'}, 500
+
+
 @admin_ns.route('/analytics/popular-notes')
 class AdminPopularNotes(Resource):
     @admin_ns.doc('get_popular_notes')
@@ -436,6 +501,7 @@ class AdminCreateUser(Resource):
             new_user.set_password(data['password'])
             
             db.session.add(new_user)
+            user_created(new_user)
             db.session.commit()
             
             return {
@@ -473,6 +539,7 @@ class AdminDeleteUser(Resource):
             # Comments will be cascade deleted
             # Bookmarks will be cascade deleted
             
+            user_deleted(user)
             db.session.delete(user)
             db.session.commit()
             
@@ -491,32 +558,30 @@ class AdminDeleteNote(Resource):
     def delete(self, note_id):
         """Permanently delete a note and associated files"""
         try:
-            import os
-            
             note = Note.query.filter_by(public_id=note_id).first()
             if not note:
                 return {'message': 'Note not found'}, 404
             
             note_title = note.title
             
-            # Delete physical files with path correction
+            # Release the shared blob; physical files are removed after commit
             files_deleted = []
-            if note.file_path:
-                corrected_file_path = fix_file_path(note.file_path)
-                if corrected_file_path and os.path.exists(corrected_file_path):
-                    os.remove(corrected_file_path)
-                    files_deleted.append('original file')
-            
-            if note.markdown_path:
-                corrected_markdown_path = fix_file_path(note.markdown_path)
-                if corrected_markdown_path and os.path.exists(corrected_markdown_path):
-                    os.remove(corrected_markdown_path)
-                    files_deleted.append('markdown file')
+            orphaned_file_path = release_file(note)
+            corrected_markdown_path = resolve_path(note.markdown_path)
             
             # Delete from database (comments and bookmarks will cascade)
+            search_index.remove_note(note)
+            remove_note_recommendations(note)
+            note_deleted(note)
             db.session.delete(note)
             db.session.commit()
             
+            if remove_files([orphaned_file_path]):
+                files_deleted.append('original file')
+            if remove_files([corrected_markdown_path]):
+                files_deleted.append('markdown file')
+            remove_files(compressed_siblings(corrected_markdown_path))
+            
             return {
                 'message': f'Note "{note_title}" deleted successfully',
                 'files_deleted': files_deleted
@@ -598,6 +663,8 @@ class AdminCommentAction(Resource):
             if not comment:
                 return {'message': 'Comment not found'}, 404
             
+            adjust_note_stats(comment.note_id, comment_count=-1)
+            adjust_user_stats(comment.user_id, comment_count=-1)
             db.session.delete(comment)
             db.session.commit()
             
@@ -626,15 +693,14 @@ class AdminTagManagement(Resource):
             if search:
                 query = query.filter(Tag.name.contains(search))
             
-            query = query.order_by(Tag.name)
+            query, _ = tags_with_counts(query.order_by(Tag.name))
             
             pagination = query.paginate(
                 page=page, per_page=per_page, error_out=False
             )
             
             tags_data = []
-            for tag in pagination.items:
-                notes_count = len(tag.notes) if tag.notes else 0
+            for tag, notes_count in pagination.items:
                 tags_data.append({
                     'id': tag.id,
                     'name': tag.name,
@@ -674,6 +740,7 @@ class AdminTagManagement(Resource):
             new_tag = Tag(name=data['name'])
             db.session.add(new_tag)
             db.session.commit()
+            tag_suggestions.invalidate()
             
             return {
                 'message': f'Tag "{data["name"]}" created successfully',
@@ -701,6 +768,7 @@ class AdminTagAction(Resource):
             
             db.session.delete(tag)
             db.session.commit()
+            tag_suggestions.invalidate()
             
             return {'message': f'Tag "{tag_name}" deleted successfully'}, 200
         
@@ -852,6 +920,7 @@ class AdminBulkUserActions(Resource):
                     continue
                 
                 if action == 'delete':
+                    user_deleted(user)
                     db.session.delete(user)
                     results.append({'user_id': user_id, 'status': 'deleted'})
                 elif action == 'promote':
@@ -891,6 +960,7 @@ class AdminBulkNoteActions(Resource):
                 return {'message': 'note_ids and action are required'}, 400
             
             results = []
+            orphaned_files = []
             
             for note_id in note_ids:
                 note = Note.query.filter_by(public_id=note_id).first()
@@ -899,29 +969,32 @@ class AdminBulkNoteActions(Resource):
                     continue
                 
                 if action == 'delete':
-                    # Delete physical files with path correction
-                    import os
-                    if note.file_path:
-                        corrected_file_path = fix_file_path(note.file_path)
-                        if corrected_file_path and os.path.exists(corrected_file_path):
-                            os.remove(corrected_file_path)
+                    # Release shared blobs; unreferenced files are removed after commit
+                    orphaned_files.append(release_file(note))
                     if note.markdown_path:
-                        corrected_markdown_path = fix_file_path(note.markdown_path)
-                        if corrected_markdown_path and os.path.exists(corrected_markdown_path):
-                            os.remove(corrected_markdown_path)
+                        orphaned_files.append(resolve_path(note.markdown_path))
+                        orphaned_files.extend(compressed_siblings(resolve_path(note.markdown_path)))
                     
+                    search_index.remove_note(note)
+                    remove_note_recommendations(note)
+                    note_deleted(note)
                     db.session.delete(note)
                     results.append({'note_id': note_id, 'status': 'deleted'})
                 elif action == 'hide':
+                    was_public = note.is_public
                     note.is_public = False
+                    note_visibility_changed(note, was_public)
                     results.append({'note_id': note_id, 'status': 'hidden'})
                 elif action == 'unhide':
+                    was_public = note.is_public
                     note.is_public = True
+                    note_visibility_changed(note, was_public)
                     results.append({'note_id': note_id, 'status': 'unhidden'})
                 else:
                     results.append({'note_id': note_id, 'status': 'invalid_action'})
             
             db.session.commit()
+            remove_files(orphaned_files)
             
             return {
                 'message': f'Bulk action {action} completed',
@@ -955,7 +1028,7 @@ class AdminDatabaseCleanup(Resource):
             
             # Clean up empty tags (tags with no notes)
             empty_tags = Tag.query.filter(~Tag.id.in_(
-                db.session.query(Note.tags.property.local_side)
+                db.session.query(note_tags.c.tag_id)
             )).all()
             
             for tag in empty_tags:
@@ -975,7 +1048,11 @@ class AdminDatabaseCleanup(Resource):
             
             cleanup_results['null_counters_fixed'] = len(null_view_notes) + len(null_download_notes)
             
+            # Counters drifted by anything above (or by edits outside the app) are recomputed
+            cleanup_results['statistics_rebuilt'] = rebuild_statistics()
+            
             db.session.commit()
+            tag_suggestions.invalidate()
             
             return {
                 'message': 'Database cleanup completed',
@@ -5,6 +5,7 @@ from ...models.user import User
 from ... import db
 from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt
 from ...models.blocklist import BlocklistedToken
+from ...services.statistics import user_created
 
 api = AuthDto.api
 _user_register = AuthDto.user_register
@@ -26,6 +27,7 @@ class UserRegister(Resource):
         )
         new_user.set_password(data['password'])
         db.session.add(new_user)
+        user_created(new_user)
         db.session.commit()
         return {'message': 'User registered successfully'}, 201
 
@@ -4,13 +4,22 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from .dto import CourseDto
 from ...models.course import Course
 from ...models.user import User
+from ...models.associations import course_users
+from ...services.recommendations import mark_dirty
+from ...utils.bulk import insert_ignore
 from ... import db
+from sqlalchemy import select
 
 api = CourseDto.api
 _course = CourseDto.course
 _course_create = CourseDto.course_create
 _course_enroll = CourseDto.course_enroll
 
+def _course_ids(codes):
+    """Map of course code -> id for the codes that exist, in one query"""
+    return dict(db.session.execute(select(Course.code, Course.id).where(Course.code.in_(codes))).all())
+
+
 @api.route('')
 class CourseList(Resource):
     @api.marshal_list_with(_course)
@@ -58,25 +67,36 @@ class CourseEnrollment(Resource):
         user = User.query.filter_by(public_id=current_user_public_id).first()
         
         data = request.get_json()
-        course_codes = data['course_codes']
+        course_codes = list(dict.fromkeys(data['course_codes']))
+        
+        # Resolve every code in one query; create the missing courses in one insert
+        course_ids = _course_ids(course_codes)
+        missing = [code for code in course_codes if code not in course_ids]
+        if missing:
+            insert_ignore(Course.__table__, [{'name': f"Course {code}", 'code': code} for code in missing])
+            course_ids.update(_course_ids(missing))
+        # A code whose generated name is taken by another course is skipped by the insert
+        unresolved = [code for code in course_codes if code not in course_ids]
         
-        enrolled_courses = []
-        for code in course_codes:
-            course = Course.query.filter_by(code=code).first()
-            if not course:
-                # Create course if it doesn't exist
-                course = Course(name=f"Course {code}", code=code)
-                db.session.add(course)
-            
-            if course not in user.courses:
-                user.courses.append(course)
-                enrolled_courses.append(code)
+        already_enrolled = set(db.session.scalars(select(course_users.c.course_id).where(
+            course_users.c.user_id == user.id,
+            course_users.c.course_id.in_(course_ids.values())
+        )))
+        enrolled_courses = [code for code in course_codes
+                            if code in course_ids and course_ids[code] not in already_enrolled]
+        insert_ignore(course_users, [{'user_id': user.id, 'course_id': course_ids[code]} for code in enrolled_courses])
         
+        if enrolled_courses:
+            mark_dirty([user.id])
         db.session.commit()
         
+        message = f'Enrolled in {len(enrolled_courses)} course(s)'
+        if unresolved:
+            message += f'; could not create {len(unresolved)} course(s)'
         return {
-            'message': f'Enrolled in {len(enrolled_courses)} course(s)',
-            'courses': enrolled_courses
+            'message': message,
+            'courses': enrolled_courses,
+            'unresolved': unresolved
         }, 200
 
 
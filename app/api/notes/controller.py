@@ -1,4 +1,4 @@
-from flask import request, send_file
+from flask import request, current_app
 from flask_restx import Resource, marshal
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from .dto import NoteDto
@@ -6,10 +6,37 @@ from ...models.note import Note
 from ...models.user import User
 from ...models.comment import Comment
 from ...models.reaction import NoteReaction
-from ...services.file_service import save_file, fix_file_path
-from ...services.ocr_service import ocr_service
+from ...models.recommendation import UserRecommendation
+from ...models.note_page import NotePage
+from ...models.tag import Tag
+from ...models.course import Course
+from ...models.associations import note_tags, note_courses
+from ...services.file_service import (
+    save_file, resolve_path, release_file, remove_files, send_stored_file, stream_stored_file,
+    compressed_siblings, COMPRESSED_SUFFIXES
+)
+from ...services.ocr_queue import enqueue_ocr_job, ocr_status_event
+from ...services.event_bus import event_bus
+from ...services.statistics import (
+    REACTION_TYPES, adjust_reaction_count, adjust_note_stats, adjust_user_stats, reaction_counts,
+    note_statistics, note_created, note_visibility_changed, note_deleted
+)
+from ...services.counter_buffer import counter_buffer
+from ...services import search_index
+from ...services.recommendations import (
+    ensure_fresh, recommended_notes_query, mark_dirty, mark_note_audience_dirty, mark_notes_audience_dirty,
+    remove_note_recommendations
+)
+from ...services.markdown_verifier import record_markdown
+from ...services.tag_suggest import tag_suggestions
 from ...utils.pagination import paginate_query
+from ...utils.query_shaping import shape_query
+from ...utils.http_cache import cache_headers, not_modified
+from ...utils.bulk import insert_ignore, insert_ignore_from_select
 from ... import db
+from sqlalchemy import false, true, select, delete
+import json
+import time
 import logging
 import os
 
@@ -18,6 +45,7 @@ logger = logging.getLogger(__name__)
 api = NoteDto.api
 _note_display = NoteDto.note_display
 _note_paginated = NoteDto.note_paginated
+_note_search_paginated = NoteDto.note_search_paginated
 _note_create = NoteDto.note_create
 _comment = NoteDto.comment
 _comment_create = NoteDto.comment_create
@@ -25,31 +53,65 @@ _reaction_create = NoteDto.reaction_create
 _reaction_summary = NoteDto.reaction_summary
 _collaborator_add = NoteDto.collaborator_add
 _collaborator = NoteDto.collaborator
+_note_bulk_tags = NoteDto.note_bulk_tags
+_note_bulk_courses = NoteDto.note_bulk_courses
+
+# Per bulk request: notes, and tags/courses applied to each of them
+BULK_MAX_NOTES = 1000
+BULK_MAX_TARGETS = 100
+
+
+def _starts_transfer():
+    """Whether the request fetches a file from its start; a viewer's follow-up Range requests aren't counted again"""
+    return request.range is None or request.range.ranges[0][0] == 0
+
+
+def _leading_pages(note):
+    """
+    Markdown of the pages finished so far without a gap, starting at page 1.
+    Pages complete out of order, so a later page is held back until every
+    page before it is done.
+    
+    Returns:
+        tuple: (markdown, number of pages it covers)
+    """
+    pages = []
+    for page in NotePage.query.filter_by(note_id=note.id).order_by(NotePage.page_number):
+        if page.page_number != len(pages) + 1:
+            break
+        pages.append(page.markdown)
+    return "\n".join(markdown for markdown in pages if markdown), len(pages)
+
 
 @api.route('')
 class NoteList(Resource):
+    # Uploads are hashed, size- and type-checked while they stream in (see UploadRequest)
+    spools_uploads = True
+
     @api.doc(params={
         'page': 'Page number (default: 1)',
-        'per_page': 'Items per page (default: 10, max: 100)'
+        'per_page': 'Items per page (default: 10, max: 100)',
+        'cursor': 'Keyset pagination: empty for the first page, then next_cursor (newest first)',
+        'with_total': 'Count the total in cursor mode (default: false)'
     })
     @api.marshal_with(_note_paginated)
     def get(self):
         """List all public notes (paginated)"""
-        query = Note.query.filter_by(is_public=True)
+        query = shape_query(Note.query.filter_by(is_public=True), _note_display)
         return paginate_query(query)
 
     @jwt_required()
     @api.expect(_note_create, validate=True)
     def post(self):
-        """Create a new note with OCR conversion"""
+        """Create a new note and queue it for OCR conversion"""
         args = _note_create.parse_args()
         current_user_public_id = get_jwt_identity()
         user = User.query.filter_by(public_id=current_user_public_id).first()
 
-        # Save the original file (PDF or image)
+        # Save the original file (PDF or image); identical uploads share one blob
         file = args['file']
-        file_path = save_file(file)
-        if not file_path:
+        blob = save_file(file)
+        if not blob:
             return {'message': 'File type not allowed or file save failed'}, 400
 
         # Create the note with 'pending' OCR status
@@ -58,67 +120,62 @@ class NoteList(Resource):
             description=args['description'],
             is_public=args['is_public'],
             owner_id=user.id,
-            file_path=file_path,
+            file_path=blob.path,
+            file_hash=blob.hash,
             ocr_status='pending'
         )
         db.session.add(new_note)
+        db.session.flush()
+        note_created(new_note)
+        search_index.index_note(new_note, body='')
+        mark_note_audience_dirty(new_note)
+
+        # Queue OCR in the same transaction; a worker (worker.py) picks it up
+        enqueue_ocr_job(new_note)
         db.session.commit()
-        
-        # Start OCR conversion asynchronously (or synchronously for now)
-        logger.info(f"Starting OCR conversion for note {new_note.public_id}")
-        
-        try:
-            # Update status to processing
-            new_note.ocr_status = 'processing'
-            db.session.commit()
-            
-            # Convert to markdown using MonkeyOCR
-            output_filename = f"note_{new_note.public_id}"
-            markdown_path = ocr_service.convert_to_markdown(file_path, output_filename)
-            
-            if markdown_path:
-                # Update note with markdown path
-                new_note.markdown_path = markdown_path
-                new_note.ocr_status = 'completed'
-                logger.info(f"OCR conversion completed for note {new_note.public_id}")
-            else:
-                new_note.ocr_status = 'failed'
-                logger.error(f"OCR conversion failed for note {new_note.public_id}")
-            
-            db.session.commit()
-            
-        except Exception as e:
-            logger.error(f"Error during OCR conversion: {str(e)}")
-            new_note.ocr_status = 'failed'
-            db.session.commit()
-        
-        return marshal(new_note, _note_display), 201
+        logger.info(f"Queued OCR conversion for note {new_note.public_id}")
+
+        # 202: the note exists, markdown follows once the worker finishes
+        return marshal(new_note, _note_display), 202
 
 
 @api.route('/search')
 class NoteSearch(Resource):
     @api.doc(params={
-        'q': 'Search query (searches in title and description)',
+        'q': 'Search query (full-text over title, description and OCR markdown, ranked by relevance)',
         'tags': 'Comma-separated tag names',
         'course_id': 'Filter by course ID',
         'is_public': 'Filter by public/private (true/false)',
         'owner': 'Filter by owner username',
         'page': 'Page number (default: 1)',
-        'per_page': 'Items per page (default: 10, max: 100)'
+        'per_page': 'Items per page (default: 10, max: 100)',
+        'cursor': 'Keyset pagination: empty for the first page, then next_cursor',
+        'with_total': 'Count the total in cursor mode (default: false)'
     })
-    @api.marshal_with(_note_paginated)
+    @api.marshal_with(_note_search_paginated)
     def get(self):
         """Search and filter notes (paginated)"""
-        query = Note.query
+        query = shape_query(Note.query, NoteDto.note_search_result)
         
-        # Text search in title and description
+        # Full-text search, best matches first
         search_text = request.args.get('q', '').strip()
+        search_hits = None
+        sort_keys = None
         if search_text:
-            search_pattern = f'%{search_text}%'
-            query = query.filter(
-                (Note.title.ilike(search_pattern)) |
-                (Note.description.ilike(search_pattern))
-            )
+            search_hits = search_index.search_hits(search_text)
+            if search_hits is not None:
+                sort_keys = [(search_hits.c.rank, 'asc'), (Note.id, 'asc')]
+                query = query.join(search_hits, search_hits.c.note_id == Note.id)\
+                    .order_by(search_hits.c.rank, Note.id)
+            elif search_index.is_supported():
+                # Query had no searchable words
+                query = query.filter(false())
+            else:
+                search_pattern = f'%{search_text}%'
+                query = query.filter(
+                    (Note.title.ilike(search_pattern)) |
+                    (Note.description.ilike(search_pattern))
+                )
         
         # Filter by tags
         tag_names = request.args.get('tags', '').strip()
@@ -158,7 +215,12 @@ class NoteSearch(Resource):
         if owner_username:
             query = query.join(Note.owner).filter(User.username == owner_username)
         
-        return paginate_query(query)
+        result = paginate_query(query, sort_keys=sort_keys)
+        if search_hits is not None:
+            snippets = search_index.snippets_for([note.id for note in result['items']], search_text)
+            for note in result['items']:
+                note.snippet = snippets.get(note.id)
+        return result
 
 
 @api.route('/recommended')
@@ -170,7 +232,7 @@ class NoteRecommended(Resource):
     })
     @api.marshal_with(_note_paginated)
     def get(self):
-        """Get personalized note recommendations using multi-strategy algorithm"""
+        """Get personalized note recommendations (precomputed, see services/recommendations.py)"""
         try:
             current_user_public_id = get_jwt_identity()
             user = User.query.filter_by(public_id=current_user_public_id).first()
@@ -178,149 +240,14 @@ class NoteRecommended(Resource):
             if not user:
                 return {'message': 'User not found'}, 404
             
-            from ...models.tag import Tag
-            from ...models.course import Course
-            from ...models.associations import note_tags, user_bookmarks, course_users, note_courses
-            from sqlalchemy import func, distinct
-            from sqlalchemy.orm import joinedload
-            
-            # Build recommendation score
-            scored_notes = {}
-            
-            # Strategy 1: Notes with tags from bookmarked notes (weight: 3)
-            try:
-                # Get tags from bookmarked notes
-                bookmarked_note_ids = db.session.query(user_bookmarks.c.note_id).filter(
-                    user_bookmarks.c.user_id == user.id
-                ).subquery()
-                
-                bookmarked_tag_ids = db.session.query(note_tags.c.tag_id).filter(
-                    note_tags.c.note_id.in_(bookmarked_note_ids)
-                ).distinct().subquery()
-                
-                if db.session.query(bookmarked_tag_ids).first():
-                    # Get notes with similar tags (excluding user's own notes and bookmarked notes)
-                    similar_notes = db.session.query(Note).join(User, Note.owner_id == User.id).join(note_tags).filter(
-                        note_tags.c.tag_id.in_(bookmarked_tag_ids),
-                        Note.is_public == True,
-                        Note.owner_id != user.id,
-                        ~Note.id.in_(bookmarked_note_ids)  # Exclude already bookmarked
-                    ).distinct().all()
-                    
-                    for note in similar_notes:
-                        if note.public_id not in scored_notes:
-                            scored_notes[note.public_id] = {'note': note, 'score': 0}
-                        scored_notes[note.public_id]['score'] += 3
-            except Exception as e:
-                logger.warning(f"Strategy 1 (bookmarked tags) failed: {str(e)}")
-            
-            # Strategy 2: Notes from followed users (weight: 5)
-            try:
-                followed_users = user.following.all()
-                if followed_users:
-                    followed_user_ids = [u.id for u in followed_users]
-                    notes_from_followed = Note.query.join(User, Note.owner_id == User.id).filter(
-                        Note.owner_id.in_(followed_user_ids),
-                        Note.is_public == True
-                    ).all()
-                    
-                    for note in notes_from_followed:
-                        if note.public_id not in scored_notes:
-                            scored_notes[note.public_id] = {'note': note, 'score': 0}
-                        scored_notes[note.public_id]['score'] += 5
-            except Exception as e:
-                logger.warning(f"Strategy 2 (followed users) failed: {str(e)}")
-            
-            # Strategy 3: Notes from user's enrolled courses (weight: 4)
-            try:
-                user_course_ids = db.session.query(course_users.c.course_id).filter(
-                    course_users.c.user_id == user.id
-                ).subquery()
-                
-                if db.session.query(user_course_ids).first():
-                    notes_from_courses = db.session.query(Note).join(User, Note.owner_id == User.id).join(note_courses).filter(
-                        note_courses.c.course_id.in_(user_course_ids),
-                        Note.is_public == True,
-                        Note.owner_id != user.id
-                    ).distinct().all()
-                    
-                    for note in notes_from_courses:
-                        if note.public_id not in scored_notes:
-                            scored_notes[note.public_id] = {'note': note, 'score': 0}
-                        scored_notes[note.public_id]['score'] += 4
-            except Exception as e:
-                logger.warning(f"Strategy 3 (course notes) failed: {str(e)}")
-            
-            # Strategy 4: Popular notes by view count (weight: 1)
-            try:
-                popular_notes = Note.query.join(User, Note.owner_id == User.id).filter(
-                    Note.is_public == True,
-                    Note.owner_id != user.id,
-                    Note.view_count > 0
-                ).order_by(Note.view_count.desc()).limit(20).all()
-                
-                for note in popular_notes:
-                    if note.public_id not in scored_notes:
-                        scored_notes[note.public_id] = {'note': note, 'score': 0}
-                    scored_notes[note.public_id]['score'] += 1
-            except Exception as e:
-                logger.warning(f"Strategy 4 (popular notes) failed: {str(e)}")
-            
-            # Strategy 5: Recently created public notes (weight: 0.5)
-            try:
-                from datetime import datetime, timedelta
-                recent_cutoff = datetime.utcnow() - timedelta(days=7)
-                recent_notes = Note.query.join(User, Note.owner_id == User.id).filter(
-                    Note.is_public == True,
-                    Note.owner_id != user.id,
-                    Note.created_at >= recent_cutoff
-                ).order_by(Note.created_at.desc()).limit(15).all()
-                
-                for note in recent_notes:
-                    if note.public_id not in scored_notes:
-                        scored_notes[note.public_id] = {'note': note, 'score': 0}
-                    scored_notes[note.public_id]['score'] += 0.5
-            except Exception as e:
-                logger.warning(f"Strategy 5 (recent notes) failed: {str(e)}")
-            
-            # Sort by score and extract notes
-            if scored_notes:
-                sorted_recommendations = sorted(
-                    scored_notes.values(),
-                    key=lambda x: (-x['score'], -x['note'].view_count, -x['note'].id)  # Secondary sort by views and ID
-                )
-                recommended_notes = [item['note'] for item in sorted_recommendations]
-            else:
-                # Fallback: return popular public notes if no recommendations
-                recommended_notes = Note.query.join(User, Note.owner_id == User.id).filter(
-                    Note.is_public == True,
-                    Note.owner_id != user.id
-                ).order_by(Note.view_count.desc()).limit(50).all()
-            
-            # Manually paginate the list
-            page = request.args.get('page', 1, type=int)
-            per_page = request.args.get('per_page', 10, type=int)
-            per_page = max(1, min(per_page, 100))
-            page = max(1, page)
-            
-            start = (page - 1) * per_page
-            end = start + per_page
-            
-            total = len(recommended_notes)
-            items = recommended_notes[start:end]
-            pages = (total + per_page - 1) // per_page if total > 0 else 1
-            
-            return {
-                'items': items,
-                'total': total,
-                'pages': pages,
-                'current_page': page,
-                'has_next': page < pages,
-                'has_prev': page > 1
-            }
+            # Served from the precomputed store; recomputed only when stale
+            ensure_fresh(user.id)
+            return paginate_query(shape_query(recommended_notes_query(user.id), _note_display),
+                                  sort_keys=[(UserRecommendation.position, 'asc')])
             
         except Exception as e:
             logger.error(f"Error in recommendations: {str(e)}", exc_info=True)
+            db.session.rollback()
             # Return fallback recommendations
             try:
                 fallback_notes = Note.query.join(User, Note.owner_id == User.id).filter(
@@ -346,6 +273,138 @@ class NoteRecommended(Resource):
                 }
 
 
+def _bulk_values(data, key, limit):
+    """De-duplicated, stripped strings of a bulk request list; aborts with 400 if malformed or too long"""
+    values = data.get(key)
+    if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+        api.abort(400, f'{key} must be a list of strings')
+    values = list(dict.fromkeys(v.strip() for v in values if v.strip()))
+    if len(values) > limit:
+        api.abort(400, f'{key} takes at most {limit} entries')
+    return values
+
+
+def _bulk_notes(public_ids, user):
+    """
+    Resolve the notes of a bulk request with one query.
+    
+    Returns:
+        tuple: (ids of notes the user owns, or all found for admins;
+        public ids not found; public ids of notes the user may not change)
+    """
+    rows = db.session.query(Note.id, Note.public_id, Note.owner_id).filter(Note.public_id.in_(public_ids)).all()
+    found = {row.public_id for row in rows}
+    allowed = [row.id for row in rows if row.owner_id == user.id or user.is_admin]
+    forbidden = [row.public_id for row in rows if row.owner_id != user.id and not user.is_admin]
+    return allowed, [pid for pid in public_ids if pid not in found], forbidden
+
+
+def _bulk_link(link_column, target_id, note_ids, target_ids, action):
+    """
+    Attach every target to every note with one INSERT ... SELECT that skips
+    existing links, or detach them with one DELETE. The caller commits.
+    
+    Args:
+        link_column: note_tags.c.tag_id or note_courses.c.course_id
+        target_id: Tag.id or Course.id
+        note_ids, target_ids (list): Primary keys
+        action (str): 'attach' or 'detach'
+    
+    Returns:
+        int: Links added or removed
+    """
+    if not note_ids or not target_ids:
+        return 0
+    link_table = link_column.table
+    if action == 'attach':
+        pairs = select(Note.id, target_id).select_from(
+            Note.__table__.join(target_id.table, true())
+        ).where(Note.id.in_(note_ids), target_id.in_(target_ids))
+        return insert_ignore_from_select(link_table, ['note_id', link_column.name], pairs)
+    return db.session.execute(delete(link_table).where(
+        link_table.c.note_id.in_(note_ids), link_column.in_(target_ids)
+    )).rowcount
+
+
+def _bulk_request(targets_key):
+    """
+    Parse a bulk attach/detach request; aborts with 400 if malformed.
+    
+    Returns:
+        tuple: (action, note public ids, target strings under ``targets_key``, current user)
+    """
+    data = request.get_json()
+    action = data.get('action', 'attach')
+    if action not in ('attach', 'detach'):
+        api.abort(400, 'action must be attach or detach')
+    note_ids = _bulk_values(data, 'note_ids', BULK_MAX_NOTES)
+    targets = _bulk_values(data, targets_key, BULK_MAX_TARGETS)
+    user = User.query.filter_by(public_id=get_jwt_identity()).first()
+    return action, note_ids, targets, user
+
+
+@api.route('/bulk/tags')
+class NoteBulkTags(Resource):
+    @jwt_required()
+    @api.expect(_note_bulk_tags, validate=True)
+    def post(self):
+        """Attach or detach tags on many notes at once (owners, or admins for any note)"""
+        action, note_ids, names, user = _bulk_request('tags')
+        names = list(dict.fromkeys(name.lower() for name in names))
+        if any(len(name) > 50 for name in names):
+            return {'message': 'Tag names are at most 50 characters'}, 400
+        
+        allowed, missing, forbidden = _bulk_notes(note_ids, user)
+        if action == 'attach' and allowed:
+            insert_ignore(Tag.__table__, [{'name': name} for name in names])
+        tag_ids = [tag_id for tag_id, in db.session.query(Tag.id).filter(Tag.name.in_(names))]
+        if action == 'detach' and tag_ids:
+            # Audiences are resolved through the links, so before they are deleted
+            mark_notes_audience_dirty(allowed)
+        changed = _bulk_link(note_tags.c.tag_id, Tag.id, allowed, tag_ids, action)
+        if action == 'attach' and changed:
+            mark_notes_audience_dirty(allowed)
+        db.session.commit()
+        tag_suggestions.invalidate()
+        
+        return {
+            'message': f'{changed} tag links {"added" if action == "attach" else "removed"}',
+            'changed': changed,
+            'notes': len(allowed),
+            'missing_notes': missing,
+            'forbidden_notes': forbidden
+        }, 200
+
+
+@api.route('/bulk/courses')
+class NoteBulkCourses(Resource):
+    @jwt_required()
+    @api.expect(_note_bulk_courses, validate=True)
+    def post(self):
+        """Attach or detach courses on many notes at once (owners, or admins for any note)"""
+        action, note_ids, codes, user = _bulk_request('course_codes')
+        
+        allowed, missing, forbidden = _bulk_notes(note_ids, user)
+        courses = db.session.query(Course.id, Course.code).filter(Course.code.in_(codes)).all()
+        known = {course.code for course in courses}
+        if action == 'detach' and courses:
+            # Audiences are resolved through the links, so before they are deleted
+            mark_notes_audience_dirty(allowed)
+        changed = _bulk_link(note_courses.c.course_id, Course.id, allowed, [course.id for course in courses], action)
+        if action == 'attach' and changed:
+            mark_notes_audience_dirty(allowed)
+        db.session.commit()
+        
+        return {
+            'message': f'{changed} course links {"added" if action == "attach" else "removed"}',
+            'changed': changed,
+            'notes': len(allowed),
+            'missing_notes': missing,
+            'forbidden_notes': forbidden,
+            'unknown_courses': [code for code in codes if code not in known]
+        }, 200
+
+
 @api.route('/<public_id>')
 @api.param('public_id', 'The note identifier')
 class NoteDetail(Resource):
@@ -358,12 +417,8 @@ class NoteDetail(Resource):
             # For now, just return 403 if private
             return {'message': 'Access forbidden'}, 403
         
-        # Increment view count
-        if note.view_count is None:
-            note.view_count = 1
-        else:
-            note.view_count += 1
-        db.session.commit()
+        # Increment view count (buffered, flushed in batches)
+        counter_buffer.increment(note.id, 'view_count')
         
         return note
 
@@ -380,7 +435,12 @@ class NoteDetail(Resource):
         data = request.get_json()
         note.title = data.get('title', note.title)
         note.description = data.get('description', note.description)
+        was_public = note.is_public
         note.is_public = data.get('is_public', note.is_public)
+        search_index.index_note(note)
+        if note.is_public != was_public:
+            mark_note_audience_dirty(note)
+            note_visibility_changed(note, was_public)
         db.session.commit()
         return marshal(note, _note_display)
 
@@ -397,13 +457,18 @@ class NoteDetail(Resource):
         
         logger.info(f"User {user.username} (admin: {user.is_admin}) deleting note {public_id}: {note.title}")
         
-        # Optional: delete file from filesystem
-        # import os
-        # if os.path.exists(note.file_path):
-        #     os.remove(note.file_path)
+        # Drop the note's blob reference; files go once nothing else uses them
+        orphaned_files = [release_file(note)]
+        if note.markdown_path:
+            orphaned_files.append(resolve_path(note.markdown_path))
+            orphaned_files.extend(compressed_siblings(resolve_path(note.markdown_path)))
 
+        search_index.remove_note(note)
+        remove_note_recommendations(note)
+        note_deleted(note)
         db.session.delete(note)
         db.session.commit()
+        remove_files(orphaned_files)
         return '', 204
 
 
@@ -431,6 +496,8 @@ class NoteComments(Resource):
             note_id=note.id
         )
         db.session.add(new_comment)
+        adjust_note_stats(note.id, comment_count=1)
+        adjust_user_stats(user.id, comment_count=1)
         db.session.commit()
         
         return marshal(new_comment, _comment), 201
@@ -451,9 +518,8 @@ class NoteReactions(Resource):
         reaction_type = data['reaction_type']
         
         # Validate reaction type
-        valid_reactions = ['concise', 'detailed', 'readable']
-        if reaction_type not in valid_reactions:
-            return {'message': f'Invalid reaction type. Must be one of: {", ".join(valid_reactions)}'}, 400
+        if reaction_type not in REACTION_TYPES:
+            return {'message': f'Invalid reaction type. Must be one of: {", ".join(REACTION_TYPES)}'}, 400
         
         # Check if user already reacted with this type
         existing_reaction = NoteReaction.query.filter_by(
@@ -465,7 +531,7 @@ class NoteReactions(Resource):
         if existing_reaction:
             # Toggle: remove the reaction
             db.session.delete(existing_reaction)
-            db.session.commit()
+            delta = -1
             message = f'Reaction "{reaction_type}" removed'
         else:
             # Add new reaction
@@ -475,19 +541,17 @@ class NoteReactions(Resource):
                 reaction_type=reaction_type
             )
             db.session.add(new_reaction)
-            db.session.commit()
+            delta = 1
             message = f'Reaction "{reaction_type}" added'
         
-        # Get reaction counts
-        reaction_counts = {
-            'concise': NoteReaction.query.filter_by(note_id=note.id, reaction_type='concise').count(),
-            'detailed': NoteReaction.query.filter_by(note_id=note.id, reaction_type='detailed').count(),
-            'readable': NoteReaction.query.filter_by(note_id=note.id, reaction_type='readable').count()
-        }
+        # Counter moves in the same transaction as the reaction row
+        db.session.flush()
+        adjust_reaction_count(note.id, reaction_type, delta)
+        db.session.commit()
         
         return {
             'message': message,
-            'reactions': reaction_counts
+            'reactions': reaction_counts(note.id)
         }, 200
     
     @api.marshal_with(_reaction_summary)
@@ -495,13 +559,7 @@ class NoteReactions(Resource):
         """Get reaction counts for a note"""
         note = Note.query.filter_by(public_id=public_id).first_or_404()
         
-        reaction_counts = {
-            'concise': NoteReaction.query.filter_by(note_id=note.id, reaction_type='concise').count(),
-            'detailed': NoteReaction.query.filter_by(note_id=note.id, reaction_type='detailed').count(),
-            'readable': NoteReaction.query.filter_by(note_id=note.id, reaction_type='readable').count()
-        }
-        
-        return reaction_counts
+        return reaction_counts(note.id)
 
 
 @api.route('/<public_id>/collaborators')
@@ -540,6 +598,7 @@ class NoteCollaborators(Resource):
             return {'message': 'Cannot add note owner as collaborator'}, 400
         
         note.collaborators.append(collaborator)
+        adjust_note_stats(note.id, collaborator_count=1)
         db.session.commit()
         
         return marshal(collaborator, _collaborator), 201
@@ -560,28 +619,37 @@ class NoteMarkdown(Resource):
             logger.info(f"Note {public_id} OCR is pending")
             return {'message': 'OCR conversion is pending', 'status': 'pending'}, 202
         elif note.ocr_status == 'processing':
-            logger.info(f"Note {public_id} OCR is processing")
-            return {'message': 'OCR conversion is in progress', 'status': 'processing'}, 202
+            logger.info(f"Note {public_id} OCR is processing ({note.pages_done}/{note.pages_total} pages)")
+            response = {
+                'message': 'OCR conversion is in progress',
+                'status': 'processing',
+                'pages_done': note.pages_done,
+                'pages_total': note.pages_total
+            }
+            if note.pages_done:
+                # Serve what is readable so far: the finished pages from page 1 on
+                markdown, pages_available = _leading_pages(note)
+                if pages_available:
+                    response.update({'markdown': markdown, 'pages_available': pages_available})
+            return response, 202
         elif note.ocr_status == 'failed':
             logger.warning(f"Note {public_id} OCR failed")
             return {'message': 'OCR conversion failed', 'status': 'failed'}, 500
         
-        # Check if markdown file exists with path correction
         if not note.markdown_path:
             logger.warning(f"Note {public_id} has no markdown path")
             return {'message': 'Markdown file not found', 'status': 'not_found'}, 404
         
-        logger.info(f"Note {public_id} markdown path: {note.markdown_path}")
-        corrected_path = fix_file_path(note.markdown_path)
-        logger.info(f"Corrected markdown path: {corrected_path}")
-        
-        if not corrected_path or not os.path.exists(corrected_path):
-            logger.error(f"Markdown file does not exist: {corrected_path}")
-            return {'message': 'Markdown file not found', 'status': 'not_found'}, 404
+        # Revalidation against the stored checksum doesn't read the file
+        validators = (note.markdown_checksum, note.markdown_modified_at, note.is_public)
+        cached = not_modified(*validators)
+        if cached:
+            return cached
         
         # Read and return markdown content
+        markdown_file = resolve_path(note.markdown_path)
         try:
-            with open(corrected_path, 'r', encoding='utf-8') as f:
+            with open(markdown_file, 'r', encoding='utf-8') as f:
                 markdown_content = f.read()
             
             logger.info(f"Successfully loaded markdown for {public_id}, length: {len(markdown_content)}")
@@ -589,12 +657,55 @@ class NoteMarkdown(Resource):
                 'status': 'completed',
                 'markdown': markdown_content,
                 'file_path': note.markdown_path
-            }, 200
+            }, 200, cache_headers(*validators)
+        except FileNotFoundError:
+            logger.error(f"Markdown file does not exist: {markdown_file}")
+            return {'message': 'Markdown file not found', 'status': 'not_found'}, 404
         except Exception as e:
             logger.error(f"Error reading markdown file: {str(e)}")
             return {'message': 'Error reading markdown file', 'status': 'error'}, 500
 
 
+@api.route('/<public_id>/markdown/raw')
+@api.param('public_id', 'The note identifier')
+class NoteMarkdownRaw(Resource):
+    @api.produces(['text/markdown'])
+    def get(self, public_id):
+        """Stream the markdown of a note as text/markdown, brotli/gzip compressed when accepted"""
+        note = Note.query.filter_by(public_id=public_id).first_or_404()
+        
+        if note.ocr_status in ('pending', 'processing'):
+            return {'message': f'OCR conversion is {note.ocr_status}', 'status': note.ocr_status}, 202
+        if note.has_markdown and note.markdown_verified_at is None:
+            # Converted before checksums were stored: record them now so the ETag is real
+            record_markdown(note)
+            db.session.commit()
+        if not note.has_markdown:
+            return {'message': 'Markdown file not found', 'status': 'not_found'}, 404
+        
+        # Precompressed copies are written at OCR completion; the first one the
+        # client accepts and that exists on disk is sent as is
+        codings = [(coding, suffix) for coding, suffix in COMPRESSED_SUFFIXES
+                   if request.accept_encodings[coding]]
+        for coding, suffix in codings + [('identity', '')]:
+            # Each content coding is a different representation with its own ETag
+            validators = (f"{note.markdown_checksum}{suffix}", note.markdown_modified_at, note.is_public)
+            response = not_modified(*validators)
+            if response is None:
+                try:
+                    response = stream_stored_file(f"{note.markdown_path}{suffix}", 'text/markdown')
+                except FileNotFoundError:
+                    continue
+                response.headers.update(cache_headers(*validators))
+                if suffix:
+                    response.headers['Content-Encoding'] = coding
+            response.vary.add('Accept-Encoding')
+            return response
+        
+        logger.error(f"Markdown file does not exist: {note.markdown_path}")
+        return {'message': 'Markdown file not found', 'status': 'not_found'}, 404
+
+
 @api.route('/<public_id>/markdown/status')
 @api.param('public_id', 'The note identifier')
 class NoteMarkdownStatus(Resource):
@@ -611,7 +722,8 @@ class NoteMarkdownStatus(Resource):
         }
         
         if note.markdown_path:
-            corrected_path = fix_file_path(note.markdown_path)
+            # Diagnostic endpoint: the only place that checks the disk on request
+            corrected_path = resolve_path(note.markdown_path)
             status_info['corrected_path'] = corrected_path
             status_info['file_exists'] = os.path.exists(corrected_path) if corrected_path else False
             
@@ -637,25 +749,26 @@ class NoteFileAccess(Resource):
         if not note.file_path:
             return {'message': 'File not found'}, 404
         
-        # Fix file path and normalize separators for cross-platform compatibility
-        corrected_path = fix_file_path(note.file_path)
-        
-        if not corrected_path or not os.path.exists(corrected_path):
-            return {'message': 'File not found'}, 404
-        
-        # Increment view count (not download count for viewing)
-        if note.view_count is None:
-            note.view_count = 1
-        else:
-            note.view_count += 1
-        db.session.commit()
+        validators = (note.file_hash, note.created_at, note.is_public)
+        response = not_modified(*validators)
+        if response is None:
+            # Return file for viewing (not as attachment); a missing file surfaces on open
+            try:
+                response = send_stored_file(
+                    note.file_path,
+                    as_attachment=False,  # Allow inline viewing
+                    download_name=f"{note.title}.{note.file_path.split('.')[-1]}",
+                    etag=note.file_hash or True,
+                    last_modified=note.created_at
+                )
+            except FileNotFoundError:
+                return {'message': 'File not found'}, 404
+            response.headers.update(cache_headers(*validators))
         
-        # Return file for viewing (not as attachment)
-        return send_file(
-            corrected_path,
-            as_attachment=False,  # Allow inline viewing
-            download_name=f"{note.title}.{note.file_path.split('.')[-1]}"
-        )
+        # Increment view count (not download count for viewing; buffered)
+        if _starts_transfer():
+            counter_buffer.increment(note.id, 'view_count')
+        return response
 
 
 @api.route('/<public_id>/download/original')
@@ -668,24 +781,25 @@ class NoteOriginalDownload(Resource):
         if not note.file_path:
             return {'message': 'Original file not found'}, 404
         
-        # Fix file path and normalize separators for cross-platform compatibility
-        corrected_path = fix_file_path(note.file_path)
-        
-        if not corrected_path or not os.path.exists(corrected_path):
-            return {'message': 'Original file not found'}, 404
-        
-        # Increment download count
-        if note.download_count is None:
-            note.download_count = 1
-        else:
-            note.download_count += 1
-        db.session.commit()
+        validators = (note.file_hash, note.created_at, note.is_public)
+        response = not_modified(*validators)
+        if response is None:
+            try:
+                response = send_stored_file(
+                    note.file_path,
+                    as_attachment=True,
+                    download_name=f"{note.title}_original.{note.file_path.split('.')[-1]}",
+                    etag=note.file_hash or True,
+                    last_modified=note.created_at
+                )
+            except FileNotFoundError:
+                return {'message': 'Original file not found'}, 404
+            response.headers.update(cache_headers(*validators))
         
-        return send_file(
-            corrected_path,
-            as_attachment=True,
-            download_name=f"{note.title}_original.{note.file_path.split('.')[-1]}"
-        )
+        # Increment download count (buffered, flushed in batches)
+        if _starts_transfer():
+            counter_buffer.increment(note.id, 'download_count')
+        return response
 
 
 @api.route('/<public_id>/download/markdown')
@@ -698,24 +812,25 @@ class NoteMarkdownDownload(Resource):
         if note.ocr_status != 'completed' or not note.markdown_path:
             return {'message': 'Markdown file not available'}, 404
         
-        # Fix file path and normalize separators for cross-platform compatibility
-        corrected_path = fix_file_path(note.markdown_path)
-        
-        if not corrected_path or not os.path.exists(corrected_path):
-            return {'message': 'Markdown file not found'}, 404
-        
-        # Increment download count
-        if note.download_count is None:
-            note.download_count = 1
-        else:
-            note.download_count += 1
-        db.session.commit()
+        validators = (note.markdown_checksum, note.markdown_modified_at, note.is_public)
+        response = not_modified(*validators)
+        if response is None:
+            try:
+                response = send_stored_file(
+                    note.markdown_path,
+                    as_attachment=True,
+                    download_name=f"{note.title}.md",
+                    etag=note.markdown_checksum or True,
+                    last_modified=note.markdown_modified_at
+                )
+            except FileNotFoundError:
+                return {'message': 'Markdown file not found'}, 404
+            response.headers.update(cache_headers(*validators))
         
-        return send_file(
-            corrected_path,
-            as_attachment=True,
-            download_name=f"{note.title}.md"
-        )
+        # Increment download count (buffered, flushed in batches)
+        if _starts_transfer():
+            counter_buffer.increment(note.id, 'download_count')
+        return response
 
 
 @api.route('/<public_id>/ocr-status')
@@ -729,11 +844,75 @@ class NoteOCRStatus(Resource):
             'public_id': note.public_id,
             'title': note.title,
             'ocr_status': note.ocr_status,
+            'pages_done': note.pages_done,
+            'pages_total': note.pages_total,
             'has_markdown': note.markdown_path is not None,
             'markdown_path': note.markdown_path
         }, 200
 
 
+@api.route('/<public_id>/ocr-status/stream')
+@api.param('public_id', 'The note identifier')
+class NoteOCRStatusStream(Resource):
+    @api.produces(['text/event-stream'])
+    def get(self, public_id):
+        """
+        Server-sent events with the OCR status and page progress of a note, until conversion ends
+
+        Each change is an ``ocr-status`` event. When conversion has completed or
+        failed the stream sends a final ``end`` event and closes; clients must call
+        ``EventSource.close()`` on it, otherwise they reconnect after its long
+        ``retry`` delay. A stream cut at SSE_MAX_DURATION sends no ``end`` event,
+        so EventSource reconnects and picks up a fresh snapshot.
+        """
+        # Subscribe before reading the note, so no change falls between the snapshot and the stream
+        subscription = event_bus.subscribe(public_id)
+        note = Note.query.filter_by(public_id=public_id).first()
+        if not note:
+            subscription.close()
+            return {'message': 'Note not found'}, 404
+        
+        stream = _ocr_event_stream(
+            subscription, ocr_status_event(note),
+            current_app.config['SSE_HEARTBEAT_INTERVAL'], current_app.config['SSE_MAX_DURATION'],
+            current_app.config['SSE_END_RETRY']
+        )
+        # The generator never touches the database: the session is released
+        # when this view returns, not held for the life of the stream
+        return current_app.response_class(stream, mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Don't let nginx buffer the stream
+        })
+
+
+def _ocr_event_stream(subscription, snapshot, heartbeat, max_duration, end_retry):
+    """Yield SSE frames: the current state, then every change until OCR ends or max_duration passes"""
+    with subscription:
+        yield _sse_frame(snapshot)
+        status = snapshot['ocr_status']
+        deadline = time.monotonic() + max_duration
+        while status not in ('completed', 'failed'):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # EventSource reconnects and gets a fresh snapshot
+                break
+            event = subscription.get(timeout=min(heartbeat, remaining))
+            if event is None:
+                # Comment line, keeps proxies from closing an idle connection
+                yield ': keep-alive\n\n'
+                continue
+            status = event['ocr_status']
+            yield _sse_frame(event)
+        if status in ('completed', 'failed'):
+            # Nothing more will change: tell the client to close, and push back the
+            # reconnect of a client that ignores this so it doesn't poll forever
+            yield f"retry: {end_retry * 1000}\n" + _sse_frame({'ocr_status': status}, 'end')
+
+
+def _sse_frame(event, name='ocr-status'):
+    return f"event: {name}\ndata: {json.dumps(event)}\n\n"
+
+
 @api.route('/<public_id>/bookmark')
 @api.param('public_id', 'The note identifier')
 class NoteBookmark(Resource):
@@ -749,6 +928,9 @@ class NoteBookmark(Resource):
             return {'message': 'Note already bookmarked'}, 400
         
         user.bookmarked_notes.append(note)
+        mark_dirty([user.id])
+        adjust_note_stats(note.id, bookmark_count=1)
+        adjust_user_stats(user.id, bookmark_count=1)
         db.session.commit()
         
         return {'message': 'Note bookmarked successfully'}, 201
@@ -765,6 +947,9 @@ class NoteBookmark(Resource):
             return {'message': 'Note not bookmarked'}, 400
         
         user.bookmarked_notes.remove(note)
+        mark_dirty([user.id])
+        adjust_note_stats(note.id, bookmark_count=-1)
+        adjust_user_stats(user.id, bookmark_count=-1)
         db.session.commit()
         
         return {'message': 'Bookmark removed successfully'}, 200
@@ -776,18 +961,16 @@ class NoteStats(Resource):
     def get(self, public_id):
         """Get statistics for a note"""
         note = Note.query.filter_by(public_id=public_id).first_or_404()
+        stats = note_statistics(note.id)
         
         return {
             'public_id': note.public_id,
             'title': note.title,
-            'view_count': note.view_count,
-            'download_count': note.download_count,
-            'comment_count': len(note.comments),
-            'collaborator_count': len(note.collaborators),
-            'bookmark_count': len(note.bookmarked_by),
-            'reaction_counts': {
-                'concise': sum(1 for r in note.reactions if r.reaction_type == 'concise'),
-                'detailed': sum(1 for r in note.reactions if r.reaction_type == 'detailed'),
-                'readable': sum(1 for r in note.reactions if r.reaction_type == 'readable')
-            }
+            # Include increments that haven't been flushed yet
+            'view_count': (note.view_count or 0) + counter_buffer.pending(note.id, 'view_count'),
+            'download_count': (note.download_count or 0) + counter_buffer.pending(note.id, 'download_count'),
+            'comment_count': stats['comment_count'],
+            'collaborator_count': stats['collaborator_count'],
+            'bookmark_count': stats['bookmark_count'],
+            'reaction_counts': {t: stats[f'{t}_count'] for t in REACTION_TYPES}
         }, 200
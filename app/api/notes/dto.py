@@ -26,7 +26,22 @@ class NoteDto:
         'pages': fields.Integer(description='Total number of pages'),
         'current_page': fields.Integer(description='Current page number'),
         'has_next': fields.Boolean(description='Whether there is a next page'),
-        'has_prev': fields.Boolean(description='Whether there is a previous page')
+        'has_prev': fields.Boolean(description='Whether there is a previous page'),
+        'next_cursor': fields.String(description='Cursor for the next page (cursor mode only)')
+    })
+
+    note_search_result = api.inherit('NoteSearchResult', note_display, {
+        'snippet': fields.String(description='Matching excerpt with hits wrapped in <mark> tags')
+    })
+    
+    note_search_paginated = api.model('NoteSearchPaginated', {
+        'items': fields.List(fields.Nested(note_search_result)),
+        'total': fields.Integer(description='Total number of items'),
+        'pages': fields.Integer(description='Total number of pages'),
+        'current_page': fields.Integer(description='Current page number'),
+        'has_next': fields.Boolean(description='Whether there is a next page'),
+        'has_prev': fields.Boolean(description='Whether there is a previous page'),
+        'next_cursor': fields.String(description='Cursor for the next page (cursor mode only)')
     })
 
     note_create = api.parser()
@@ -62,6 +77,19 @@ class NoteDto:
         'readable': fields.Integer(description='Number of readable reactions')
     })
     
+    # Bulk tag/course attachment DTOs
+    note_bulk_tags = api.model('NoteBulkTags', {
+        'note_ids': fields.List(fields.String, required=True, description='Public ids of the notes'),
+        'tags': fields.List(fields.String, required=True, description='Tag names; missing tags are created when attaching'),
+        'action': fields.String(description='attach (default) or detach', enum=['attach', 'detach'])
+    })
+    
+    note_bulk_courses = api.model('NoteBulkCourses', {
+        'note_ids': fields.List(fields.String, required=True, description='Public ids of the notes'),
+        'course_codes': fields.List(fields.String, required=True, description='Course codes'),
+        'action': fields.String(description='attach (default) or detach', enum=['attach', 'detach'])
+    })
+    
     # Collaborator DTOs
     collaborator_add = api.model('CollaboratorAdd', {
         'username': fields.String(required=True, description='Username of user to add as collaborator')
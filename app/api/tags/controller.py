@@ -1,9 +1,16 @@
 from flask import request
 from flask_restx import Namespace, Resource, fields
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
+from sqlalchemy import or_, select
 from app.models.tag import Tag
 from app.models.note import Note
+from app.models.user import User
+from app.models.associations import note_tags
 from app.extensions import db
+from app.utils.pagination import paginate_query
+from app.utils.query_shaping import shape_query
+from app.services.tags import tags_with_counts, popular_tags, tag_note_count
+from app.services.tag_suggest import tag_suggestions
 import logging
 
 logger = logging.getLogger(__name__)
@@ -19,10 +26,52 @@ tag_dto = api.model('Tag', {
     'created_at': fields.DateTime(readonly=True, description='Creation timestamp')
 })
 
+tag_note_dto = api.model('TagNote', {
+    'public_id': fields.String(description='Note public id'),
+    'title': fields.String(description='Note title'),
+    'description': fields.String(description='Note description'),
+    'is_public': fields.Boolean(description='Is note public'),
+    'view_count': fields.Integer(description='Number of views'),
+    'created_at': fields.DateTime(description='Creation timestamp'),
+    'owner': fields.Nested(api.model('TagNoteOwner', {
+        'public_id': fields.String(description='Owner public id'),
+        'username': fields.String(description='Owner username')
+    }))
+})
+
+tag_notes_dto = api.model('TagNotesPage', {
+    'tag': fields.Nested(api.model('TagRef', {
+        'id': fields.Integer(description='Tag ID'),
+        'name': fields.String(description='Tag name')
+    })),
+    'notes': fields.List(fields.Nested(tag_note_dto)),
+    'total': fields.Integer(description='Notes visible to the caller (omitted in cursor mode unless with_total)'),
+    'pages': fields.Integer(description='Total number of pages'),
+    'current_page': fields.Integer(description='Current page number'),
+    'has_next': fields.Boolean(description='Whether there is a next page'),
+    'has_prev': fields.Boolean(description='Whether there is a previous page'),
+    'next_cursor': fields.String(description='Cursor for the next page (cursor mode only)')
+})
+
+tag_suggestion_dto = api.model('TagSuggestion', {
+    'id': fields.Integer(description='Tag ID'),
+    'name': fields.String(description='Tag name'),
+    'note_count': fields.Integer(description='Number of notes with this tag')
+})
+
 tag_input_dto = api.model('TagInput', {
     'name': fields.String(required=True, description='Tag name', min_length=1, max_length=50)
 })
 
+
+def _tag_data(tag, note_count):
+    return {
+        'id': tag.id,
+        'name': tag.name,
+        'note_count': note_count,
+        'created_at': tag.created_at
+    }
+
 # Routes
 @api.route('/')
 class TagList(Resource):
@@ -30,13 +79,8 @@ class TagList(Resource):
     @api.marshal_list_with(tag_dto)
     def get(self):
         """List all tags"""
-        tags = Tag.query.all()
-        return [{
-            'id': tag.id,
-            'name': tag.name,
-            'note_count': len(tag.notes),
-            'created_at': tag.created_at
-        } for tag in tags]
+        query, _ = tags_with_counts()
+        return [_tag_data(tag, note_count) for tag, note_count in query.all()]
     
     @api.doc('create_tag', description='Create a new tag')
     @api.expect(tag_input_dto)
@@ -53,26 +97,17 @@ class TagList(Resource):
         # Check if tag already exists
         existing_tag = Tag.query.filter_by(name=tag_name).first()
         if existing_tag:
-            return {
-                'id': existing_tag.id,
-                'name': existing_tag.name,
-                'note_count': len(existing_tag.notes),
-                'created_at': existing_tag.created_at
-            }, 200
+            return _tag_data(existing_tag, tag_note_count(existing_tag.id)), 200
         
         # Create new tag
         tag = Tag(name=tag_name)
         db.session.add(tag)
         db.session.commit()
+        tag_suggestions.invalidate()
         
         logger.info(f"Tag created: {tag.name}")
         
-        return {
-            'id': tag.id,
-            'name': tag.name,
-            'note_count': 0,
-            'created_at': tag.created_at
-        }, 201
+        return _tag_data(tag, 0), 201
 
 
 @api.route('/<int:tag_id>')
@@ -84,12 +119,7 @@ class TagResource(Resource):
     def get(self, tag_id):
         """Get a specific tag"""
         tag = Tag.query.get_or_404(tag_id)
-        return {
-            'id': tag.id,
-            'name': tag.name,
-            'note_count': len(tag.notes),
-            'created_at': tag.created_at
-        }
+        return _tag_data(tag, tag_note_count(tag.id))
     
     @api.doc('delete_tag', description='Delete a tag')
     @api.response(204, 'Tag deleted')
@@ -99,6 +129,7 @@ class TagResource(Resource):
         tag = Tag.query.get_or_404(tag_id)
         db.session.delete(tag)
         db.session.commit()
+        tag_suggestions.invalidate()
         
         logger.info(f"Tag deleted: {tag.name}")
         
@@ -109,62 +140,62 @@ class TagResource(Resource):
 @api.param('tag_id', 'Tag identifier')
 @api.response(404, 'Tag not found')
 class TagNotes(Resource):
-    @api.doc('get_tag_notes', description='Get all notes with this tag')
+    @api.doc('get_tag_notes', description='Get the notes with this tag, newest first', params={
+        'page': 'Page number (default: 1)',
+        'per_page': 'Items per page (default: 10, max: 100)',
+        'cursor': 'Keyset pagination: empty for the first page, then next_cursor',
+        'with_total': 'Count the total in cursor mode (default: false)'
+    })
+    @api.marshal_with(tag_notes_dto)
     def get(self, tag_id):
-        """Get all notes with a specific tag"""
+        """Get the notes with a specific tag: public ones, plus the caller's own"""
         tag = Tag.query.get_or_404(tag_id)
         
         # Get current user if authenticated
         try:
-            current_user_id = get_jwt_identity()
-        except:
-            current_user_id = None
+            verify_jwt_in_request(optional=True)
+            current_user_public_id = get_jwt_identity()
+        except Exception:
+            current_user_public_id = None
+        
+        visible = Note.is_public == True
+        if current_user_public_id:
+            visible = or_(visible, Note.owner_id == select(User.id).where(
+                User.public_id == current_user_public_id
+            ).scalar_subquery())
         
-        # Filter notes based on visibility
-        notes = []
-        for note in tag.notes:
-            # Show public notes or notes owned by current user
-            if note.is_public or (current_user_id and note.owner_id == current_user_id):
-                notes.append({
-                    'public_id': note.public_id,
-                    'title': note.title,
-                    'description': note.description,
-                    'is_public': note.is_public,
-                    'view_count': note.view_count,
-                    'created_at': note.created_at.isoformat(),
-                    'owner': {
-                        'public_id': note.owner.public_id,
-                        'username': note.owner.username
-                    }
-                })
+        query = Note.query.join(note_tags, note_tags.c.note_id == Note.id).filter(
+            note_tags.c.tag_id == tag.id, visible
+        ).order_by(Note.created_at.desc(), Note.id.desc())
+        page = paginate_query(shape_query(query, tag_note_dto))
         
         return {
-            'tag': {
-                'id': tag.id,
-                'name': tag.name
-            },
-            'notes': notes,
-            'total': len(notes)
+            'tag': tag,
+            'notes': page.pop('items'),
+            **page
         }
 
 
+@api.route('/suggest')
+class TagSuggest(Resource):
+    @api.doc('suggest_tags', description='Autocomplete tag names by prefix')
+    @api.param('prefix', 'Start of the tag name (case-insensitive)', default='')
+    @api.param('limit', 'Number of tags to return (max 50)', type='integer', default=10)
+    @api.marshal_list_with(tag_suggestion_dto)
+    def get(self):
+        """Tags starting with a prefix, most used first"""
+        prefix = request.args.get('prefix', '', type=str)
+        limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+        return [entry._asdict() for entry in tag_suggestions.suggest(prefix, limit)]
+
+
 @api.route('/popular')
 class PopularTags(Resource):
     @api.doc('get_popular_tags', description='Get most popular tags')
     @api.param('limit', 'Number of tags to return', type='integer', default=10)
+    @api.marshal_list_with(tag_dto)
     def get(self):
         """Get most popular tags by note count"""
         limit = request.args.get('limit', 10, type=int)
         
-        tags = Tag.query.all()
-        tags_with_counts = [{
-            'id': tag.id,
-            'name': tag.name,
-            'note_count': len(tag.notes),
-            'created_at': tag.created_at
-        } for tag in tags]
-        
-        # Sort by note count
-        tags_with_counts.sort(key=lambda x: x['note_count'], reverse=True)
-        
-        return tags_with_counts[:limit]
+        return [_tag_data(tag, note_count) for tag, note_count in popular_tags(limit)]
@@ -5,6 +5,9 @@ from .dto import UserDto
 from ...models.user import User
 from ...models.note import Note
 from ...utils.pagination import paginate_query
+from ...utils.query_shaping import shape_query
+from ...services.recommendations import mark_dirty
+from ...services.statistics import adjust_user_stats, user_statistics, user_created
 from ... import db
 
 api = UserDto.api
@@ -30,6 +33,7 @@ class UserList(Resource):
         new_user = User(email=data['email'], username=data['username'])
         new_user.set_password(data['password'])
         db.session.add(new_user)
+        user_created(new_user)
         db.session.commit()
         return new_user, 201
 
@@ -40,15 +44,16 @@ class UserDetail(Resource):
     def get(self, username):
         """Get user profile with stats"""
         user = User.query.filter_by(username=username).first_or_404()
+        stats = user_statistics(user.id)
         
         profile = {
             'public_id': user.public_id,
             'username': user.username,
             'profile_bio': user.profile_bio,
             'created_at': user.created_at,
-            'followers_count': user.followers.count(),
-            'following_count': user.following.count(),
-            'notes_count': Note.query.filter_by(owner_id=user.id, is_public=True).count()
+            'followers_count': stats['follower_count'],
+            'following_count': stats['following_count'],
+            'notes_count': stats['public_note_count']
         }
         
         return profile
@@ -73,6 +78,9 @@ class UserFollow(Resource):
             return {'message': 'You are already following this user'}, 400
         
         current_user.following.append(user_to_follow)
+        mark_dirty([current_user.id])
+        adjust_user_stats(current_user.id, following_count=1)
+        adjust_user_stats(user_to_follow.id, follower_count=1)
         db.session.commit()
         
         return {'message': f'You are now following {username}'}, 200
@@ -93,6 +101,9 @@ class UserUnfollow(Resource):
             return {'message': 'You are not following this user'}, 400
         
         current_user.following.remove(user_to_unfollow)
+        mark_dirty([current_user.id])
+        adjust_user_stats(current_user.id, following_count=-1)
+        adjust_user_stats(user_to_unfollow.id, follower_count=-1)
         db.session.commit()
         
         return {'message': f'You have unfollowed {username}'}, 200
@@ -103,7 +114,9 @@ class UserBookmarks(Resource):
     @jwt_required()
     @api.doc(params={
         'page': 'Page number (default: 1)',
-        'per_page': 'Items per page (default: 10, max: 100)'
+        'per_page': 'Items per page (default: 10, max: 100)',
+        'cursor': 'Keyset pagination: empty for the first page, then next_cursor',
+        'with_total': 'Count the total in cursor mode (default: false)'
     })
     def get(self):
         """Get current user's bookmarked notes (paginated)"""
@@ -113,11 +126,14 @@ class UserBookmarks(Resource):
         user = User.query.filter_by(public_id=current_user_public_id).first()
         
         # Get paginated bookmarks using a proper query
-        bookmarks_query = Note.query.join(user_bookmarks).filter(
+        bookmarks_query = shape_query(Note.query, NoteDto.note_display).join(user_bookmarks).filter(
             user_bookmarks.c.user_id == user.id
         ).order_by(user_bookmarks.c.bookmarked_at.desc())
         
-        result = paginate_query(bookmarks_query)
+        result = paginate_query(bookmarks_query, sort_keys=[
+            (user_bookmarks.c.bookmarked_at, 'desc'),
+            (Note.id, 'desc')
+        ])
         
         # Marshal the notes
         from flask_restx import marshal
@@ -169,20 +185,18 @@ class UserStats(Resource):
         """Get current user's statistics"""
         current_user_public_id = get_jwt_identity()
         user = User.query.filter_by(public_id=current_user_public_id).first()
+        stats = user_statistics(user.id)
         
-        # Calculate total views and downloads across all notes
-        total_views = sum(note.view_count for note in user.notes)
-        total_downloads = sum(note.download_count for note in user.notes)
-        
+        # View/download totals include flushed counter increments (see counter_buffer)
         return {
             'username': user.username,
-            'total_notes': len(user.notes),
-            'public_notes': sum(1 for note in user.notes if note.is_public),
-            'private_notes': sum(1 for note in user.notes if not note.is_public),
-            'total_views': total_views,
-            'total_downloads': total_downloads,
-            'followers_count': user.followers.count(),
-            'following_count': user.following.count(),
-            'bookmarks_count': len(user.bookmarked_notes),
-            'comments_count': len(user.comments)
+            'total_notes': stats['note_count'],
+            'public_notes': stats['public_note_count'],
+            'private_notes': stats['note_count'] - stats['public_note_count'],
+            'total_views': stats['total_views'],
+            'total_downloads': stats['total_downloads'],
+            'followers_count': stats['follower_count'],
+            'following_count': stats['following_count'],
+            'bookmarks_count': stats['bookmark_count'],
+            'comments_count': stats['comment_count']
         }, 200
@@ -9,6 +9,49 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'my_jwt_secret_key')
 
+    # Uploads are streamed to disk; anything bigger is rejected while it arrives
+    UPLOAD_MAX_FILE_SIZE = int(os.getenv('UPLOAD_MAX_FILE_SIZE', 50 * 1024 * 1024))
+    # Whole request limit, checked against Content-Length before the body is read
+    MAX_CONTENT_LENGTH = UPLOAD_MAX_FILE_SIZE + 1024 * 1024
+
+    # Background OCR queue (see worker.py)
+    OCR_JOB_MAX_ATTEMPTS = int(os.getenv('OCR_JOB_MAX_ATTEMPTS', 3))
+    OCR_JOB_RETRY_DELAY = int(os.getenv('OCR_JOB_RETRY_DELAY', 30))  # Seconds, doubled on every retry
+    OCR_JOB_LOCK_TIMEOUT = int(os.getenv('OCR_JOB_LOCK_TIMEOUT', 900))  # Seconds before a stuck job is requeued
+    OCR_WORKER_POLL_INTERVAL = float(os.getenv('OCR_WORKER_POLL_INTERVAL', 2))
+    MARKDOWN_VERIFY_INTERVAL = int(os.getenv('MARKDOWN_VERIFY_INTERVAL', 300))  # Seconds between markdown-on-disk checks
+
+    # View/download counters are buffered in memory and flushed in batches
+    COUNTER_FLUSH_INTERVAL = float(os.getenv('COUNTER_FLUSH_INTERVAL', 5))  # Seconds; 0 writes through immediately
+    COUNTER_FLUSH_THRESHOLD = int(os.getenv('COUNTER_FLUSH_THRESHOLD', 1000))  # Pending increments that force a flush
+
+    # Precomputed recommendations: best N notes stored per user, recomputed when
+    # marked dirty or older than the TTL (popular/recent notes drift over time)
+    RECOMMENDATION_TOP_N = int(os.getenv('RECOMMENDATION_TOP_N', 200))
+    RECOMMENDATION_TTL = int(os.getenv('RECOMMENDATION_TTL', 3600))  # Seconds
+
+    # Browser/proxy caching of public note files and markdown (private notes always revalidate)
+    NOTE_CACHE_MAX_AGE = int(os.getenv('NOTE_CACHE_MAX_AGE', 300))  # Seconds
+
+    # How stored files are sent: 'direct' (streamed by the app, with Range support),
+    # 'x-sendfile' (Apache/lighttpd) or 'x-accel' (nginx internal location that
+    # aliases the uploads root at X_ACCEL_PREFIX)
+    FILE_SERVING_MODE = os.getenv('FILE_SERVING_MODE', 'direct')
+    X_ACCEL_PREFIX = os.getenv('X_ACCEL_PREFIX', '/protected-uploads/')
+
+    # OCR progress events for /ocr-status/stream: 'local' (OCR worker runs in the
+    # web process) or 'database' (relayed through the ocr_event table)
+    EVENT_BUS_BACKEND = os.getenv('EVENT_BUS_BACKEND', 'database')
+    EVENT_POLL_INTERVAL = float(os.getenv('EVENT_POLL_INTERVAL', 0.5))  # Seconds between relay reads, per web process
+    EVENT_RETENTION = int(os.getenv('EVENT_RETENTION', 600))  # Seconds relayed events are kept
+    SSE_HEARTBEAT_INTERVAL = int(os.getenv('SSE_HEARTBEAT_INTERVAL', 15))  # Seconds between keep-alive comments
+    SSE_MAX_DURATION = int(os.getenv('SSE_MAX_DURATION', 300))  # Seconds before a stream ends and the client reconnects
+    SSE_END_RETRY = int(os.getenv('SSE_END_RETRY', 3600))  # Reconnect delay (seconds) sent with the final 'end' event
+
+    # Tag autocomplete is served from an in-memory index, reloaded on this process's
+    # tag writes and at least this often (other processes' writes, note counts)
+    TAG_SUGGEST_TTL = int(os.getenv('TAG_SUGGEST_TTL', 60))  # Seconds
+
 class DevelopmentConfig(Config):
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///note_sharing.db')
@@ -18,6 +61,7 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = os.getenv('TEST_DATABASE_URL', 'sqlite:///note_sharing_test.db')
     PRESERVE_CONTEXT_ON_EXCEPTION = False
+    COUNTER_FLUSH_INTERVAL = 0
 
 class ProductionConfig(Config):
     DEBUG = False
@@ -6,3 +6,9 @@ from .reaction import NoteReaction
 from .blocklist import BlocklistedToken
 from .tag import Tag
 from . import associations
+from .ocr_job import OCRJob
+from .file_blob import FileBlob
+from .recommendation import UserRecommendation, RecommendationState
+from .note_page import NotePage
+from .ocr_event import OCREvent
+from .note_stats import NoteStatistics, UserStatistics
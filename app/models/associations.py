@@ -24,7 +24,7 @@ note_courses = db.Table('note_courses',
 
 note_tags = db.Table('note_tags',
     db.Column('note_id', db.Integer, db.ForeignKey('note.id'), primary_key=True),
-    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True)
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id'), primary_key=True, index=True)  # Per-tag counts and listings
 )
 
 user_bookmarks = db.Table('user_bookmarks',
@@ -0,0 +1,16 @@
+from app.extensions import db
+from datetime import datetime
+
+class FileBlob(db.Model):
+    """A deduplicated uploaded file, shared by every note with identical content"""
+    __tablename__ = 'file_blob'
+    hash = db.Column(db.String(64), primary_key=True)  # sha256 of the uploaded bytes
+    path = db.Column(db.String(255), nullable=False)  # Storage key relative to the uploads root
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)  # Notes pointing at this blob
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    notes = db.relationship('Note', backref='blob', lazy=True)
+
+    def __repr__(self):
+        return f'<FileBlob {self.hash[:12]} refs={self.ref_count}>'
@@ -2,7 +2,6 @@ from app.extensions import db
 import uuid
 from datetime import datetime
 from .associations import note_collaborators, note_courses, note_tags, user_bookmarks
-import os
 
 class Note(db.Model):
     __tablename__ = 'note'
@@ -10,9 +9,16 @@ class Note(db.Model):
     public_id = db.Column(db.String(50), unique=True, default=lambda: str(uuid.uuid4()))
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
-    file_path = db.Column(db.String(255), nullable=False)  # Original handwritten note (PDF/image)
-    markdown_path = db.Column(db.String(255), nullable=True)  # Converted markdown file
+    file_path = db.Column(db.String(255), nullable=False)  # Storage key of the original (PDF), see file_service.resolve_path
+    file_hash = db.Column(db.String(64), db.ForeignKey('file_blob.hash'), nullable=True, index=True)  # Shared blob, see FileBlob
+    markdown_path = db.Column(db.String(255), nullable=True)  # Storage key of the converted markdown file
+    markdown_size = db.Column(db.Integer, nullable=True)  # Bytes; set with the checksum when the file was last seen
+    markdown_checksum = db.Column(db.String(64), nullable=True)  # SHA-256 of the markdown file, None if missing
+    markdown_modified_at = db.Column(db.DateTime, nullable=True)  # File mtime when the checksum was recorded (Last-Modified)
+    markdown_verified_at = db.Column(db.DateTime, nullable=True)  # Last time the file was checked on disk
     ocr_status = db.Column(db.String(50), default='pending')  # pending, processing, completed, failed
+    pages_done = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Pages OCR'd so far in the current conversion
+    pages_total = db.Column(db.Integer, nullable=True)  # Known once conversion starts
     is_public = db.Column(db.Boolean, default=True)
     view_count = db.Column(db.Integer, default=0)  # Track views
     download_count = db.Column(db.Integer, default=0)  # Track downloads
@@ -21,22 +27,27 @@ class Note(db.Model):
 
     comments = db.relationship('Comment', backref='note', lazy=True, cascade="all, delete-orphan")
     reactions = db.relationship('NoteReaction', backref='note', lazy=True, cascade="all, delete-orphan")
+    pages = db.relationship('NotePage', backref='note', lazy=True, cascade="all, delete-orphan",
+                            order_by='NotePage.page_number')
+    stats = db.relationship('NoteStatistics', uselist=False, lazy=True, cascade="all, delete-orphan")
     
-    collaborators = db.relationship('User', secondary=note_collaborators, lazy='subquery',
+    # Loaded on access; list endpoints eager-load what their DTO needs (see utils/query_shaping.py)
+    collaborators = db.relationship('User', secondary=note_collaborators, lazy='select',
                                     backref=db.backref('collaborating_notes', lazy=True))
-    courses = db.relationship('Course', secondary=note_courses, lazy='subquery',
+    courses = db.relationship('Course', secondary=note_courses, lazy='select',
                               backref=db.backref('notes', lazy=True))
-    tags = db.relationship('Tag', secondary=note_tags, lazy='subquery',
+    tags = db.relationship('Tag', secondary=note_tags, lazy='select',
                            back_populates='notes')
-    bookmarked_by = db.relationship('User', secondary=user_bookmarks, lazy='subquery',
+    bookmarked_by = db.relationship('User', secondary=user_bookmarks, lazy='select',
                                     backref=db.backref('bookmarked_notes', lazy=True))
 
     @property
     def has_markdown(self):
-        """Check if note has markdown content available"""
-        return (self.ocr_status == 'completed' and 
-                self.markdown_path and 
-                os.path.exists(self.markdown_path))
+        """Check if note has markdown content available (from the row; the worker keeps it in sync with disk)"""
+        # Notes converted before the checksum existed are trusted until first verified
+        return bool(self.ocr_status == 'completed' and
+                    self.markdown_path and
+                    (self.markdown_checksum or self.markdown_verified_at is None))
     
     @property
     def markdown_url(self):
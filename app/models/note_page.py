@@ -0,0 +1,13 @@
+from app.extensions import db
+from datetime import datetime
+
+class NotePage(db.Model):
+    """Markdown of one page, stored as soon as it is OCR'd; cleared once the note's markdown file is written"""
+    __tablename__ = 'note_page'
+    note_id = db.Column(db.Integer, db.ForeignKey('note.id', ondelete='CASCADE'), primary_key=True)
+    page_number = db.Column(db.Integer, primary_key=True)  # 1-based
+    markdown = db.Column(db.Text, nullable=False, default='')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<NotePage note={self.note_id} page={self.page_number}>'
@@ -0,0 +1,32 @@
+from app.extensions import db
+
+class NoteStatistics(db.Model):
+    """Denormalized per-note counters, kept in step with the rows they count, see services/statistics.py"""
+    __tablename__ = 'note_stats'
+    note_id = db.Column(db.Integer, db.ForeignKey('note.id', ondelete='CASCADE'), primary_key=True)
+    concise_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    detailed_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    readable_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    collaborator_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    bookmark_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Users who bookmarked it
+
+    def __repr__(self):
+        return f'<NoteStatistics note={self.note_id}>'
+
+
+class UserStatistics(db.Model):
+    """Denormalized per-user rollups for the profile statistics, see services/statistics.py"""
+    __tablename__ = 'user_stats'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    note_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    public_note_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    total_views = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Over the user's notes
+    total_downloads = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    follower_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    following_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    bookmark_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Notes the user bookmarked
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    def __repr__(self):
+        return f'<UserStatistics user={self.user_id}>'
@@ -0,0 +1,13 @@
+from app.extensions import db
+from datetime import datetime
+
+class OCREvent(db.Model):
+    """OCR progress event relayed from worker processes to web processes, see services/event_bus.py"""
+    __tablename__ = 'ocr_event'
+    id = db.Column(db.Integer, primary_key=True)  # Relay cursor: readers fetch ids above the last one seen
+    channel = db.Column(db.String(50), nullable=False)  # Note public_id
+    payload = db.Column(db.Text, nullable=False)  # JSON event
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)  # For pruning
+
+    def __repr__(self):
+        return f'<OCREvent {self.id} {self.channel}>'
@@ -0,0 +1,23 @@
+from app.extensions import db
+from datetime import datetime
+
+class OCRJob(db.Model):
+    __tablename__ = 'ocr_job'
+    id = db.Column(db.Integer, primary_key=True)
+    note_id = db.Column(db.Integer, db.ForeignKey('note.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Earliest time a worker may claim it
+    locked_by = db.Column(db.String(100), nullable=True)  # Worker id holding the job
+    locked_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    note = db.relationship('Note', backref=db.backref('ocr_jobs', lazy=True, cascade='all, delete-orphan'))
+
+    __table_args__ = (db.Index('ix_ocr_job_status_run_after', 'status', 'run_after'),)
+
+    def __repr__(self):
+        return f'<OCRJob {self.id} note={self.note_id} {self.status}>'
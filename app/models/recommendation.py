@@ -0,0 +1,26 @@
+from app.extensions import db
+from datetime import datetime
+
+class UserRecommendation(db.Model):
+    """Precomputed top-N recommended notes for a user, see services/recommendations.py"""
+    __tablename__ = 'user_recommendation'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    note_id = db.Column(db.Integer, db.ForeignKey('note.id', ondelete='CASCADE'), primary_key=True)
+    position = db.Column(db.Integer, nullable=False)  # 0 = best match
+    score = db.Column(db.Float, nullable=False, default=0)
+
+    __table_args__ = (db.Index('ix_user_recommendation_user_position', 'user_id', 'position'),)
+
+    def __repr__(self):
+        return f'<UserRecommendation user={self.user_id} note={self.note_id} #{self.position}>'
+
+
+class RecommendationState(db.Model):
+    """Whether a user's stored recommendations need recomputing"""
+    __tablename__ = 'recommendation_state'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    dirty = db.Column(db.Boolean, nullable=False, default=False)  # Set by bookmarks, follows, enrollments, new notes
+    refreshed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<RecommendationState user={self.user_id} dirty={self.dirty}>'
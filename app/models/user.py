@@ -17,6 +17,7 @@ class User(db.Model):
 
     notes = db.relationship('Note', backref='owner', lazy=True)
     comments = db.relationship('Comment', backref='author', lazy=True)
+    stats = db.relationship('UserStatistics', uselist=False, lazy=True, cascade="all, delete-orphan")
     
     following = db.relationship(
         'User', secondary=followers,
@@ -0,0 +1,127 @@
+"""
+In-process buffer for note view/download counters.
+Read endpoints record increments here instead of doing a read-modify-write
+commit per hit. Increments are coalesced per note and flushed periodically
+(and on shutdown) as atomic ``UPDATE note SET view_count = view_count + n``
+statements, so hot notes no longer serialize readers on a row lock. The
+owners' ``user_stats`` totals are advanced in the same transaction.
+"""
+import atexit
+import logging
+import threading
+from collections import defaultdict
+from sqlalchemy import update, select, bindparam, func
+from app.extensions import db
+from app.models.note import Note
+from app.models.note_stats import UserStatistics
+
+logger = logging.getLogger(__name__)
+
+COUNTER_COLUMNS = ('view_count', 'download_count')
+
+
+class CounterBuffer:
+    """Coalesces counter increments and flushes them in one batched UPDATE"""
+
+    def __init__(self):
+        self._pending = defaultdict(lambda: dict.fromkeys(COUNTER_COLUMNS, 0))
+        self._pending_total = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher = None
+        self._app = None
+        self.flush_interval = 5
+        self.flush_threshold = 1000
+
+    def init_app(self, app):
+        self._app = app
+        self.flush_interval = app.config['COUNTER_FLUSH_INTERVAL']
+        self.flush_threshold = app.config['COUNTER_FLUSH_THRESHOLD']
+        atexit.register(self.flush)
+
+    def increment(self, note_id, column, amount=1):
+        """Record ``amount`` more views/downloads for a note"""
+        if column not in COUNTER_COLUMNS:
+            raise ValueError(f'Unknown counter column: {column}')
+
+        with self._lock:
+            self._pending[note_id][column] += amount
+            self._pending_total += amount
+            flush_now = self.flush_interval <= 0 or self._pending_total >= self.flush_threshold
+
+        if flush_now:
+            self.flush()
+        else:
+            self._ensure_flusher()
+
+    def pending(self, note_id, column):
+        """Increments for a note not yet written to the database"""
+        with self._lock:
+            counts = self._pending.get(note_id)
+            return counts[column] if counts else 0
+
+    def flush(self):
+        """Write all buffered increments; failed batches are put back for the next flush"""
+        with self._lock:
+            batch = self._pending
+            self._pending = defaultdict(lambda: dict.fromkeys(COUNTER_COLUMNS, 0))
+            self._pending_total = 0
+
+        if not batch or self._app is None:
+            return 0
+
+        params = [
+            {'b_note_id': note_id, 'b_views': counts['view_count'], 'b_downloads': counts['download_count']}
+            for note_id, counts in batch.items()
+        ]
+        stmt = update(Note.__table__).where(
+            Note.__table__.c.id == bindparam('b_note_id')
+        ).values(
+            view_count=func.coalesce(Note.__table__.c.view_count, 0) + bindparam('b_views'),
+            download_count=func.coalesce(Note.__table__.c.download_count, 0) + bindparam('b_downloads')
+        )
+        user_stats = UserStatistics.__table__
+        owner_stmt = update(user_stats).where(
+            user_stats.c.user_id == select(Note.__table__.c.owner_id).where(
+                Note.__table__.c.id == bindparam('b_note_id')
+            ).scalar_subquery()
+        ).values(
+            total_views=user_stats.c.total_views + bindparam('b_views'),
+            total_downloads=user_stats.c.total_downloads + bindparam('b_downloads')
+        )
+
+        try:
+            with self._app.app_context():
+                with db.engine.begin() as conn:
+                    conn.execute(stmt, params)
+                    conn.execute(owner_stmt, params)
+        except Exception as e:
+            logger.error(f"Failed to flush note counters, will retry: {str(e)}")
+            with self._lock:
+                for note_id, counts in batch.items():
+                    for column, amount in counts.items():
+                        self._pending[note_id][column] += amount
+                        self._pending_total += amount
+            return 0
+
+        return len(params)
+
+    def _ensure_flusher(self):
+        """Start the background flush thread on first use (after any server fork)"""
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(target=self._run, name='counter-flusher', daemon=True)
+            self._flusher.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+
+# Singleton instance
+counter_buffer = CounterBuffer()
@@ -0,0 +1,187 @@
+"""
+Publish/subscribe channel for OCR progress, feeding /ocr-status/stream.
+Subscribers are in-process queues, one per open stream. With the 'local'
+backend publish() delivers straight to them, which is enough when the OCR
+worker runs in the web process. With the 'database' backend publish() appends
+to the ``ocr_event`` table instead, and each web process runs one relay thread
+that reads new rows (only while it has subscribers) and fans them out, so a
+single indexed query per interval replaces every client's status polling.
+Another transport (e.g. Redis pub/sub) only needs to replace _publish_remote
+and _relay_once.
+"""
+import json
+import queue
+import logging
+import threading
+from datetime import datetime, timedelta
+from collections import defaultdict
+from sqlalchemy import select, insert, delete, func
+from app.extensions import db
+from app.models.ocr_event import OCREvent
+
+logger = logging.getLogger(__name__)
+
+# Rows read per relay query
+RELAY_BATCH_SIZE = 500
+
+
+class Subscription:
+    """Events for one channel, buffered until the stream reads them"""
+
+    def __init__(self, bus, channel):
+        self.bus = bus
+        self.channel = channel
+        self.queue = queue.Queue()
+
+    def get(self, timeout):
+        """Next event, or None if nothing arrived within ``timeout`` seconds"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.bus._unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EventBus:
+    """In-process fan-out, optionally fed by a relay from other processes"""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._relay = None
+        self._last_id = None
+        self._app = None
+        self.backend = 'local'
+        self.poll_interval = 0.5
+
+    def init_app(self, app):
+        self._app = app
+        self.backend = app.config['EVENT_BUS_BACKEND']
+        self.poll_interval = app.config['EVENT_POLL_INTERVAL']
+        if self.backend not in ('local', 'database'):
+            raise ValueError(f'Unknown EVENT_BUS_BACKEND: {self.backend}')
+
+    def publish(self, channel, event):
+        """
+        Send an event to every subscriber of ``channel`` in any process.
+        Never raises: progress events are advisory and must not fail OCR.
+
+        Args:
+            channel (str): Note public_id
+            event (dict): JSON-serializable payload
+        """
+        try:
+            if self.backend == 'local':
+                self._deliver(channel, event)
+            else:
+                self._publish_remote(channel, event)
+        except Exception as e:
+            logger.warning(f"Could not publish event on {channel}: {str(e)}")
+
+    def subscribe(self, channel):
+        """Start receiving events for ``channel``; close the subscription when done"""
+        subscription = Subscription(self, channel)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+            if self.backend != 'local' and self._last_id is None:
+                # Relay from the newest stored event on; anything older is
+                # covered by the snapshot the caller reads after subscribing
+                self._last_id = self._newest_event_id()
+        if self.backend != 'local':
+            self._ensure_relay()
+        return subscription
+
+    def prune(self, max_age):
+        """Delete relayed events older than ``max_age`` seconds; returns rows removed"""
+        if self.backend == 'local':
+            return 0
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+        with db.engine.begin() as conn:
+            return conn.execute(delete(OCREvent.__table__).where(OCREvent.__table__.c.created_at < cutoff)).rowcount
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def _deliver(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.queue.put(event)
+
+    def _publish_remote(self, channel, event):
+        # Own short transaction, so the event is visible even if the caller's session rolls back
+        with db.engine.begin() as conn:
+            conn.execute(insert(OCREvent.__table__).values(
+                channel=channel, payload=json.dumps(event), created_at=datetime.utcnow()
+            ))
+
+    def _newest_event_id(self):
+        table = OCREvent.__table__
+        with db.engine.connect() as conn:
+            return conn.execute(select(func.coalesce(func.max(table.c.id), 0))).scalar()
+
+    def _relay_once(self):
+        """Fan out events stored since the last read; returns how many were read"""
+        with self._lock:
+            last_id = self._last_id
+        if last_id is None:
+            return 0
+        table = OCREvent.__table__
+        with self._app.app_context():
+            with db.engine.connect() as conn:
+                rows = conn.execute(
+                    select(table.c.id, table.c.channel, table.c.payload)
+                    .where(table.c.id > last_id)
+                    .order_by(table.c.id)
+                    .limit(RELAY_BATCH_SIZE)
+                ).all()
+        for row in rows:
+            with self._lock:
+                if self._last_id is None:
+                    break
+                self._last_id = row.id
+            self._deliver(row.channel, json.loads(row.payload))
+        return len(rows)
+
+    def _ensure_relay(self):
+        """Start the relay thread on first subscription (after any server fork)"""
+        if self._relay is not None and self._relay.is_alive():
+            return
+        with self._lock:
+            if self._relay is not None and self._relay.is_alive():
+                return
+            self._relay = threading.Thread(target=self._run_relay, name='event-relay', daemon=True)
+            self._relay.start()
+
+    def _run_relay(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    # Nobody streaming: no queries until the next subscription re-anchors
+                    self._last_id = None
+                listening = self._last_id is not None
+            try:
+                if listening:
+                    self._relay_once()
+            except Exception as e:
+                logger.error(f"Event relay failed: {str(e)}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+
+# Singleton instance
+event_bus = EventBus()
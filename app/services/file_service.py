@@ -1,87 +1,471 @@
 import os
+import re
 import uuid
-from werkzeug.utils import secure_filename
+import gzip
+import shutil
+import hashlib
+from urllib.parse import quote
+from werkzeug.utils import secure_filename, send_file as _send_file_headers
+from werkzeug.wsgi import wrap_file
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge, UnsupportedMediaType
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from pathlib import Path
-from flask import current_app
+from flask import current_app, request, send_file, Request
 from PIL import Image
 import logging
+from app.extensions import db
+from app.models.file_blob import FileBlob
+
+try:
+    import brotli
+except ImportError:  # In requirements.txt; without it only gzip copies are written
+    brotli = None
 
 logger = logging.getLogger(__name__)
 
-# Use absolute path to ensure consistency regardless of working directory
+# Read uploads in 64 KiB chunks
+CHUNK_SIZE = 64 * 1024
+# Bytes needed to recognise every allowed file signature (PNG's is the longest)
+MAGIC_HEADER_SIZE = 8
+
+# Top-level folders under the uploads root
+STORAGE_FOLDERS = ('notes', 'markdown', 'blobs')
+
+# Precompressed copies kept next to a file: (content coding, filename suffix)
+COMPRESSED_SUFFIXES = (('br', '.br'), ('gzip', '.gz'))
+
+_uploads_root = None
+
+def get_uploads_root():
+    """
+    Absolute path of the uploads directory every storage key is relative to.
+    Defaults to <project root>/uploads (override with UPLOADS_ROOT); computed once.
+    """
+    global _uploads_root
+    if _uploads_root is None:
+        project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        _uploads_root = os.path.normpath(os.getenv('UPLOADS_ROOT') or os.path.join(project_root, 'uploads'))
+    return _uploads_root
+
 def get_upload_folder():
-    """Get absolute path to upload folder"""
-    if current_app:
-        # Get the project root directory (where run.py is located)
-        project_root = os.path.dirname(current_app.root_path)
-        return os.path.join(project_root, 'uploads', 'notes')
-    else:
-        # Fallback for when not in app context
-        return os.path.join(os.getcwd(), 'uploads', 'notes')
+    """Get absolute path to the legacy (pre-blob store) upload folder"""
+    return os.path.join(get_uploads_root(), 'notes')
 
 def get_markdown_folder():
     """Get absolute path to markdown upload folder"""
-    if current_app:
-        # Get the project root directory (where run.py is located)
-        project_root = os.path.dirname(current_app.root_path)
-        return os.path.join(project_root, 'uploads', 'markdown')
-    else:
-        # Fallback for when not in app context
-        return os.path.join(os.getcwd(), 'uploads', 'markdown')
+    return os.path.join(get_uploads_root(), 'markdown')
+
+def get_blob_folder():
+    """Get absolute path to the content-addressed blob store"""
+    return os.path.join(get_uploads_root(), 'blobs')
 
-ALLOWED_EXTENSIONS = {'pdf', 'jpg', 'jpeg', 'png'}  # Added image formats for MonkeyOCR
+def get_upload_tmp_folder():
+    """Get absolute path to the folder uploads are spooled into while they arrive"""
+    return os.path.join(get_blob_folder(), 'tmp')
+
+def storage_key(path):
+    """
+    Storage key for a file under the uploads root: the relative path with '/'
+    separators (e.g. 'blobs/ab/ab12...pdf'). This is what the database stores.
+    """
+    return Path(os.path.relpath(os.path.abspath(path), get_uploads_root())).as_posix()
+
+def resolve_path(key):
+    """
+    Absolute path for a storage key. Pure string work, no filesystem access.
+    Absolute values (rows written before storage keys) are returned as they are.
+    
+    Args:
+        key: Storage key from the database
+        
+    Returns:
+        str: Absolute path, or None if there is no key
+    """
+    if not key:
+        return None
+    if os.path.isabs(key):
+        return os.path.normpath(key)
+    return os.path.join(get_uploads_root(), *key.split('/'))
+
+def legacy_storage_key(stored_path):
+    """
+    Map a path stored before storage keys (absolute, Windows separators, stray
+    'app' directory...) to its storage key. Used by the one-off migration and
+    fix_file_paths.py.
+    """
+    if not stored_path:
+        return None
+    parts = [part for part in re.split(r'[\\/]+', stored_path) if part and part != '.']
+    if not parts:
+        return None
+    
+    # Already a key
+    if not os.path.isabs(stored_path) and ':' not in parts[0] and parts[0] in STORAGE_FOLDERS:
+        return '/'.join(parts)
+    
+    # .../uploads/<folder>/... -> <folder>/...
+    if 'uploads' in parts:
+        index = len(parts) - 1 - parts[::-1].index('uploads')
+        if index + 1 < len(parts):
+            return '/'.join(parts[index + 1:])
+    
+    filename = parts[-1]
+    folder = 'markdown' if ('markdown' in parts or filename.endswith('.md')) else 'notes'
+    return f"{folder}/{filename}"
+
+def sniff_file_type(header):
+    """
+    Identify an upload from its leading bytes rather than its filename.
+    
+    Returns:
+        str: 'pdf', 'jpg' or 'png', or None if the content is not allowed
+    """
+    if header.startswith(b'%PDF-'):
+        return 'pdf'
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    return None
+
+
+class UploadSpool:
+    """
+    Disk-backed container for an incoming upload.
+    Werkzeug's multipart parser writes each chunk here as it arrives; the
+    chunk is hashed, counted against the size limit and, for the first bytes,
+    checked for an allowed file signature. Bad uploads are rejected right
+    away, before the rest of the body is read, and memory use stays constant.
+    """
+    
+    def __init__(self, directory, max_size):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{uuid.uuid4().hex}.upload")
+        self.max_size = max_size
+        self.size = 0
+        self.file_type = None
+        self._header = b''
+        self._digest = hashlib.sha256()
+        self._file = open(self.path, 'w+b')
+        self._claimed = False
+    
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_size:
+            # The parser drops the container when we raise, so clean up here
+            self.close()
+            raise RequestEntityTooLarge(f'File exceeds the {self.max_size} byte upload limit')
+        
+        if self.file_type is None:
+            self._header += data[:MAGIC_HEADER_SIZE - len(self._header)]
+            if len(self._header) >= MAGIC_HEADER_SIZE:
+                self.file_type = sniff_file_type(self._header)
+                if self.file_type is None:
+                    self.close()
+                    raise UnsupportedMediaType('Only PDF, JPEG and PNG files are allowed')
+        
+        self._digest.update(data)
+        return self._file.write(data)
+    
+    def claim(self):
+        """
+        Hand the spooled file over to the caller, who becomes responsible for it.
+        
+        Returns:
+            tuple: (path, sha256 hex digest, file type or None)
+        """
+        if self.file_type is None:
+            # Uploads shorter than the signature window
+            self.file_type = sniff_file_type(self._header)
+        self._file.close()
+        self._claimed = True
+        return self.path, self._digest.hexdigest(), self.file_type
+    
+    def close(self):
+        """Called by Werkzeug at request teardown; drops unclaimed spool files"""
+        self._file.close()
+        if not self._claimed and os.path.exists(self.path):
+            os.remove(self.path)
+    
+    def __getattr__(self, name):
+        # read/seek/readline/tell etc. go straight to the spool file
+        return getattr(self._file, name)
+
+
+class UploadRequest(Request):
+    """
+    Request class that streams file uploads into an UploadSpool, for the views
+    that opt in with ``spools_uploads = True`` (the note upload). Multipart
+    bodies sent to any other route get Werkzeug's default handling, without
+    the file type check.
+    """
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        view = current_app.view_functions.get(self.endpoint) if self.endpoint else None
+        if not getattr(getattr(view, 'view_class', None), 'spools_uploads', False):
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return UploadSpool(get_upload_tmp_folder(), current_app.config['UPLOAD_MAX_FILE_SIZE'])
 
-def allowed_file(filename):
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def save_file(file):
     """
-    Save uploaded file (PDF or image) to the uploads directory.
-    If the file is an image, convert it to PDF first.
+    Save uploaded file (PDF or image) into the deduplicated blob store.
+    If the file is an image, convert it to PDF first. Identical uploads share
+    one blob; the blob's reference count is incremented in the current
+    session, so the caller's commit persists it together with the note.
     
     Args:
         file: FileStorage object from Flask request
         
     Returns:
-        str: Path to saved file (always PDF), or None if invalid
+        FileBlob: Blob holding the saved file (always PDF), or None if invalid
+    """
+    if not file:
+        return None
+    
+    filename = secure_filename(file.filename or '')
+    
+    if isinstance(file.stream, UploadSpool):
+        # Already hashed, size-checked and type-checked while the request streamed in
+        tmp_path, file_hash, file_type = file.stream.claim()
+    else:
+        # Files not parsed by UploadRequest (e.g. scripts) go through the same checks
+        spool = UploadSpool(get_upload_tmp_folder(), current_app.config['UPLOAD_MAX_FILE_SIZE'])
+        try:
+            while True:
+                chunk = file.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                spool.write(chunk)
+        except HTTPException as e:
+            logger.error(f"Rejected upload {filename}: {e.description}")
+            spool.close()
+            return None
+        tmp_path, file_hash, file_type = spool.claim()
+    
+    if file_type is None:
+        logger.error(f"Rejected upload {filename}: not a PDF, JPEG or PNG")
+        os.remove(tmp_path)
+        return None
+    
+    # Same content uploaded before: just take another reference
+    if _acquire_blob(file_hash):
+        logger.info(f"Upload {filename} deduplicated to blob {file_hash}")
+        os.remove(tmp_path)
+        return db.session.get(FileBlob, file_hash)
+    
+    # Check if it's an image and convert to PDF
+    if file_type in ['jpg', 'png']:
+        logger.info(f"Converting image to PDF: {tmp_path}")
+        pdf_path = convert_image_to_pdf(tmp_path)
+        if not pdf_path:
+            logger.error(f"Failed to convert image to PDF: {tmp_path}")
+            # Clean up the original file if conversion failed
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+        logger.info(f"Image converted to PDF successfully: {pdf_path}")
+        tmp_path = pdf_path
+    
+    # Move into place under uploads/blobs/<first two hex chars>/<hash>.pdf
+    blob_path = os.path.normpath(os.path.join(get_blob_folder(), file_hash[:2], f"{file_hash}.pdf"))
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    os.replace(tmp_path, blob_path)
+    
+    blob = FileBlob(hash=file_hash, path=storage_key(blob_path), size=os.path.getsize(blob_path), ref_count=1)
+    try:
+        with db.session.begin_nested():
+            db.session.add(blob)
+    except IntegrityError:
+        # Another request stored the same content concurrently; share its blob
+        _acquire_blob(file_hash)
+        blob = db.session.get(FileBlob, file_hash)
+    return blob
+
+def _acquire_blob(file_hash):
+    """Atomically add a reference to an existing blob. Returns False if there is none."""
+    return FileBlob.query.filter_by(hash=file_hash).update(
+        {'ref_count': FileBlob.ref_count + 1}, synchronize_session=False
+    ) > 0
+
+def release_file(note):
     """
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        unique_filename = f"{uuid.uuid4().hex}_{filename}"
+    Drop a note's reference to its original file.
+    The blob row is deleted once nothing references it. Its file is then moved
+    to a tombstone path before the caller commits, so an upload of the same
+    content after the commit writes a fresh file that the caller's unlink can't
+    touch; a rollback moves it back. The file itself must only be unlinked
+    after the caller commits, so the tombstone path is returned instead.
+    
+    Args:
+        note: Note being deleted
         
-        # Get absolute upload folder path
-        upload_folder = get_upload_folder()
+    Returns:
+        str: Absolute path of a file that is now unreferenced, or None
+    """
+    if not note.file_hash:
+        # Legacy upload stored before deduplication: owned by this note alone
+        return resolve_path(note.file_path)
+    
+    file_hash = note.file_hash
+    blob_path = resolve_path(note.blob.path) if note.blob else None
+    FileBlob.query.filter_by(hash=file_hash).update(
+        {'ref_count': FileBlob.ref_count - 1}, synchronize_session=False
+    )
+    # Conditional delete: a concurrent upload that re-acquired the blob keeps it alive
+    note.file_hash = None
+    db.session.flush()
+    deleted = FileBlob.query.filter(
+        FileBlob.hash == file_hash, FileBlob.ref_count <= 0
+    ).delete(synchronize_session=False)
+    if not deleted or not blob_path:
+        return None
+    return _tombstone(blob_path)
+
+def _tombstone(path):
+    """
+    Move a blob file out of its content-addressed path until the current
+    transaction ends; it is put back if the transaction rolls back.
+    
+    Returns:
+        str: Tombstone path for remove_files, or None if the file was missing
+    """
+    tombstone = f"{path}.{uuid.uuid4().hex}.deleted"
+    try:
+        os.replace(path, tombstone)
+    except FileNotFoundError:
+        return None
+    db.session().info.setdefault('blob_tombstones', []).append((path, tombstone))
+    return tombstone
+
+@event.listens_for(Session, 'after_commit')
+def _forget_tombstones(session):
+    session.info.pop('blob_tombstones', None)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _restore_tombstones(session, previous_transaction):
+    if previous_transaction.parent is not None:
+        # A savepoint rolled back; the blob row's fate is decided by the outer transaction
+        return
+    for path, tombstone in session.info.pop('blob_tombstones', ()):
+        if os.path.exists(tombstone):
+            # Same hash, same bytes: fine even if an upload put the file back meanwhile
+            os.replace(tombstone, path)
+
+def remove_files(paths):
+    """
+    Unlink files after the deleting transaction committed.
+    
+    Returns:
+        list: Paths that were actually removed
+    """
+    removed = []
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
+            removed.append(path)
+    return removed
+
+def send_stored_file(key, download_name, as_attachment=False, etag=True, last_modified=None):
+    """
+    Response for a stored file, according to FILE_SERVING_MODE.
+    
+    'direct' streams the file from the app and answers Range requests with
+    206 Partial Content. 'x-sendfile' and 'x-accel' only build the headers and
+    hand the transfer (ranges included) to the reverse proxy, which sends the
+    bytes with kernel sendfile instead of tying up a worker.
+    
+    Args:
+        key: Storage key of the file
+        download_name: Filename for Content-Disposition
+        as_attachment: Download rather than display inline
+        etag: ETag value, or True to derive one from the file
+        last_modified: Last-Modified value, or None for the file mtime
         
-        # Ensure upload directory exists
-        if not os.path.exists(upload_folder):
-            os.makedirs(upload_folder)
-            
-        # Use proper path joining and normalization
-        file_path = os.path.join(upload_folder, unique_filename)
-        file_path = os.path.normpath(file_path)  # Normalize path separators
+    Returns:
+        Response
         
-        # Save the file
-        file.save(file_path)
+    Raises:
+        FileNotFoundError: If the file is missing
+    """
+    path = resolve_path(key)
+    mode = current_app.config['FILE_SERVING_MODE']
+    if mode == 'direct':
+        return send_file(path, as_attachment=as_attachment, download_name=download_name,
+                         etag=etag, last_modified=last_modified)
+    
+    # Headers only; the proxy handles Range itself, so the app only answers 304/412
+    response = _send_file_headers(
+        path, request.environ, as_attachment=as_attachment, download_name=download_name,
+        etag=etag, last_modified=last_modified, use_x_sendfile=True, conditional=False,
+        response_class=current_app.response_class
+    ).make_conditional(request.environ)
+    
+    if response.status_code == 304:
+        response.headers.pop('X-Sendfile', None)
+    elif mode == 'x-accel':
+        # nginx serves an internal location aliased to the uploads root
+        del response.headers['X-Sendfile']
+        prefix = current_app.config['X_ACCEL_PREFIX'].rstrip('/')
+        response.headers['X-Accel-Redirect'] = f"{prefix}/{quote(storage_key(path))}"
+    return response
+
+def stream_stored_file(key, mimetype):
+    """
+    Response streaming a stored file in CHUNK_SIZE pieces (or via the WSGI
+    server's file wrapper), without conditional or Range handling.
+    
+    Raises:
+        FileNotFoundError: If the file is missing
+    """
+    f = open(resolve_path(key), 'rb')
+    response = current_app.response_class(
+        wrap_file(request.environ, f, CHUNK_SIZE), mimetype=mimetype, direct_passthrough=True
+    )
+    response.content_length = os.fstat(f.fileno()).st_size
+    return response
+
+def compressed_siblings(path):
+    """Paths of the precompressed copies of a file (which may not exist)"""
+    if not path:
+        return []
+    return [f"{path}{suffix}" for _, suffix in COMPRESSED_SUFFIXES]
+
+def write_compressed_siblings(path):
+    """
+    Write brotli and gzip copies next to a file, so it can be served
+    compressed without compressing per request (gzip only if the Brotli
+    package is missing).
+    
+    Args:
+        path: Absolute path of the file
         
-        # Check if it's an image and convert to PDF
-        file_extension = get_file_extension(filename)
-        if file_extension in ['jpg', 'jpeg', 'png']:
-            logger.info(f"Converting image to PDF: {file_path}")
-            pdf_path = convert_image_to_pdf(file_path)
-            if pdf_path:
-                logger.info(f"Image converted to PDF successfully: {pdf_path}")
-                return pdf_path
+    Returns:
+        list: Paths written
+    """
+    written = []
+    for coding, suffix in COMPRESSED_SUFFIXES:
+        if coding == 'br' and brotli is None:
+            continue
+        target = f"{path}{suffix}"
+        tmp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+        try:
+            if coding == 'gzip':
+                # mtime=0 keeps the output identical for identical input
+                with open(path, 'rb') as src, gzip.GzipFile(tmp_path, 'wb', compresslevel=9, mtime=0) as dst:
+                    shutil.copyfileobj(src, dst, CHUNK_SIZE)
             else:
-                logger.error(f"Failed to convert image to PDF: {file_path}")
-                # Clean up the original file if conversion failed
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                return None
-        
-        # If it's already a PDF, return as-is
-        return file_path
-    return None
+                with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                    dst.write(brotli.compress(src.read()))
+            os.replace(tmp_path, target)
+            written.append(target)
+        except OSError as e:
+            logger.warning(f"Could not write {coding} copy of {path}: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return written
 
 def get_file_extension(filename):
     """Get file extension from filename."""
@@ -140,54 +524,3 @@ def convert_image_to_pdf(image_path):
         except:
             pass
         return None
-
-
-def fix_file_path(stored_path):
-    """
-    Fix file paths that might have incorrect directory structure.
-    This handles legacy paths that might include 'app' incorrectly and normalizes separators.
-    
-    Args:
-        stored_path: Path stored in database
-        
-    Returns:
-        str: Corrected absolute path to the file with normalized separators
-    """
-    if not stored_path:
-        return None
-    
-    # Normalize path separators first
-    normalized_stored_path = os.path.normpath(stored_path)
-    
-    # If already absolute and exists, return normalized version
-    if os.path.isabs(normalized_stored_path) and os.path.exists(normalized_stored_path):
-        return normalized_stored_path
-    
-    # Extract just the filename from the stored path
-    filename = os.path.basename(stored_path)
-    
-    # Determine if this is a markdown file or regular upload
-    if 'markdown' in stored_path or filename.endswith('.md'):
-        # This is a markdown file
-        correct_path = os.path.join(get_markdown_folder(), filename)
-    else:
-        # This is a regular upload file
-        correct_path = os.path.join(get_upload_folder(), filename)
-    
-    # Normalize the correct path
-    correct_path = os.path.normpath(correct_path)
-    
-    # If the correct path exists, return it
-    if os.path.exists(correct_path):
-        return correct_path
-    
-    # If stored path is relative, try making it absolute from project root
-    if not os.path.isabs(stored_path):
-        project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-        absolute_path = os.path.join(project_root, stored_path)
-        absolute_path = os.path.normpath(absolute_path)  # Normalize separators
-        if os.path.exists(absolute_path):
-            return absolute_path
-    
-    # Return the normalized stored path (will fail later with proper error)
-    return normalized_stored_path
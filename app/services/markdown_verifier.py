@@ -0,0 +1,97 @@
+"""
+Markdown availability bookkeeping.
+The size and SHA-256 of a note's markdown are stored on the row when OCR
+completes, so rendering ``has_markdown`` never touches the filesystem. The
+OCR worker periodically reconciles those columns with what is actually on
+disk, oldest-checked notes first.
+"""
+import os
+import hashlib
+import logging
+from datetime import datetime
+from app.extensions import db
+from app.models.note import Note
+from .file_service import resolve_path, write_compressed_siblings, CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Notes checked per verifier pass
+VERIFY_BATCH_SIZE = 200
+
+
+def file_checksum(path):
+    """SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def record_markdown(note):
+    """
+    Store size and checksum of a note's markdown file, or clear them if it's missing,
+    and refresh its precompressed copies. The caller commits.
+
+    Returns:
+        bool: Whether the markdown file exists
+    """
+    path = resolve_path(note.markdown_path)
+    try:
+        stat = os.stat(path)
+        note.markdown_checksum = file_checksum(path)
+        note.markdown_size = stat.st_size
+        note.markdown_modified_at = datetime.utcfromtimestamp(stat.st_mtime)
+        write_compressed_siblings(path)
+    except (OSError, TypeError):
+        note.markdown_size = None
+        note.markdown_checksum = None
+        note.markdown_modified_at = None
+    note.markdown_verified_at = datetime.utcnow()
+    return note.markdown_checksum is not None
+
+
+def _verify_note(note):
+    """Re-check one note; only re-hash when the file changed since it was last verified"""
+    path = resolve_path(note.markdown_path)
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        if note.markdown_checksum:
+            logger.warning(f"Markdown of note {note.public_id} is missing on disk: {note.markdown_path}")
+        note.markdown_size = None
+        note.markdown_checksum = None
+        note.markdown_modified_at = None
+        note.markdown_verified_at = datetime.utcnow()
+        return
+
+    changed = (note.markdown_checksum is None or
+               note.markdown_modified_at is None or
+               stat.st_size != note.markdown_size or
+               note.markdown_verified_at is None or
+               datetime.utcfromtimestamp(stat.st_mtime) > note.markdown_verified_at)
+    if changed:
+        record_markdown(note)
+    else:
+        note.markdown_verified_at = datetime.utcnow()
+
+
+def verify_markdown_batch(limit=VERIFY_BATCH_SIZE):
+    """
+    Reconcile markdown columns with the filesystem for the least recently checked notes.
+
+    Returns:
+        int: Number of notes checked
+    """
+    notes = Note.query.filter(
+        Note.ocr_status == 'completed',
+        Note.markdown_path.isnot(None)
+    ).order_by(
+        # Never-verified notes (e.g. converted before these columns existed) first
+        Note.markdown_verified_at.isnot(None), Note.markdown_verified_at
+    ).limit(limit).all()
+
+    for note in notes:
+        _verify_note(note)
+    db.session.commit()
+    return len(notes)
@@ -0,0 +1,167 @@
+"""
+Content-addressed cache of per-page OCR results.
+Pages are keyed by a hash of the rendered page bytes plus the model and prompt,
+so re-uploads of the same slides skip Gemini for every page already seen.
+Entries live in a small SQLite file shared by all workers and are evicted
+least-recently-used once the cache grows past OCR_CACHE_MAX_BYTES.
+Hit/miss/eviction counters are kept in the same file, so the web process can
+report what the OCR worker processes have been doing.
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+OCR_CACHE_ENABLED = os.getenv('OCR_CACHE_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+OCR_CACHE_MAX_BYTES = int(os.getenv('OCR_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+
+
+def get_cache_path():
+    """Get absolute path to the OCR cache database"""
+    if os.getenv('OCR_CACHE_PATH'):
+        return os.getenv('OCR_CACHE_PATH')
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    project_root = os.path.dirname(os.path.dirname(current_dir))
+    return os.path.join(project_root, 'uploads', 'ocr_cache.sqlite3')
+
+
+class OCRPageCache:
+    """LRU, size-bounded page -> markdown cache with shared hit/miss counters"""
+
+    def __init__(self, path, max_bytes, enabled=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(page_bytes, model, prompt):
+        """Cache key: changes whenever the page, the model or the prompt changes"""
+        digest = hashlib.sha256()
+        digest.update(model.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(hashlib.sha256(prompt.encode('utf-8')).digest())
+        digest.update(b'\0')
+        digest.update(page_bytes)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return cached markdown for a page key, or None on a miss"""
+        if not self.enabled:
+            return None
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute(
+                    'SELECT markdown FROM ocr_page_cache WHERE key = ?', (key,)
+                ).fetchone()
+                if row is None:
+                    conn.execute('UPDATE ocr_cache_stats SET misses = misses + 1 WHERE id = 1')
+                    conn.commit()
+                    return None
+                conn.execute(
+                    'UPDATE ocr_page_cache SET last_accessed = ? WHERE key = ?', (time.time(), key)
+                )
+                conn.execute('UPDATE ocr_cache_stats SET hits = hits + 1 WHERE id = 1')
+                conn.commit()
+                return row[0]
+        except sqlite3.Error as e:
+            logger.warning(f"OCR cache read failed: {str(e)}")
+            return None
+
+    def put(self, key, markdown):
+        """Store markdown for a page key, evicting old entries if over the size limit"""
+        if not self.enabled or markdown is None:
+            return
+        size = len(markdown.encode('utf-8'))
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    'INSERT OR REPLACE INTO ocr_page_cache (key, markdown, size, created_at, last_accessed) '
+                    'VALUES (?, ?, ?, ?, ?)', (key, markdown, size, now, now)
+                )
+                self._evict(conn)
+                conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"OCR cache write failed: {str(e)}")
+
+    def stats(self):
+        """Counters shared by all processes plus the current size of the cache"""
+        hits, misses, evictions, entries, total_bytes = 0, 0, 0, 0, 0
+        if self.enabled:
+            try:
+                with self._lock:
+                    conn = self._connect()
+                    hits, misses, evictions = conn.execute(
+                        'SELECT hits, misses, evictions FROM ocr_cache_stats WHERE id = 1'
+                    ).fetchone()
+                    entries, total_bytes = conn.execute(
+                        'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_page_cache'
+                    ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"OCR cache stats failed: {str(e)}")
+        lookups = hits + misses
+        return {
+            'enabled': self.enabled,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'evictions': evictions,
+            'entries': entries,
+            'total_bytes': total_bytes,
+            'max_bytes': self.max_bytes
+        }
+
+    def _evict(self, conn):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM ocr_page_cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        victims = []
+        for key, size in conn.execute('SELECT key, size FROM ocr_page_cache ORDER BY last_accessed'):
+            victims.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany('DELETE FROM ocr_page_cache WHERE key = ?', victims)
+        conn.execute(
+            'UPDATE ocr_cache_stats SET evictions = evictions + ? WHERE id = 1', (len(victims),)
+        )
+
+    def _connect(self):
+        """Open (and create) the cache database on first use; caller holds the lock"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            # WAL lets several worker processes read while one writes
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS ocr_page_cache ('
+                'key TEXT PRIMARY KEY, markdown TEXT NOT NULL, size INTEGER NOT NULL, '
+                'created_at REAL NOT NULL, last_accessed REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS ix_ocr_page_cache_last_accessed '
+                'ON ocr_page_cache (last_accessed)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS ocr_cache_stats ('
+                'id INTEGER PRIMARY KEY CHECK (id = 1), hits INTEGER NOT NULL DEFAULT 0, '
+                'misses INTEGER NOT NULL DEFAULT 0, evictions INTEGER NOT NULL DEFAULT 0)'
+            )
+            conn.execute('INSERT OR IGNORE INTO ocr_cache_stats (id) VALUES (1)')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+
+# Singleton instance
+ocr_cache = OCRPageCache(get_cache_path(), OCR_CACHE_MAX_BYTES, enabled=OCR_CACHE_ENABLED)
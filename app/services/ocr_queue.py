@@ -0,0 +1,285 @@
+"""
+Background OCR job queue backed by the ``ocr_job`` table.
+Uploads enqueue a job and return immediately; worker processes (see worker.py)
+claim jobs, run the Gemini conversion and move ``Note.ocr_status`` through
+pending -> processing -> completed/failed, retrying failed jobs with backoff.
+Every transition and finished page is published on the event bus for
+/ocr-status/stream.
+Between jobs, idle workers also recompute recommendations that are marked
+dirty or past their TTL, and workers periodically reconcile stored markdown
+metadata with the disk.
+"""
+import os
+import shutil
+import socket
+import time
+import logging
+from datetime import datetime, timedelta
+from flask import current_app
+from app.extensions import db
+from app.models.note import Note
+from app.models.ocr_job import OCRJob
+from app.models.note_page import NotePage
+from .ocr_service import ocr_service
+from .file_service import resolve_path, storage_key
+from . import search_index
+from .recommendations import refresh_stale_recommendations
+from .markdown_verifier import record_markdown, verify_markdown_batch
+from .event_bus import event_bus
+
+logger = logging.getLogger(__name__)
+
+# How many queued jobs a worker looks at per claim attempt
+CLAIM_BATCH_SIZE = 10
+# How often (seconds) a worker sweeps for jobs abandoned by crashed workers
+STALE_SWEEP_INTERVAL = 60
+
+
+def enqueue_ocr_job(note):
+    """
+    Queue OCR conversion for a note.
+    The caller commits, so the note and its job are persisted in one transaction.
+
+    Args:
+        note: Note instance (may be pending insert)
+
+    Returns:
+        OCRJob: The queued job
+    """
+    job = OCRJob(note=note, max_attempts=current_app.config['OCR_JOB_MAX_ATTEMPTS'])
+    note.ocr_status = 'pending'
+    db.session.add(job)
+    return job
+
+
+def claim_next_job(worker_id):
+    """
+    Atomically claim the next runnable job for this worker.
+    The status guard on the UPDATE makes the claim safe when several workers
+    race for the same row; the loser simply moves on to the next candidate.
+
+    Returns:
+        OCRJob or None if nothing is runnable
+    """
+    now = datetime.utcnow()
+    candidate_ids = [job_id for (job_id,) in db.session.query(OCRJob.id).filter(
+        OCRJob.status == 'queued',
+        OCRJob.run_after <= now
+    ).order_by(OCRJob.run_after, OCRJob.id).limit(CLAIM_BATCH_SIZE).all()]
+
+    for job_id in candidate_ids:
+        claimed = OCRJob.query.filter_by(id=job_id, status='queued').update({
+            'status': 'running',
+            'locked_by': worker_id,
+            'locked_at': now,
+            'attempts': OCRJob.attempts + 1,
+            'updated_at': now
+        }, synchronize_session=False)
+        if claimed:
+            job = db.session.get(OCRJob, job_id)
+            job.note.ocr_status = 'processing'
+            # Start page progress over (a retry, or a job taken over from a dead worker)
+            _clear_pages(job.note)
+            db.session.commit()
+            publish_status(job.note)
+            return job
+
+    db.session.commit()
+    return None
+
+
+def process_job(job):
+    """Run OCR for a claimed job and record the outcome on the job and its note"""
+    note = job.note
+    logger.info(f"Worker {job.locked_by} processing OCR job {job.id} for note {note.public_id} "
+                f"(attempt {job.attempts}/{job.max_attempts})")
+
+    try:
+        output_filename = f"note_{note.public_id}"
+        markdown_path = _reuse_duplicate_markdown(note, output_filename)
+        if not markdown_path:
+            markdown_path = ocr_service.convert_to_markdown(
+                resolve_path(note.file_path), output_filename, on_page=_page_recorder(note)
+            )
+        error = None if markdown_path else 'OCR conversion produced no markdown'
+    except Exception as e:
+        logger.error(f"Error during OCR conversion: {str(e)}", exc_info=True)
+        markdown_path = None
+        error = str(e)
+
+    if markdown_path:
+        note.markdown_path = storage_key(markdown_path)
+        note.ocr_status = 'completed'
+        record_markdown(note)
+        job.status = 'completed'
+        job.last_error = None
+        job.locked_by = None
+        job.locked_at = None
+        # Make the OCR text searchable in the same commit that marks it completed
+        search_index.index_note(note, body=search_index.read_markdown(note) or '')
+        logger.info(f"OCR conversion completed for note {note.public_id}")
+    else:
+        _fail_or_retry(job, error)
+
+    # Per-page markdown only serves readers while the conversion runs
+    NotePage.query.filter_by(note_id=note.id).delete(synchronize_session=False)
+    db.session.commit()
+    publish_status(note)
+
+
+def ocr_status_event(note):
+    """OCR state of a note as sent to /ocr-status/stream subscribers"""
+    return {
+        'public_id': note.public_id,
+        'ocr_status': note.ocr_status,
+        'pages_done': note.pages_done,
+        'pages_total': note.pages_total,
+        'has_markdown': note.has_markdown
+    }
+
+
+def publish_status(note):
+    """Push the note's committed OCR state to stream subscribers"""
+    event_bus.publish(note.public_id, ocr_status_event(note))
+
+
+def _page_recorder(note):
+    """
+    ``on_page`` callback for convert_to_markdown: store each page as it finishes
+    and commit right away, so the markdown endpoint can serve it while the rest
+    of the document is still being converted.
+    """
+    def record_page(index, total, markdown):
+        try:
+            db.session.add(NotePage(note_id=note.id, page_number=index + 1, markdown=markdown or ''))
+            note.pages_total = total
+            note.pages_done = (note.pages_done or 0) + 1
+            db.session.commit()
+            publish_status(note)
+        except Exception as e:
+            # Progress is best effort; the conversion itself carries on
+            db.session.rollback()
+            logger.warning(f"Could not store page {index + 1} of note {note.public_id}: {str(e)}")
+    return record_page
+
+
+def _clear_pages(note):
+    """Reset page progress of a note whose conversion is (re)starting; the caller commits"""
+    NotePage.query.filter_by(note_id=note.id).delete(synchronize_session=False)
+    note.pages_done = 0
+    note.pages_total = None
+
+
+def _reuse_duplicate_markdown(note, output_filename):
+    """
+    Copy the markdown of an already converted note with the same file blob.
+    Returns the new markdown path, or None if there is no usable duplicate.
+    """
+    if not note.file_hash:
+        return None
+
+    duplicate = Note.query.filter(
+        Note.file_hash == note.file_hash,
+        Note.id != note.id,
+        Note.ocr_status == 'completed',
+        Note.markdown_path.isnot(None)
+    ).first()
+    if not duplicate:
+        return None
+
+    target_path = os.path.normpath(os.path.join(ocr_service.markdown_dir, f"{output_filename}.md"))
+    try:
+        shutil.copyfile(resolve_path(duplicate.markdown_path), target_path)
+    except FileNotFoundError:
+        return None
+    logger.info(f"Reused markdown of note {duplicate.public_id} for duplicate upload {note.public_id}")
+    return target_path
+
+
+def requeue_stale_jobs():
+    """Release jobs whose worker died mid-conversion (lock older than OCR_JOB_LOCK_TIMEOUT)"""
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['OCR_JOB_LOCK_TIMEOUT'])
+    stale_jobs = OCRJob.query.filter(
+        OCRJob.status == 'running',
+        OCRJob.locked_at < cutoff
+    ).all()
+
+    for job in stale_jobs:
+        logger.warning(f"OCR job {job.id} held by {job.locked_by} timed out, releasing")
+        _fail_or_retry(job, f'Worker {job.locked_by} timed out')
+
+    db.session.commit()
+    for job in stale_jobs:
+        publish_status(job.note)
+    return len(stale_jobs)
+
+
+def _fail_or_retry(job, error):
+    """Schedule a retry with exponential backoff, or fail the job once attempts run out"""
+    job.last_error = error
+    job.locked_by = None
+    job.locked_at = None
+
+    if job.attempts >= job.max_attempts:
+        job.status = 'failed'
+        job.note.ocr_status = 'failed'
+        logger.error(f"OCR job {job.id} failed permanently for note {job.note.public_id}: {error}")
+    else:
+        delay = current_app.config['OCR_JOB_RETRY_DELAY'] * 2 ** (job.attempts - 1)
+        job.status = 'queued'
+        job.run_after = datetime.utcnow() + timedelta(seconds=delay)
+        job.note.ocr_status = 'pending'
+        logger.warning(f"OCR job {job.id} failed ({error}), retrying in {delay}s")
+
+
+def run_worker(app, worker_id=None, once=False):
+    """
+    Worker loop: claim and process jobs until interrupted.
+
+    Args:
+        app: Flask application
+        worker_id (str): Identifier recorded on claimed jobs (default: host:pid)
+        once (bool): Exit when the queue is empty instead of polling forever
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+
+    with app.app_context():
+        poll_interval = app.config['OCR_WORKER_POLL_INTERVAL']
+        verify_interval = app.config['MARKDOWN_VERIFY_INTERVAL']
+        last_sweep = 0
+        last_verify = 0
+        logger.info(f"OCR worker {worker_id} started")
+
+        while True:
+            try:
+                if time.monotonic() - last_sweep >= STALE_SWEEP_INTERVAL:
+                    requeue_stale_jobs()
+                    event_bus.prune(app.config['EVENT_RETENTION'])
+                    last_sweep = time.monotonic()
+
+                if time.monotonic() - last_verify >= verify_interval:
+                    verify_markdown_batch()
+                    last_verify = time.monotonic()
+
+                job = claim_next_job(worker_id)
+                if job is None:
+                    # Idle: catch up on recommendations invalidated by user activity or expired
+                    refreshed = refresh_stale_recommendations()
+                    if refreshed:
+                        logger.info(f"Refreshed recommendations for {refreshed} users")
+                        continue
+                    if once:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                process_job(job)
+            except Exception as e:
+                logger.error(f"OCR worker error: {str(e)}", exc_info=True)
+                db.session.rollback()
+                time.sleep(poll_interval)
+            finally:
+                # Drop the identity map between jobs so a long-lived worker doesn't grow
+                db.session.remove()
+
+        logger.info(f"OCR worker {worker_id} stopped: queue empty")
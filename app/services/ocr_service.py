@@ -3,24 +3,57 @@ OCR Service using Google Gemini AI for converting handwritten notes to markdown.
 This service handles the conversion of PDF/image files to markdown format using Gemini Vision API.
 """
 import os
+import io
+import math
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
 import fitz  # PyMuPDF
 from PIL import Image
 from google import genai
 from google.genai import types
+from .ocr_cache import ocr_cache
+from .file_service import get_markdown_folder
 
 logger = logging.getLogger(__name__)
 
 # Configuration
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+GEMINI_MODEL = 'gemini-2.0-flash-exp'
+# Max pages of one note sent to Gemini at the same time
+OCR_PAGE_CONCURRENCY = max(1, int(os.getenv('OCR_PAGE_CONCURRENCY', 4)))
+# Max Gemini page requests in flight across all notes in this process
+OCR_GLOBAL_CONCURRENCY = max(1, int(os.getenv('OCR_GLOBAL_CONCURRENCY', 8)))
+# PDF render scale (2x gives Gemini enough detail for handwriting)
+OCR_RENDER_ZOOM = float(os.getenv('OCR_RENDER_ZOOM', 2))
+# Memory ceiling per rendered page; larger pages are rendered at a lower zoom
+OCR_MAX_PAGE_PIXELS = int(os.getenv('OCR_MAX_PAGE_PIXELS', 16_000_000))
+
+OCR_PROMPT = """Convert this handwritten note/document to markdown format. 
+                
+Instructions:
+- Extract ALL text accurately, including handwritten notes
+- Preserve mathematical equations in LaTeX format (use $...$ for inline and $$...$$ for block equations) and make them such that they follow the markdown rules. they should be seen properly in markdown. don't add them as code. add them as actual 
+- Maintain proper heading hierarchy with #, ##, ###
+- Use lists (- or 1.) where appropriate
+- Preserve tables in markdown table format
+- Keep the formatting clean and readable
+- If there are diagrams, describe them in [Image: description] format
+
+Return ONLY the markdown content, no explanations."""
+
+# Shared by every conversion so concurrent notes can't exceed the global cap
+_global_page_slots = threading.BoundedSemaphore(OCR_GLOBAL_CONCURRENCY)
+
+
+class OCRCancelled(Exception):
+    """Raised inside a page worker when a sibling page already failed"""
+
 
 def get_markdown_output_dir():
     """Get absolute path to markdown output directory"""
-    # Get project root directory
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(os.path.dirname(current_dir))
-    return os.path.join(project_root, 'uploads', 'markdown')
+    return get_markdown_folder()
 
 class GeminiOCRService:
     """Service for handling OCR conversion using Google Gemini AI"""
@@ -43,13 +76,15 @@ class GeminiOCRService:
         if not os.path.exists(self.markdown_dir):
             os.makedirs(self.markdown_dir)
     
-    def convert_to_markdown(self, input_file_path, output_filename=None):
+    def convert_to_markdown(self, input_file_path, output_filename=None, on_page=None):
         """
         Convert a PDF or image file to markdown using Gemini AI.
         
         Args:
             input_file_path (str): Path to the input PDF or image file
             output_filename (str): Optional custom output filename (without extension)
+            on_page (callable): Optional ``on_page(index, total, markdown)``, called in
+                the calling thread as each page finishes (in completion order)
             
         Returns:
             str: Path to the generated markdown file, or None if conversion failed
@@ -75,18 +110,22 @@ class GeminiOCRService:
             file_ext = os.path.splitext(input_file_path)[1].lower()
             
             if file_ext == '.pdf':
-                # Convert PDF to images
-                images = self._pdf_to_images(input_file_path)
+                pdf_document = fitz.open(input_file_path)
+                try:
+                    # Pages are rendered lazily, one at a time, as OCR slots free up
+                    markdown_content = self._process_pages_with_gemini(
+                        self._iter_pdf_pages(pdf_document), len(pdf_document), on_page
+                    )
+                finally:
+                    pdf_document.close()
             elif file_ext in ['.jpg', '.jpeg', '.png']:
-                # Load single image
-                images = [Image.open(input_file_path)]
+                markdown_content = self._process_pages_with_gemini(
+                    self._iter_image_pages(input_file_path), 1, on_page
+                )
             else:
                 logger.error(f"Unsupported file type: {file_ext}")
                 return None
             
-            # Process all images with Gemini
-            markdown_content = self._process_images_with_gemini(images)
-            
             if not markdown_content:
                 logger.error("No markdown content generated")
                 return None
@@ -104,112 +143,179 @@ class GeminiOCRService:
             logger.error(f"Error during OCR conversion: {str(e)}", exc_info=True)
             return None
     
-    def _pdf_to_images(self, pdf_path):
-        """Convert PDF pages to PIL Images"""
-        images = []
-        try:
-            pdf_document = fitz.open(pdf_path)
-            for page_num in range(len(pdf_document)):
-                page = pdf_document[page_num]
-                # Render page to pixmap (image)
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x zoom for better quality
-                # Convert to PIL Image
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                images.append(img)
-            pdf_document.close()
-            logger.info(f"Converted PDF to {len(images)} images")
-        except Exception as e:
-            logger.error(f"Error converting PDF to images: {str(e)}")
-        return images
+    def _iter_pdf_pages(self, pdf_document):
+        """Render PDF pages one at a time, yielding PNG bytes"""
+        for page in pdf_document:
+            pix = page.get_pixmap(matrix=self._render_matrix(page))
+            png_bytes = pix.tobytes('png')
+            # Drop the raw pixmap before the caller asks for the next page
+            del pix
+            yield png_bytes
+    
+    def _render_matrix(self, page):
+        """Zoom matrix for a page, scaled down if it would exceed OCR_MAX_PAGE_PIXELS"""
+        zoom = OCR_RENDER_ZOOM
+        pixels = page.rect.width * page.rect.height * zoom * zoom
+        if pixels > OCR_MAX_PAGE_PIXELS:
+            zoom *= math.sqrt(OCR_MAX_PAGE_PIXELS / pixels)
+        return fitz.Matrix(zoom, zoom)
+    
+    def _iter_image_pages(self, image_path):
+        """Yield a single image file as PNG bytes, downscaled to OCR_MAX_PAGE_PIXELS"""
+        with Image.open(image_path) as img:
+            if img.mode not in ['RGB', 'L']:
+                img = img.convert('RGB')
+            pixels = img.width * img.height
+            if pixels > OCR_MAX_PAGE_PIXELS:
+                scale = math.sqrt(OCR_MAX_PAGE_PIXELS / pixels)
+                img = img.resize((int(img.width * scale), int(img.height * scale)))
+            img_byte_arr = io.BytesIO()
+            img.save(img_byte_arr, format='PNG')
+        yield img_byte_arr.getvalue()
     
-    def _process_images_with_gemini(self, images):
-        """Process images with Gemini and return markdown"""
+    def _process_pages_with_gemini(self, pages, total, on_page=None):
+        """
+        OCR a stream of PNG pages with Gemini and return markdown in page order.
+        Pages are sent concurrently (up to OCR_PAGE_CONCURRENCY per note and
+        OCR_GLOBAL_CONCURRENCY per process), but only one page beyond the
+        in-flight ones is pulled from ``pages`` at a time, so memory stays
+        bounded by a few rendered pages regardless of document length.
+        If any page fails the remaining pages are cancelled and the whole
+        conversion fails.
+        
+        Args:
+            pages: Iterable of PNG bytes, one per page
+            total (int): Number of pages, for logging
+            on_page (callable): Optional ``on_page(index, total, markdown)`` per finished page
+        """
+        if not total:
+            return None
+        
+        results = {}
+        pending = {}
+        cancel_event = threading.Event()
+        max_workers = min(OCR_PAGE_CONCURRENCY, total)
+        window = max_workers + 1
+        
         try:
-            all_markdown = []
-            
-            for idx, img in enumerate(images):
-                logger.info(f"Processing image {idx + 1}/{len(images)}")
-                
-                prompt = """Convert this handwritten note/document to markdown format. 
-                
-Instructions:
-- Extract ALL text accurately, including handwritten notes
-- Preserve mathematical equations in LaTeX format (use $...$ for inline and $$...$$ for block equations) and make them such that they follow the markdown rules. they should be seen properly in markdown. don't add them as code. add them as actual 
-- Maintain proper heading hierarchy with #, ##, ###
-- Use lists (- or 1.) where appropriate
-- Preserve tables in markdown table format
-- Keep the formatting clean and readable
-- If there are diagrams, describe them in [Image: description] format
-
-Return ONLY the markdown content, no explanations."""
-                
-                # Convert PIL Image to bytes
-                import io
-                img_byte_arr = io.BytesIO()
-                img.save(img_byte_arr, format='PNG')
-                img_bytes = img_byte_arr.getvalue()
-                
-                # Use the client to generate content with the new SDK
-                response = self.client.models.generate_content(
-                    model='gemini-2.0-flash-exp',
-                    contents=[
-                        prompt, 
-                        types.Part.from_bytes(data=img_bytes, mime_type='image/png')
-                    ]
-                )
-                
-                if response.text:
-                    # Extract markdown content from code blocks
-                    content = response.text
-                    
-                    # Check if content is wrapped in ```markdown ... ```
-                    if '```markdown' in content:
-                        # Extract content between ```markdown and ```
-                        start = content.find('```markdown') + len('```markdown')
-                        end = content.find('```', start)
-                        if end != -1:
-                            content = content[start:end].strip()
-                    elif '```' in content:
-                        # Handle generic code blocks
-                        start = content.find('```') + 3
-                        # Skip language identifier if present
-                        newline = content.find('\n', start)
-                        if newline != -1:
-                            start = newline + 1
-                        end = content.find('```', start)
-                        if end != -1:
-                            content = content[start:end].strip()
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ocr-page') as executor:
+                try:
+                    for idx, png_bytes in enumerate(pages):
+                        future = executor.submit(self._process_page, png_bytes, idx, total, cancel_event)
+                        pending[future] = idx
+                        del png_bytes
+                        # Don't render further ahead until a slot frees up
+                        while len(pending) >= window:
+                            self._collect_pages(pending, results, total, on_page)
                     
-                    all_markdown.append(content)
+                    while pending:
+                        self._collect_pages(pending, results, total, on_page)
+                except BaseException:
+                    # Stop queued pages from starting and in-flight ones from retrying
+                    cancel_event.set()
+                    for future in pending:
+                        future.cancel()
+                    raise
             
-            return "\n".join(all_markdown)
+            return "\n".join(results[idx] for idx in sorted(results) if results[idx])
             
         except Exception as e:
             logger.error(f"Error processing with Gemini: {str(e)}", exc_info=True)
             return None
     
-    def convert_async(self, input_file_path, note_id, callback=None):
+    @staticmethod
+    def _collect_pages(pending, results, total, on_page=None):
+        """Wait for at least one in-flight page and move finished pages into results"""
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            idx = pending.pop(future)
+            # Re-raises the page's exception, which aborts the conversion
+            results[idx] = future.result()
+            if on_page:
+                on_page(idx, total, results[idx])
+    
+    def _process_page(self, img_bytes, idx, total, cancel_event):
+        """OCR a single PNG page; runs in a worker thread"""
+        # Pages seen before (same bytes, model and prompt) never reach Gemini
+        cache_key = ocr_cache.make_key(img_bytes, GEMINI_MODEL, OCR_PROMPT)
+        cached = ocr_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Page {idx + 1}/{total} served from OCR cache")
+            return cached
+        
+        # Wait for a global slot, giving up as soon as a sibling page fails
+        while not _global_page_slots.acquire(timeout=0.5):
+            if cancel_event.is_set():
+                raise OCRCancelled()
+        
+        try:
+            if cancel_event.is_set():
+                raise OCRCancelled()
+            
+            logger.info(f"Processing page {idx + 1}/{total}")
+            
+            # Use the client to generate content with the new SDK
+            response = self.client.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=[
+                    OCR_PROMPT, 
+                    types.Part.from_bytes(data=img_bytes, mime_type='image/png')
+                ]
+            )
+            
+            if not response.text:
+                return None
+            content = self._extract_markdown(response.text)
+            ocr_cache.put(cache_key, content)
+            return content
+        finally:
+            _global_page_slots.release()
+    
+    @staticmethod
+    def _extract_markdown(content):
+        """Strip a surrounding code fence from Gemini's response, if any"""
+        # Check if content is wrapped in ```markdown ... ```
+        if '```markdown' in content:
+            # Extract content between ```markdown and ```
+            start = content.find('```markdown') + len('```markdown')
+            end = content.find('```', start)
+            if end != -1:
+                content = content[start:end].strip()
+        elif '```' in content:
+            # Handle generic code blocks
+            start = content.find('```') + 3
+            # Skip language identifier if present
+            newline = content.find('\n', start)
+            if newline != -1:
+                start = newline + 1
+            end = content.find('```', start)
+            if end != -1:
+                content = content[start:end].strip()
+        return content
+    
+    def convert_async(self, note_id):
         """
-        Asynchronously convert a file to markdown (for background processing).
-        This is a placeholder for future async implementation.
+        Queue a note for background conversion by the OCR worker (see worker.py).
+        Must be called inside an application context.
         
         Args:
-            input_file_path (str): Path to input file
             note_id (str): Note public ID
-            callback (callable): Optional callback function after completion
             
         Returns:
             bool: True if conversion was queued successfully
         """
-        # TODO: Implement with Celery or similar task queue
-        # For now, just do synchronous conversion
-        output_filename = f"note_{note_id}"
-        result = self.convert_to_markdown(input_file_path, output_filename)
+        from app.extensions import db
+        from app.models.note import Note
+        from .ocr_queue import enqueue_ocr_job
         
-        if callback and result:
-            callback(note_id, result)
+        note = Note.query.filter_by(public_id=note_id).first()
+        if not note:
+            logger.error(f"Cannot queue OCR, note not found: {note_id}")
+            return False
         
-        return result is not None
+        enqueue_ocr_job(note)
+        db.session.commit()
+        return True
 
 
 # Singleton instance
@@ -0,0 +1,231 @@
+"""
+Precomputed note recommendations.
+Each user's top RECOMMENDATION_TOP_N notes are scored in a single SQL query and
+stored in ``user_recommendation``; the recommended endpoint pages straight out
+of that table. Events that change a user's inputs (bookmarks, follows,
+enrollments, new notes from followed users or in their courses) only mark the
+user dirty; the OCR worker recomputes dirty users and users whose list is past
+its TTL in the background. A request serves the stored rows even when stale and
+only computes inline for a user who has none yet.
+
+Scoring strategies (weights add up when a note matches several):
+    5   public notes by users they follow
+    4   notes in courses they are enrolled in
+    3   notes sharing a tag with their bookmarks (bookmarks themselves excluded)
+    1   the 20 most viewed notes
+    0.5 the 15 newest notes of the last 7 days
+"""
+import logging
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, union_all, literal, func, insert, and_, or_
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+from app.models.note import Note
+from app.models.recommendation import UserRecommendation, RecommendationState
+from app.models.associations import followers, course_users, note_courses, note_tags, user_bookmarks
+
+logger = logging.getLogger(__name__)
+
+# How many notes the popularity fallback stores for users with no signals
+FALLBACK_LIMIT = 50
+# How many dirty or expired users the worker recomputes per idle poll
+REFRESH_BATCH_SIZE = 50
+
+
+def _candidates(user_id):
+    """Union of (note_id, weight) rows from every strategy"""
+    bookmarked = select(user_bookmarks.c.note_id).where(user_bookmarks.c.user_id == user_id)
+    public_not_own = and_(Note.is_public == True, Note.owner_id != user_id)
+
+    bookmarked_tags = select(note_tags.c.tag_id).where(note_tags.c.note_id.in_(bookmarked))
+    similar_tags = select(note_tags.c.note_id.label('note_id'), literal(3.0).label('weight'))\
+        .join(Note, Note.id == note_tags.c.note_id)\
+        .where(note_tags.c.tag_id.in_(bookmarked_tags), public_not_own, Note.id.not_in(bookmarked))\
+        .distinct()
+
+    followed = select(Note.id.label('note_id'), literal(5.0).label('weight'))\
+        .join(followers, followers.c.followed_id == Note.owner_id)\
+        .where(followers.c.follower_id == user_id, Note.is_public == True)\
+        .distinct()
+
+    enrolled_courses = select(course_users.c.course_id).where(course_users.c.user_id == user_id)
+    in_courses = select(note_courses.c.note_id.label('note_id'), literal(4.0).label('weight'))\
+        .join(Note, Note.id == note_courses.c.note_id)\
+        .where(note_courses.c.course_id.in_(enrolled_courses), public_not_own)\
+        .distinct()
+
+    popular = select(Note.id.label('note_id'), literal(1.0).label('weight'))\
+        .where(public_not_own, Note.view_count > 0)\
+        .order_by(Note.view_count.desc()).limit(20).subquery()
+
+    recent_cutoff = datetime.utcnow() - timedelta(days=7)
+    recent = select(Note.id.label('note_id'), literal(0.5).label('weight'))\
+        .where(public_not_own, Note.created_at >= recent_cutoff)\
+        .order_by(Note.created_at.desc()).limit(15).subquery()
+
+    return union_all(
+        similar_tags, followed, in_courses,
+        select(popular.c.note_id, popular.c.weight),
+        select(recent.c.note_id, recent.c.weight)
+    ).subquery('candidates')
+
+
+def score_notes(user_id, limit):
+    """
+    Score candidate notes for a user in the database.
+
+    Returns:
+        list of (note_id, score), best first
+    """
+    candidates = _candidates(user_id)
+    score = func.sum(candidates.c.weight).label('score')
+    rows = db.session.execute(
+        select(candidates.c.note_id, score)
+        .join(Note, Note.id == candidates.c.note_id)
+        .group_by(candidates.c.note_id, Note.view_count)
+        .order_by(score.desc(), func.coalesce(Note.view_count, 0).desc(), candidates.c.note_id.desc())
+        .limit(limit)
+    ).all()
+
+    if not rows:
+        # No signals yet: most viewed public notes
+        rows = db.session.execute(
+            select(Note.id, literal(0.0))
+            .where(Note.is_public == True, Note.owner_id != user_id)
+            .order_by(func.coalesce(Note.view_count, 0).desc(), Note.id.desc())
+            .limit(min(limit, FALLBACK_LIMIT))
+        ).all()
+
+    return [(note_id, float(score)) for note_id, score in rows]
+
+
+def refresh_recommendations(user_id):
+    """
+    Recompute and store a user's recommendations. The caller commits.
+
+    Returns:
+        int: Number of notes stored
+    """
+    scored = score_notes(user_id, current_app.config['RECOMMENDATION_TOP_N'])
+
+    UserRecommendation.query.filter_by(user_id=user_id).delete(synchronize_session=False)
+    if scored:
+        db.session.execute(insert(UserRecommendation), [
+            {'user_id': user_id, 'note_id': note_id, 'position': position, 'score': score}
+            for position, (note_id, score) in enumerate(scored)
+        ])
+
+    state = db.session.get(RecommendationState, user_id)
+    if state is None:
+        state = RecommendationState(user_id=user_id)
+        db.session.add(state)
+    state.dirty = False
+    state.refreshed_at = datetime.utcnow()
+    return len(scored)
+
+
+def _expiry_cutoff():
+    """Lists refreshed before this are past RECOMMENDATION_TTL"""
+    return datetime.utcnow() - timedelta(seconds=current_app.config['RECOMMENDATION_TTL'])
+
+
+def ensure_fresh(user_id):
+    """
+    Make sure a user has stored recommendations to serve. Stale lists are served
+    as they are and left to the worker; only a user with none is computed inline.
+    """
+    state = db.session.get(RecommendationState, user_id)
+    if state is not None and not state.dirty and state.refreshed_at >= _expiry_cutoff():
+        return
+
+    if state is not None and db.session.query(
+        UserRecommendation.query.filter_by(user_id=user_id).exists()
+    ).scalar():
+        if not state.dirty:
+            # Expired: queue it for the worker instead of scoring in the request
+            mark_dirty([user_id])
+            db.session.commit()
+        return
+
+    try:
+        refresh_recommendations(user_id)
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request refreshed the same user first; serve its result
+        db.session.rollback()
+
+
+def recommended_notes_query(user_id):
+    """Query of a user's stored recommendations in rank order (still-public notes only)"""
+    return Note.query.join(UserRecommendation, and_(
+        UserRecommendation.note_id == Note.id,
+        UserRecommendation.user_id == user_id
+    )).filter(Note.is_public == True).order_by(UserRecommendation.position)
+
+
+def mark_dirty(user_ids):
+    """Flag users whose recommendation inputs changed. The caller commits."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    RecommendationState.query.filter(RecommendationState.user_id.in_(user_ids))\
+        .update({'dirty': True}, synchronize_session=False)
+
+
+def mark_note_audience_dirty(note):
+    """
+    Flag every user whose recommendations a note can appear in: followers of
+    its owner, students of its courses and users who bookmarked notes sharing
+    one of its tags. Call when a note is created, changes visibility or gets
+    new tags/courses. The caller commits.
+    """
+    mark_notes_audience_dirty([note.id])
+
+
+def mark_notes_audience_dirty(note_ids):
+    """mark_note_audience_dirty for many notes (ids) with one UPDATE"""
+    if not note_ids:
+        return
+    note_tag_ids = select(note_tags.c.tag_id).where(note_tags.c.note_id.in_(note_ids))
+    same_tag_notes = select(note_tags.c.note_id).where(note_tags.c.tag_id.in_(note_tag_ids))
+    note_course_ids = select(note_courses.c.course_id).where(note_courses.c.note_id.in_(note_ids))
+    owner_ids = select(Note.owner_id).where(Note.id.in_(note_ids))
+
+    RecommendationState.query.filter(or_(
+        RecommendationState.user_id.in_(
+            select(followers.c.follower_id).where(followers.c.followed_id.in_(owner_ids))
+        ),
+        RecommendationState.user_id.in_(
+            select(course_users.c.user_id).where(course_users.c.course_id.in_(note_course_ids))
+        ),
+        RecommendationState.user_id.in_(
+            select(user_bookmarks.c.user_id).where(user_bookmarks.c.note_id.in_(same_tag_notes))
+        )
+    )).update({'dirty': True}, synchronize_session=False)
+
+
+def remove_note_recommendations(note):
+    """Drop a note from every stored list before it is deleted. The caller commits."""
+    # Explicit because SQLite doesn't enforce the ON DELETE CASCADE
+    UserRecommendation.query.filter_by(note_id=note.id).delete(synchronize_session=False)
+
+
+def refresh_stale_recommendations(limit=REFRESH_BATCH_SIZE):
+    """
+    Recompute a batch of dirty or expired users, oldest first (run by the worker
+    between OCR jobs).
+
+    Returns:
+        int: Number of users refreshed
+    """
+    user_ids = [user_id for (user_id,) in db.session.query(RecommendationState.user_id)
+                .filter(or_(RecommendationState.dirty == True,
+                            RecommendationState.refreshed_at < _expiry_cutoff()))
+                .order_by(RecommendationState.refreshed_at)
+                .limit(limit).all()]
+
+    for user_id in user_ids:
+        refresh_recommendations(user_id)
+    db.session.commit()
+    return len(user_ids)
@@ -0,0 +1,222 @@
+"""
+Full-text search index over note titles, descriptions and OCR markdown.
+SQLite databases use an FTS5 virtual table ranked with BM25; PostgreSQL uses a
+weighted ``tsvector`` column with a GIN index ranked with ts_rank_cd.
+Both live in a ``note_search`` table keyed by note id, written in the same
+transaction as the note change that triggers them.
+"""
+import re
+import logging
+from sqlalchemy import text, bindparam, event, Integer, Float
+from sqlalchemy.orm import lazyload
+from app.extensions import db
+from app.models.note import Note
+from .file_service import resolve_path
+
+logger = logging.getLogger(__name__)
+
+SNIPPET_START = '<mark>'
+SNIPPET_END = '</mark>'
+# Column weights: a hit in the title counts more than one in the body
+TITLE_WEIGHT, DESCRIPTION_WEIGHT, BODY_WEIGHT = 10.0, 5.0, 1.0
+
+SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS note_search USING fts5("
+    "title, description, body, tokenize='porter unicode61')"
+)
+POSTGRES_DDL = (
+    "CREATE TABLE IF NOT EXISTS note_search ("
+    "note_id INTEGER PRIMARY KEY REFERENCES note (id) ON DELETE CASCADE, "
+    "title TEXT, description TEXT, body TEXT, "
+    "document tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(body, '')), 'C')) STORED)",
+    "CREATE INDEX IF NOT EXISTS ix_note_search_document ON note_search USING GIN (document)"
+)
+
+
+def _dialect():
+    return db.engine.dialect.name
+
+
+def is_supported():
+    """Whether the current database has a full-text index backend"""
+    return _dialect() in ('sqlite', 'postgresql')
+
+
+def _create_index_table(target, connection, **kw):
+    """Create note_search alongside the note table (db.create_all); migrations cover existing databases"""
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text(SQLITE_DDL))
+    elif connection.dialect.name == 'postgresql':
+        for statement in POSTGRES_DDL:
+            connection.execute(text(statement))
+
+
+def _drop_index_table(target, connection, **kw):
+    if connection.dialect.name in ('sqlite', 'postgresql'):
+        connection.execute(text("DROP TABLE IF EXISTS note_search"))
+
+
+event.listen(Note.__table__, 'after_create', _create_index_table)
+event.listen(Note.__table__, 'before_drop', _drop_index_table)
+
+
+def read_markdown(note):
+    """Return the OCR markdown of a note, or None if it isn't available"""
+    if note.ocr_status != 'completed' or not note.markdown_path:
+        return None
+    try:
+        with open(resolve_path(note.markdown_path), 'r', encoding='utf-8') as f:
+            return f.read()
+    except (OSError, TypeError) as e:
+        logger.warning(f"Could not read markdown of note {note.public_id} for indexing: {str(e)}")
+        return None
+
+
+def index_note(note, body=None):
+    """
+    Insert or update a note's search entry. Runs in the caller's transaction.
+
+    Args:
+        note: Note instance (flushed, so it has an id)
+        body (str): OCR markdown; if None an existing body is kept, or read
+            from the markdown file for notes not indexed yet
+    """
+    if not is_supported():
+        return
+
+    params = {'note_id': note.id, 'title': note.title or '', 'description': note.description or ''}
+
+    if _dialect() == 'sqlite':
+        if body is None:
+            updated = db.session.execute(text(
+                "UPDATE note_search SET title = :title, description = :description WHERE rowid = :note_id"
+            ), params).rowcount
+            if updated:
+                return
+            body = read_markdown(note)
+        db.session.execute(text("DELETE FROM note_search WHERE rowid = :note_id"), params)
+        db.session.execute(text(
+            "INSERT INTO note_search (rowid, title, description, body) "
+            "VALUES (:note_id, :title, :description, :body)"
+        ), dict(params, body=body or ''))
+    else:
+        if body is None:
+            db.session.execute(text(
+                "INSERT INTO note_search (note_id, title, description, body) "
+                "VALUES (:note_id, :title, :description, :body) "
+                "ON CONFLICT (note_id) DO UPDATE SET title = EXCLUDED.title, description = EXCLUDED.description"
+            ), dict(params, body=read_markdown(note) or ''))
+        else:
+            db.session.execute(text(
+                "INSERT INTO note_search (note_id, title, description, body) "
+                "VALUES (:note_id, :title, :description, :body) "
+                "ON CONFLICT (note_id) DO UPDATE SET title = EXCLUDED.title, "
+                "description = EXCLUDED.description, body = EXCLUDED.body"
+            ), dict(params, body=body))
+
+
+def remove_note(note):
+    """Drop a note's search entry. Call before deleting the note, in the same transaction."""
+    if not is_supported():
+        return
+    column = 'rowid' if _dialect() == 'sqlite' else 'note_id'
+    db.session.execute(text(f"DELETE FROM note_search WHERE {column} = :note_id"), {'note_id': note.id})
+
+
+def rebuild_index():
+    """
+    Re-index every note from scratch. The caller commits.
+
+    Returns:
+        int: Number of notes indexed
+    """
+    if not is_supported():
+        return 0
+    db.session.execute(text("DELETE FROM note_search"))
+    count = 0
+    # Relationships aren't needed here, and eager loaders can't stream with yield_per
+    for note in Note.query.options(lazyload('*')).yield_per(200):
+        index_note(note, body=read_markdown(note) or '')
+        count += 1
+    return count
+
+
+def _fts5_query(search_text):
+    """
+    Turn free text into a safe FTS5 query: every word must match, the last one
+    as a prefix so results show up while the user is still typing.
+    """
+    terms = re.findall(r'\w+', search_text)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def search_hits(search_text):
+    """
+    Subquery of notes matching ``search_text`` with columns ``note_id`` and
+    ``rank`` (lower is better on every backend). Join it to a Note query to
+    combine full-text search with other filters and pagination.
+
+    Returns:
+        Subquery, or None if the database has no full-text backend or the
+        text contains nothing searchable
+    """
+    if not is_supported():
+        return None
+
+    if _dialect() == 'sqlite':
+        match = _fts5_query(search_text)
+        if not match:
+            return None
+        stmt = text(
+            f"SELECT rowid AS note_id, "
+            f"bm25(note_search, {TITLE_WEIGHT}, {DESCRIPTION_WEIGHT}, {BODY_WEIGHT}) AS rank "
+            f"FROM note_search WHERE note_search MATCH :match"
+        ).bindparams(match=match)
+    else:
+        stmt = text(
+            "SELECT note_id, -ts_rank_cd(document, websearch_to_tsquery('english', :search_text)) AS rank "
+            "FROM note_search WHERE document @@ websearch_to_tsquery('english', :search_text)"
+        ).bindparams(search_text=search_text)
+
+    return stmt.columns(note_id=Integer, rank=Float).subquery('search_hits')
+
+
+def snippets_for(note_ids, search_text):
+    """
+    Highlighted snippets (matches wrapped in <mark>) for a page of results.
+    Only computed for the notes actually returned, so cost doesn't grow with
+    the number of matches.
+
+    Returns:
+        dict: note id -> snippet
+    """
+    if not note_ids or not is_supported():
+        return {}
+
+    if _dialect() == 'sqlite':
+        match = _fts5_query(search_text)
+        if not match:
+            return {}
+        stmt = text(
+            "SELECT rowid, snippet(note_search, -1, :start, :end, '...', 16) "
+            "FROM note_search WHERE note_search MATCH :match AND rowid IN :note_ids"
+        ).bindparams(bindparam('note_ids', expanding=True))
+        params = {'match': match}
+    else:
+        stmt = text(
+            "SELECT note_id, ts_headline('english', concat_ws(' ', title, description, body), "
+            "websearch_to_tsquery('english', :search_text), "
+            "'StartSel=' || :start || ', StopSel=' || :end || ', MaxWords=35, MinWords=15') "
+            "FROM note_search WHERE note_id IN :note_ids"
+        ).bindparams(bindparam('note_ids', expanding=True))
+        params = {'search_text': search_text}
+
+    rows = db.session.execute(stmt, dict(params, start=SNIPPET_START, end=SNIPPET_END, note_ids=list(note_ids)))
+    return {note_id: snippet for note_id, snippet in rows}
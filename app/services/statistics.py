@@ -0,0 +1,233 @@
+"""
+Denormalized counters for notes (``note_stats``) and users (``user_stats``).
+Every write that changes what they count adjusts them with ``col = col + delta``
+in the same transaction, so NoteStats, UserStats and the reaction endpoints
+are single primary-key reads however many notes, comments or reactions there
+are. Rows are created with their note/user (existing ones by the migration);
+a row that is missing anyway is ignored on write and computed live on read,
+and rebuild_statistics() recomputes everything with one GROUP BY per counter.
+"""
+import logging
+from sqlalchemy import func, update, insert, select, delete
+from app.extensions import db
+from app.models.note import Note
+from app.models.user import User
+from app.models.comment import Comment
+from app.models.reaction import NoteReaction
+from app.models.note_stats import NoteStatistics, UserStatistics
+from app.models.associations import followers, note_collaborators, user_bookmarks
+
+logger = logging.getLogger(__name__)
+
+REACTION_TYPES = ('concise', 'detailed', 'readable')
+
+
+def _reaction_column(reaction_type):
+    if reaction_type not in REACTION_TYPES:
+        raise ValueError(f'Unknown reaction type: {reaction_type}')
+    return f'{reaction_type}_count'
+
+
+def _note_sources():
+    """(counter column, key column, value expression, extra condition) for each note counter"""
+    sources = [
+        (_reaction_column(t), NoteReaction.note_id, func.count(), NoteReaction.reaction_type == t)
+        for t in REACTION_TYPES
+    ]
+    sources += [
+        ('comment_count', Comment.note_id, func.count(), None),
+        ('collaborator_count', note_collaborators.c.note_id, func.count(), None),
+        ('bookmark_count', user_bookmarks.c.note_id, func.count(), None),
+    ]
+    return sources
+
+
+def _user_sources():
+    """(counter column, key column, value expression, extra condition) for each user counter"""
+    return [
+        ('note_count', Note.owner_id, func.count(), None),
+        ('public_note_count', Note.owner_id, func.count(), Note.is_public.is_(True)),
+        ('total_views', Note.owner_id, func.sum(func.coalesce(Note.view_count, 0)), None),
+        ('total_downloads', Note.owner_id, func.sum(func.coalesce(Note.download_count, 0)), None),
+        ('follower_count', followers.c.followed_id, func.count(), None),
+        ('following_count', followers.c.follower_id, func.count(), None),
+        ('bookmark_count', user_bookmarks.c.user_id, func.count(), None),
+        ('comment_count', Comment.user_id, func.count(), None),
+    ]
+
+
+def _aggregate(key_column, sources, keys=None):
+    """
+    Select (key, counter...) computed from the source rows: one GROUP BY
+    subquery per counter, outer-joined to the owning table.
+
+    Args:
+        key_column: Primary key of the owning table (Note.id / User.id)
+        sources: _note_sources() or _user_sources()
+        keys: Restrict to these keys (the subqueries are filtered too)
+    """
+    columns = [key_column]
+    from_clause = key_column.table
+    for name, source_key, value, condition in sources:
+        conditions = [c for c in (condition, source_key.in_(keys) if keys is not None else None) if c is not None]
+        grouped = select(source_key.label('key'), value.label('n')).where(*conditions).group_by(source_key).subquery(name)
+        from_clause = from_clause.outerjoin(grouped, grouped.c.key == key_column)
+        columns.append(func.coalesce(grouped.c.n, 0).label(name))
+    query = select(*columns).select_from(from_clause)
+    if keys is not None:
+        query = query.where(key_column.in_(keys))
+    return query
+
+
+def _adjust(model, key, deltas):
+    """Add ``deltas`` ({column: amount}) to one stats row; the caller commits"""
+    deltas = {column: amount for column, amount in deltas.items() if amount}
+    if not deltas or key is None:
+        return
+    table = model.__table__
+    key_column = table.primary_key.columns.values()[0]
+    result = db.session.execute(update(table).where(key_column == key).values(
+        {column: table.c[column] + amount for column, amount in deltas.items()}
+    ))
+    if not result.rowcount:
+        logger.debug(f"No {table.name} row for {key}; counters are computed on read until a rebuild")
+
+
+def _read(model, key_column, sources, key):
+    """Counters of one row, computed from the source tables if the row is missing"""
+    stats = db.session.get(model, key)
+    if stats is not None:
+        return {name: getattr(stats, name) for name, *_ in sources}
+    row = db.session.execute(_aggregate(key_column, sources, [key])).first()
+    return {name: (row._mapping[name] if row else 0) for name, *_ in sources}
+
+
+def adjust_note_stats(note_id, **deltas):
+    """Add to a note's counters, e.g. ``adjust_note_stats(note.id, comment_count=1)``"""
+    _adjust(NoteStatistics, note_id, deltas)
+
+
+def adjust_user_stats(user_id, **deltas):
+    """Add to a user's counters, e.g. ``adjust_user_stats(user.id, bookmark_count=-1)``"""
+    _adjust(UserStatistics, user_id, deltas)
+
+
+def adjust_reaction_count(note_id, reaction_type, delta):
+    """
+    Add ``delta`` to a note's counter for ``reaction_type``.
+
+    Args:
+        note_id (int): Note primary key
+        reaction_type (str): One of REACTION_TYPES
+        delta (int): +1 when a reaction was added, -1 when removed
+    """
+    _adjust(NoteStatistics, note_id, {_reaction_column(reaction_type): delta})
+
+
+def note_statistics(note_id):
+    """All counters of a note, as a dict keyed by column name"""
+    return _read(NoteStatistics, Note.id, _note_sources(), note_id)
+
+
+def user_statistics(user_id):
+    """All counters of a user, as a dict keyed by column name"""
+    return _read(UserStatistics, User.id, _user_sources(), user_id)
+
+
+def reaction_counts(note_id):
+    """
+    Reaction counts of a note from its stats row.
+
+    Returns:
+        dict: reaction type -> count
+    """
+    stats = note_statistics(note_id)
+    return {t: stats[_reaction_column(t)] for t in REACTION_TYPES}
+
+
+def note_created(note):
+    """Counters for a new note (flushed, so it has an id); the caller commits"""
+    if note.stats is None:
+        note.stats = NoteStatistics()
+    adjust_user_stats(note.owner_id, note_count=1, public_note_count=1 if note.is_public else 0)
+
+
+def note_visibility_changed(note, was_public):
+    """Move a note between its owner's public and private counts, if it changed"""
+    if bool(note.is_public) != bool(was_public):
+        adjust_user_stats(note.owner_id, public_note_count=1 if note.is_public else -1)
+
+
+def note_deleted(note):
+    """
+    Take a note out of every user counter before it is deleted: its owner's,
+    and those of users whose comments and bookmarks go with it. Its own
+    stats row is deleted with it. The caller deletes and commits.
+    """
+    adjust_user_stats(
+        note.owner_id,
+        note_count=-1,
+        public_note_count=-1 if note.is_public else 0,
+        total_views=-(note.view_count or 0),
+        total_downloads=-(note.download_count or 0)
+    )
+    commenters = db.session.query(Comment.user_id, func.count()).filter(
+        Comment.note_id == note.id
+    ).group_by(Comment.user_id).all()
+    for user_id, count in commenters:
+        adjust_user_stats(user_id, comment_count=-count)
+    table = UserStatistics.__table__
+    db.session.execute(update(table).where(table.c.user_id.in_(
+        select(user_bookmarks.c.user_id).where(user_bookmarks.c.note_id == note.id)
+    )).values(bookmark_count=table.c.bookmark_count - 1))
+
+
+def user_created(user):
+    """Counters for a new user; the caller commits"""
+    if user.stats is None:
+        user.stats = UserStatistics()
+
+
+def user_deleted(user):
+    """
+    Take a user out of other users' follower/following counts, and out of the
+    bookmark and collaborator counts of notes they bookmarked or collaborate
+    on, before the user is deleted.
+    """
+    table = UserStatistics.__table__
+    db.session.execute(update(table).where(table.c.user_id.in_(
+        select(followers.c.follower_id).where(followers.c.followed_id == user.id)
+    )).values(following_count=table.c.following_count - 1))
+    db.session.execute(update(table).where(table.c.user_id.in_(
+        select(followers.c.followed_id).where(followers.c.follower_id == user.id)
+    )).values(follower_count=table.c.follower_count - 1))
+    note_table = NoteStatistics.__table__
+    db.session.execute(update(note_table).where(note_table.c.note_id.in_(
+        select(user_bookmarks.c.note_id).where(user_bookmarks.c.user_id == user.id)
+    )).values(bookmark_count=note_table.c.bookmark_count - 1))
+    db.session.execute(update(note_table).where(note_table.c.note_id.in_(
+        select(note_collaborators.c.note_id).where(note_collaborators.c.user_id == user.id)
+    )).values(collaborator_count=note_table.c.collaborator_count - 1))
+
+
+def rebuild_statistics():
+    """
+    Recompute every note_stats and user_stats row from the source tables.
+    The caller commits.
+
+    Returns:
+        dict: Rows written per table
+    """
+    db.session.flush()
+    rebuilt = {}
+    for model, key_column, sources in ((NoteStatistics, Note.id, _note_sources()),
+                                       (UserStatistics, User.id, _user_sources())):
+        table = model.__table__
+        db.session.execute(delete(table))
+        result = db.session.execute(insert(table).from_select(
+            [table.primary_key.columns.values()[0].name] + [name for name, *_ in sources],
+            _aggregate(key_column, sources)
+        ))
+        rebuilt[table.name] = result.rowcount
+    logger.info(f"Rebuilt statistics: {rebuilt}")
+    return rebuilt
@@ -0,0 +1,97 @@
+"""
+In-memory prefix index for tag autocomplete.
+All tag names are held in a name-sorted list with their note counts, so a
+suggestion is two bisects plus a top-N over the matching slice, without a
+database round trip. Answers are memoized per prefix until the next rebuild,
+so the short, broad prefixes every user types first cost a dict lookup. The
+list is rebuilt with a single GROUP BY query when this process writes tags
+(invalidate()) and at least every TAG_SUGGEST_TTL seconds, which picks up
+writes made by other processes and count changes as notes are tagged.
+"""
+import time
+import heapq
+import logging
+import threading
+from bisect import bisect_left
+from collections import namedtuple
+from .tags import tags_with_counts
+
+logger = logging.getLogger(__name__)
+
+TagSuggestion = namedtuple('TagSuggestion', 'id name note_count')
+
+# Sorts after every character a tag name can contain, closing the prefix range
+_PREFIX_END = '\U0010ffff'
+# Memoized answers kept per index build before starting over
+MAX_MEMOIZED_ANSWERS = 4096
+
+
+class TagSuggestIndex:
+    """Sorted tag names with note counts, answering prefix queries ranked by count"""
+
+    def __init__(self):
+        # (lowercased names sorted, TagSuggestion per name, answers by (prefix, limit)), swapped as one
+        self._index = ([], [], {})
+        self._loaded_at = None
+        self._generation = 0  # Bumped by invalidate(), so a rebuild racing a write is not kept
+        self._lock = threading.Lock()
+        self.ttl = 60
+
+    def init_app(self, app):
+        self.ttl = app.config['TAG_SUGGEST_TTL']
+
+    def invalidate(self):
+        """Drop the index; the next suggest() reloads it"""
+        self._generation += 1
+        self._loaded_at = None
+
+    def suggest(self, prefix, limit=10):
+        """
+        Tags whose name starts with ``prefix`` (case-insensitive).
+
+        Args:
+            prefix (str): Typed text; empty matches every tag
+            limit (int): Maximum number of suggestions
+
+        Returns:
+            tuple: TagSuggestion, most used first, ties by name
+        """
+        keys, entries, answers = self._current()
+        prefix = prefix.strip().lower()
+        cached = answers.get((prefix, limit))
+        if cached is not None:
+            return cached
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + _PREFIX_END, start)
+        # Entries are in name order, so nsmallest keeps name order among equal counts
+        suggestions = tuple(heapq.nsmallest(limit, entries[start:end], key=lambda entry: -entry.note_count))
+        if len(answers) >= MAX_MEMOIZED_ANSWERS:
+            answers.clear()
+        answers[(prefix, limit)] = suggestions
+        return suggestions
+
+    def _current(self):
+        """The loaded (keys, entries, answers), rebuilding them first if stale"""
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at > self.ttl:
+            with self._lock:
+                # Another request may have rebuilt it while we waited
+                if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+                    self._rebuild()
+        return self._index
+
+    def _rebuild(self):
+        generation = self._generation
+        query, _ = tags_with_counts()
+        rows = sorted(
+            ((tag.name.lower(), TagSuggestion(tag.id, tag.name, note_count)) for tag, note_count in query.all()),
+            key=lambda row: row[0]
+        )
+        self._index = ([key for key, _ in rows], [entry for _, entry in rows], {})
+        if generation == self._generation:
+            self._loaded_at = time.monotonic()
+        logger.debug(f"Tag suggest index rebuilt with {len(rows)} tags")
+
+
+# Singleton instance
+tag_suggestions = TagSuggestIndex()
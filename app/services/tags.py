@@ -0,0 +1,52 @@
+"""
+Tag queries shared by the tags and admin namespaces.
+Note counts come from one GROUP BY over ``note_tags`` (served by the
+``ix_note_tags_tag_id`` index) joined to the tags being listed, so listing or
+ranking tags never loads a Note.
+"""
+from sqlalchemy import func, select
+from app.extensions import db
+from app.models.tag import Tag
+from app.models.associations import note_tags
+
+
+def note_counts():
+    """Subquery of (tag_id, note_count) for every tag that has notes"""
+    return select(
+        note_tags.c.tag_id, func.count().label('note_count')
+    ).group_by(note_tags.c.tag_id).subquery('tag_note_counts')
+
+
+def tags_with_counts(query=None):
+    """
+    Attach note counts to a tag query.
+
+    Args:
+        query: Query over Tag to extend (default: all tags)
+
+    Returns:
+        tuple: (query yielding (Tag, note_count) rows, the note_count column
+        for ordering); tags without notes count 0
+    """
+    counts = note_counts()
+    count = func.coalesce(counts.c.note_count, 0)
+    query = query if query is not None else Tag.query
+    return query.outerjoin(counts, counts.c.tag_id == Tag.id).add_columns(count.label('note_count')), count
+
+
+def popular_tags(limit):
+    """
+    The ``limit`` tags with the most notes, ranked and cut in SQL.
+
+    Returns:
+        list: (Tag, note_count) rows, most used first, ties by name
+    """
+    query, count = tags_with_counts()
+    return query.order_by(count.desc(), Tag.name).limit(limit).all()
+
+
+def tag_note_count(tag_id):
+    """Number of notes carrying one tag, counted on the index"""
+    return db.session.scalar(
+        select(func.count()).select_from(note_tags).where(note_tags.c.tag_id == tag_id)
+    )
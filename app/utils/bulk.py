@@ -0,0 +1,57 @@
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from app.extensions import db
+
+# Rows per INSERT statement; keeps bound parameters under SQLite's per-statement limit
+BULK_CHUNK_SIZE = 500
+
+
+def _insert_ignoring_conflicts(table):
+    """INSERT statement for the session's dialect that skips rows clashing with an existing key"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if dialect == 'sqlite':
+        return sqlite.insert(table).on_conflict_do_nothing()
+    if dialect in ('mysql', 'mariadb'):
+        return insert(table).prefix_with('IGNORE')
+    raise NotImplementedError(f'insert_ignore is not supported on {dialect}')
+
+
+def insert_ignore(table, rows, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Multi-row INSERT that skips rows clashing with an existing key
+    (``ON CONFLICT DO NOTHING`` / ``INSERT IGNORE``), in chunks. The caller commits.
+
+    Args:
+        table: Table (or model ``__table__``) to insert into
+        rows (list): Dicts of column values, all with the same keys
+        chunk_size (int): Rows per statement
+
+    Returns:
+        int: Rows actually inserted
+    """
+    if not rows:
+        return 0
+    stmt = _insert_ignoring_conflicts(table)
+    inserted = 0
+    for start in range(0, len(rows), chunk_size):
+        result = db.session.execute(stmt.values(rows[start:start + chunk_size]))
+        inserted += result.rowcount
+    return inserted
+
+
+def insert_ignore_from_select(table, columns, query):
+    """
+    insert_ignore for rows produced by a SELECT, in one statement. The caller commits.
+
+    Args:
+        table: Table to insert into
+        columns (list): Column names the SELECT fills, in order
+        query: SELECT producing the rows; it needs a WHERE clause, which
+            SQLite requires to parse the trailing ON CONFLICT
+
+    Returns:
+        int: Rows actually inserted
+    """
+    return db.session.execute(_insert_ignoring_conflicts(table).from_select(columns, query)).rowcount
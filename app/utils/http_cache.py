@@ -0,0 +1,51 @@
+from flask import current_app, request, Response
+from werkzeug.http import http_date, quote_etag, is_resource_modified
+
+
+# Validators for note content come from the note row (content hashes and
+# timestamps), so a revalidation that ends in 304 never opens the file
+
+
+def cache_headers(etag, last_modified=None, public=False):
+    """
+    Validator and Cache-Control headers for a note file or its markdown.
+    
+    Args:
+        etag: Content hash used as a strong ETag (unquoted), or None
+        last_modified: Naive UTC datetime of the last content change, or None
+        public: Whether shared caches may store the response (public notes)
+    
+    Returns:
+        dict of response headers
+    """
+    if public:
+        cache_control = f"public, max-age={current_app.config['NOTE_CACHE_MAX_AGE']}"
+    else:
+        # Private notes may be kept by the browser but are revalidated on every use
+        cache_control = 'private, no-cache'
+    
+    headers = {'Cache-Control': cache_control}
+    if etag:
+        headers['ETag'] = quote_etag(etag)
+    if last_modified:
+        headers['Last-Modified'] = http_date(last_modified)
+    return headers
+
+
+def not_modified(etag, last_modified=None, public=False):
+    """
+    Answer a conditional GET from the validators alone.
+    
+    Args:
+        etag: Content hash used as a strong ETag (unquoted), or None
+        last_modified: Naive UTC datetime of the last content change, or None
+        public: Whether shared caches may store the response
+    
+    Returns:
+        A 304 response if If-None-Match / If-Modified-Since match, otherwise None
+    """
+    if not etag and not last_modified:
+        return None
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    return Response(status=304, headers=cache_headers(etag, last_modified, public))
@@ -1,28 +1,51 @@
+import json
+import base64
+import binascii
+from datetime import datetime
 from flask import request
-from flask_restx import fields
+from flask_restx import fields, abort
+from sqlalchemy import and_, or_, type_coerce, DateTime, String
 
 
-def paginate_query(query, page=None, per_page=None, max_per_page=100):
+def paginate_query(query, page=None, per_page=None, max_per_page=100, sort_keys=None, cursor=None):
     """
     Paginate a SQLAlchemy query.
     
+    Offset pagination (``?page=N``) is the default. Passing a ``cursor``
+    request argument (empty for the first page) switches to keyset
+    pagination, which stays fast on deep pages: each page filters on the
+    sort key of the previous page's last row instead of using OFFSET, and
+    the total is only counted when ``?with_total=true`` is given.
+    
     Args:
         query: SQLAlchemy query object
         page: Page number (1-indexed). If None, will get from request args
         per_page: Items per page. If None, will get from request args
         max_per_page: Maximum allowed items per page (default 100)
+        sort_keys: Cursor mode ordering as a list of (column, 'asc'|'desc');
+            the last key must be unique. Defaults to (created_at, id) descending
+            of the queried model
+        cursor: Opaque cursor from a previous page. If None, will get from request args
     
     Returns:
-        dict with: items, total, pages, current_page, has_next, has_prev
+        dict with: items, total, pages, current_page, has_next, has_prev, next_cursor
+        (in cursor mode total is None unless requested, pages and current_page are None)
     """
-    if page is None:
-        page = request.args.get('page', 1, type=int)
     if per_page is None:
         per_page = request.args.get('per_page', 10, type=int)
+    per_page = max(1, min(per_page, max_per_page))
+    
+    if cursor is None:
+        cursor = request.args.get('cursor')
+    if cursor is not None:
+        with_total = request.args.get('with_total', 'false').lower() == 'true'
+        return _paginate_keyset(query, per_page, sort_keys, cursor, with_total)
+    
+    if page is None:
+        page = request.args.get('page', 1, type=int)
     
     # Validate and constrain parameters
     page = max(1, page)
-    per_page = max(1, min(per_page, max_per_page))
     
     # Get paginated results
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
@@ -33,10 +56,79 @@ def paginate_query(query, page=None, per_page=None, max_per_page=100):
         'pages': pagination.pages,
         'current_page': page,
         'has_next': pagination.has_next,
-        'has_prev': pagination.has_prev
+        'has_prev': pagination.has_prev,
+        'next_cursor': None
     }
 
 
+def _paginate_keyset(query, per_page, sort_keys, cursor, with_total):
+    """Fetch one page after ``cursor``; one extra row tells whether there is a next page"""
+    if sort_keys is None:
+        model = query.column_descriptions[0]['entity']
+        sort_keys = [(model.created_at, 'desc'), (model.id, 'desc')]
+    
+    if query.session.get_bind().dialect.name == 'sqlite':
+        # SQLite keeps datetimes as text and CURRENT_TIMESTAMP defaults have no
+        # microseconds, so compare the stored text rather than a re-rendered value
+        sort_keys = [
+            (type_coerce(column, String) if isinstance(column.type, DateTime) else column, direction)
+            for column, direction in sort_keys
+        ]
+    
+    total = query.order_by(None).count() if with_total else None
+    
+    if cursor:
+        query = query.filter(_after_cursor(sort_keys, decode_cursor(cursor, len(sort_keys))))
+    
+    rows = query.order_by(None).order_by(
+        *[column.desc() if direction == 'desc' else column.asc() for column, direction in sort_keys]
+    ).add_columns(*[column for column, _ in sort_keys]).limit(per_page + 1).all()
+    
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    
+    return {
+        'items': [row[0] for row in rows],
+        'total': total,
+        'pages': None,
+        'current_page': None,
+        'has_next': has_next,
+        'has_prev': bool(cursor),
+        'next_cursor': encode_cursor(rows[-1][1:]) if has_next else None
+    }
+
+
+def _after_cursor(sort_keys, values):
+    """Row-value comparison (k1, k2, ...) > (v1, v2, ...) honouring each key's direction"""
+    clauses = []
+    for i, (column, direction) in enumerate(sort_keys):
+        beyond = column < values[i] if direction == 'desc' else column > values[i]
+        equal_before = [sort_keys[j][0] == values[j] for j in range(i)]
+        clauses.append(and_(*equal_before, beyond))
+    return or_(*clauses)
+
+
+def encode_cursor(values):
+    """Serialize sort key values into an opaque URL-safe cursor"""
+    payload = [{'dt': v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, expected_length):
+    """Inverse of encode_cursor; aborts with 400 on a malformed cursor"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if not isinstance(payload, list) or len(payload) != expected_length:
+            raise ValueError('cursor does not match the sort keys')
+        values = [datetime.fromisoformat(v['dt']) if isinstance(v, dict) else v for v in payload]
+        # Only what encode_cursor produces; anything else would fail when bound to the query
+        if any(isinstance(v, bool) or not isinstance(v, (str, int, float, datetime)) for v in values):
+            raise ValueError('cursor holds a value of an unexpected type')
+        return values
+    except (ValueError, TypeError, KeyError, UnicodeError, binascii.Error):
+        abort(400, 'Invalid cursor')
+
+
 def create_pagination_model(api, item_model):
     """
     Create a Flask-RESTX model for paginated responses.
@@ -50,9 +142,10 @@ def create_pagination_model(api, item_model):
     """
     return api.model(f'{item_model.name}Paginated', {
         'items': fields.List(fields.Nested(item_model)),
-        'total': fields.Integer(description='Total number of items'),
-        'pages': fields.Integer(description='Total number of pages'),
-        'current_page': fields.Integer(description='Current page number'),
+        'total': fields.Integer(description='Total number of items (cursor mode: only with with_total=true)'),
+        'pages': fields.Integer(description='Total number of pages (offset mode only)'),
+        'current_page': fields.Integer(description='Current page number (offset mode only)'),
         'has_next': fields.Boolean(description='Whether there is a next page'),
-        'has_prev': fields.Boolean(description='Whether there is a previous page')
+        'has_prev': fields.Boolean(description='Whether there is a previous page'),
+        'next_cursor': fields.String(description='Cursor for the next page (cursor mode only)')
     })
@@ -0,0 +1,41 @@
+from sqlalchemy.orm import load_only, joinedload
+from app.models.note import Note
+from app.models.user import User
+
+
+# Loader options per marshalling model: the columns and relationships the DTO
+# reads, loaded up front, so marshalling a page of items issues no extra queries
+_NOTE_DISPLAY_OPTIONS = (
+    load_only(
+        Note.id, Note.public_id, Note.title, Note.description, Note.is_public,
+        Note.created_at, Note.ocr_status, Note.markdown_path, Note.markdown_checksum,
+        Note.markdown_verified_at, Note.owner_id
+    ),
+    joinedload(Note.owner).load_only(User.id, User.username),
+)
+
+_SHAPES = {
+    'NoteDisplay': _NOTE_DISPLAY_OPTIONS,
+    'NoteSearchResult': _NOTE_DISPLAY_OPTIONS,
+    'TagNote': (
+        load_only(
+            Note.id, Note.public_id, Note.title, Note.description, Note.is_public,
+            Note.view_count, Note.created_at, Note.owner_id
+        ),
+        joinedload(Note.owner).load_only(User.id, User.public_id, User.username),
+    ),
+}
+
+
+def shape_query(query, dto):
+    """
+    Apply the loader options registered for a marshalling model.
+
+    Args:
+        query: SQLAlchemy query whose items will be marshalled with ``dto``
+        dto: Flask-RESTX model (e.g. NoteDto.note_display)
+
+    Returns:
+        The query with eager loads for exactly the fields ``dto`` uses
+    """
+    return query.options(*_SHAPES[dto.name])
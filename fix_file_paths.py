@@ -1,74 +1,76 @@
 #!/usr/bin/env python3
 """
-Script to fix incorrect file paths in the database.
-This will update any file paths that include 'app\' incorrectly.
+Script to convert stored file paths to storage keys.
+Older rows hold absolute paths (sometimes with Windows separators or a stray
+'app' directory); this rewrites them as keys relative to the uploads root and
+reports any file that is missing on disk.
 """
 
 import os
 from app import create_app, db
-from app.models import Note
-from app.services.file_service import fix_file_path
+from app.models import Note, FileBlob
+from app.services.file_service import legacy_storage_key, resolve_path
+
+def convert(obj, attr, label):
+    """Rewrite one path column as a storage key; returns whether it changed"""
+    value = getattr(obj, attr)
+    key = legacy_storage_key(value)
+    if not value or key == value:
+        return False
+    print(f"Converting {attr} for {label}:")
+    print(f"  Old: {value}")
+    print(f"  New: {key}")
+    setattr(obj, attr, key)
+    return True
 
 def fix_database_file_paths():
-    """Fix incorrect file paths stored in database"""
+    """Convert stored file paths to storage keys"""
     app = create_app()
     
     with app.app_context():
-        print("Checking for notes with incorrect file paths...")
+        print("Checking for notes and blobs with legacy file paths...")
         
         notes = Note.query.all()
+        blobs = FileBlob.query.all()
         fixed_count = 0
         
         for note in notes:
-            update_needed = False
-            
-            # Fix file_path if needed
-            if note.file_path:
-                corrected_path = fix_file_path(note.file_path)
-                if corrected_path != note.file_path:
-                    print(f"Fixing file_path for note {note.public_id}:")
-                    print(f"  Old: {note.file_path}")
-                    print(f"  New: {corrected_path}")
-                    note.file_path = corrected_path
-                    update_needed = True
-            
-            # Fix markdown_path if needed
-            if note.markdown_path:
-                corrected_path = fix_file_path(note.markdown_path)
-                if corrected_path != note.markdown_path:
-                    print(f"Fixing markdown_path for note {note.public_id}:")
-                    print(f"  Old: {note.markdown_path}")
-                    print(f"  New: {corrected_path}")
-                    note.markdown_path = corrected_path
-                    update_needed = True
-            
-            if update_needed:
+            changed = convert(note, 'file_path', f"note {note.public_id}")
+            changed = convert(note, 'markdown_path', f"note {note.public_id}") or changed
+            if changed:
+                fixed_count += 1
+        
+        for blob in blobs:
+            if convert(blob, 'path', f"blob {blob.hash[:12]}"):
                 fixed_count += 1
         
         if fixed_count > 0:
             db.session.commit()
-            print(f"\nFixed {fixed_count} notes with incorrect file paths.")
+            print(f"\nConverted {fixed_count} rows to storage keys.")
         else:
-            print("No file paths needed fixing.")
+            print("No file paths needed converting.")
         
-        # Additional verification - check for mixed separators
-        print("\nChecking for mixed path separators...")
-        mixed_separators_count = 0
+        # Additional verification - every key should point at an existing file
+        print("\nChecking that stored files exist...")
+        missing_count = 0
         
         for note in notes:
-            if note.file_path and ('/' in note.file_path and '\\' in note.file_path):
-                print(f"Mixed separators in file_path for note {note.public_id}: {note.file_path}")
-                mixed_separators_count += 1
-            if note.markdown_path and ('/' in note.markdown_path and '\\' in note.markdown_path):
-                print(f"Mixed separators in markdown_path for note {note.public_id}: {note.markdown_path}")
-                mixed_separators_count += 1
+            for attr in ('file_path', 'markdown_path'):
+                key = getattr(note, attr)
+                if key and not os.path.exists(resolve_path(key)):
+                    print(f"Missing {attr} for note {note.public_id}: {key}")
+                    missing_count += 1
+        for blob in blobs:
+            if not os.path.exists(resolve_path(blob.path)):
+                print(f"Missing blob {blob.hash[:12]}: {blob.path}")
+                missing_count += 1
         
-        if mixed_separators_count > 0:
-            print(f"Found {mixed_separators_count} paths with mixed separators (these should be fixed by normalization)")
+        if missing_count > 0:
+            print(f"Found {missing_count} missing files")
         else:
-            print("No mixed separators found in paths")
+            print("All stored files found on disk")
         
-        print("File path fix complete!")
+        print("File path conversion complete!")
 
 if __name__ == "__main__":
     fix_database_file_paths()
@@ -0,0 +1,54 @@
+"""Add full-text note_search index
+
+Revision ID: 5f2c8e07b1d4
+Revises: d3f9a41c6e27
+Create Date: 2026-10-16 21:02:41.193557
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f2c8e07b1d4'
+down_revision = 'd3f9a41c6e27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS tables aren't something autogenerate knows about, so this is hand written.
+    # OCR markdown isn't in the database; POST /api/admin/system/search-index/rebuild
+    # indexes it for notes converted before this migration.
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS note_search USING fts5("
+            "title, description, body, tokenize='porter unicode61')"
+        )
+        op.execute(
+            "INSERT INTO note_search (rowid, title, description, body) "
+            "SELECT id, coalesce(title, ''), coalesce(description, ''), '' FROM note"
+        )
+    elif dialect == 'postgresql':
+        op.execute(
+            "CREATE TABLE IF NOT EXISTS note_search ("
+            "note_id INTEGER PRIMARY KEY REFERENCES note (id) ON DELETE CASCADE, "
+            "title TEXT, description TEXT, body TEXT, "
+            "document tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(body, '')), 'C')) STORED)"
+        )
+        op.execute("CREATE INDEX IF NOT EXISTS ix_note_search_document ON note_search USING GIN (document)")
+        op.execute(
+            "INSERT INTO note_search (note_id, title, description, body) "
+            "SELECT id, coalesce(title, ''), coalesce(description, ''), '' FROM note "
+            "ON CONFLICT (note_id) DO NOTHING"
+        )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        op.execute("DROP TABLE IF EXISTS note_search")
@@ -0,0 +1,68 @@
+"""Convert stored file paths to storage keys relative to the uploads root
+
+Revision ID: b8d4e1f07c35
+Revises: e5b09d2f6a18
+Create Date: 2026-10-16 23:12:40.118342
+
+"""
+import os
+import re
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d4e1f07c35'
+down_revision = 'e5b09d2f6a18'
+branch_labels = None
+depends_on = None
+
+STORAGE_FOLDERS = ('notes', 'markdown', 'blobs')
+
+# (table, key column, path columns)
+PATH_COLUMNS = (
+    ('note', 'id', ('file_path', 'markdown_path')),
+    ('file_blob', 'hash', ('path',)),
+)
+
+
+def legacy_storage_key(stored_path):
+    # Frozen copy of app.services.file_service.legacy_storage_key
+    if not stored_path:
+        return None
+    parts = [part for part in re.split(r'[\\/]+', stored_path) if part and part != '.']
+    if not parts:
+        return None
+    if not os.path.isabs(stored_path) and ':' not in parts[0] and parts[0] in STORAGE_FOLDERS:
+        return '/'.join(parts)
+    if 'uploads' in parts:
+        index = len(parts) - 1 - parts[::-1].index('uploads')
+        if index + 1 < len(parts):
+            return '/'.join(parts[index + 1:])
+    filename = parts[-1]
+    folder = 'markdown' if ('markdown' in parts or filename.endswith('.md')) else 'notes'
+    return f"{folder}/{filename}"
+
+
+def upgrade():
+    bind = op.get_bind()
+    for table_name, key_column, columns in PATH_COLUMNS:
+        table = sa.table(table_name, sa.column(key_column), *[sa.column(c) for c in columns])
+        rows = bind.execute(sa.select(table.c[key_column], *[table.c[c] for c in columns])).all()
+        for row in rows:
+            values = {}
+            for column in columns:
+                value = row._mapping[column]
+                key = legacy_storage_key(value)
+                if value and key != value:
+                    values[column] = key
+            if values:
+                bind.execute(
+                    table.update().where(table.c[key_column] == row._mapping[key_column]).values(**values)
+                )
+
+
+def downgrade():
+    # Nothing to undo: resolve_path still accepts absolute paths, and the
+    # original absolute locations are not recoverable from the keys
+    pass
@@ -9,12 +9,13 @@ from app.models.note import Note
 from app.models.comment import Comment
 from app.models.reaction import NoteReaction
 from app.models.blocklist import BlocklistedToken
+from app.models.ocr_job import OCRJob
 
 @app.shell_context_processor
 def make_shell_context():
     return dict(db=db, User=User, Course=Course, Note=Note,
                 Comment=Comment, NoteReaction=NoteReaction,
-                BlocklistedToken=BlocklistedToken)
+                BlocklistedToken=BlocklistedToken, OCRJob=OCRJob)
 
 
 if __name__ == "__main__":
@@ -22,6 +22,8 @@ from app.models.course import Course
 from app.models.tag import Tag
 from app.models.comment import Comment
 from app.models.reaction import NoteReaction
+from app.models.associations import note_courses, note_tags
+from app.utils.bulk import insert_ignore
 from app.services.file_service import save_file, get_upload_folder
 from app.services.ocr_service import ocr_service
 from werkzeug.datastructures import FileStorage
@@ -234,6 +236,10 @@ def create_notes_with_sample_files(users, courses, tags):
         {'title': 'Distributed Systems Architecture', 'description': 'Microservices and distributed computing', 'course_codes': ['CSE 4321'], 'tag_names': ['distributed-systems', 'software-engineering', 'advanced', 'networking']},
     ]
     
+    courses_by_code = {course.code: course for course in courses}
+    tags_by_name = {tag.name: tag for tag in tags}
+    course_links, tag_links = [], []
+    
     notes = []
     for i, template in enumerate(note_templates):
         # Cycle through sample files
@@ -259,18 +265,14 @@ def create_notes_with_sample_files(users, courses, tags):
         db.session.add(note)
         db.session.flush()  # Get the note ID
         
-        # Add course associations
-        for course_code in template['course_codes']:
-            course = next((c for c in courses if c.code == course_code), None)
-            if course:
-                note.courses.append(course)
-        
-        # Add tag associations
-        for tag_name in template['tag_names']:
-            tag = next((t for t in tags if t.name == tag_name), None)
-            if tag:
-                note.tags.append(tag)
-    
+        # Collect course and tag associations, written in bulk below
+        course_links += [{'course_id': courses_by_code[code].id, 'note_id': note.id}
+                         for code in template['course_codes'] if code in courses_by_code]
+        tag_links += [{'note_id': note.id, 'tag_id': tags_by_name[name].id}
+                      for name in template['tag_names'] if name in tags_by_name]
+    
+    insert_ignore(note_courses, course_links)
+    insert_ignore(note_tags, tag_links)
     db.session.commit()
     print(f"✅ Created {len(notes)} notes")
     return notes
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Deduplicated blob store: reference counting of identical uploads and the
+tombstone that keeps a released blob file safe until the delete commits,
+against a throwaway SQLite database like test_query_counts.py.
+
+Run with `python test_blob_store.py` or `pytest test_blob_store.py`.
+"""
+import io
+import os
+import tempfile
+
+_db_dir = tempfile.mkdtemp(prefix='blob_store_')
+# setdefault: when pytest collects several of these scripts, the first one's database wins
+os.environ.setdefault('TEST_DATABASE_URL', f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+os.environ.setdefault('UPLOADS_ROOT', os.path.join(_db_dir, 'uploads'))
+
+from app import create_app, db
+from app.models import Note, FileBlob
+from app.services.file_service import release_file, remove_files, resolve_path
+
+app = create_app('test')
+
+CONTENT = b'%PDF-1.4 shared slides'
+
+
+def fresh_client():
+    """Empty database with one registered user; returns (client, auth headers)"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    client = app.test_client()
+    client.post('/api/auth/register', json={
+        'username': 'owner', 'email': 'owner@example.com', 'password': 'password123'
+    })
+    response = client.post('/api/auth/login', json={'email': 'owner@example.com', 'password': 'password123'})
+    return client, {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+
+def upload(client, headers, title):
+    response = client.post('/api/notes', headers=headers, content_type='multipart/form-data', data={
+        'title': title, 'file': (io.BytesIO(CONTENT), f'{title}.pdf')
+    })
+    assert response.status_code == 202, response.get_json()
+    return response.get_json()['public_id']
+
+
+def blob_state():
+    """(ref_count, absolute path) of the only blob"""
+    blob = FileBlob.query.one()
+    return blob.ref_count, resolve_path(blob.path)
+
+
+def test_identical_uploads_share_one_blob():
+    client, headers = fresh_client()
+    first, second = upload(client, headers, 'first'), upload(client, headers, 'second')
+    with app.app_context():
+        ref_count, path = blob_state()
+        assert ref_count == 2
+        notes = Note.query.filter(Note.public_id.in_([first, second])).all()
+        assert {note.file_hash for note in notes} == {FileBlob.query.one().hash}
+        with open(path, 'rb') as f:
+            assert f.read() == CONTENT
+
+
+def test_blob_file_removed_with_last_reference():
+    client, headers = fresh_client()
+    first, second = upload(client, headers, 'first'), upload(client, headers, 'second')
+    with app.app_context():
+        _, path = blob_state()
+
+    assert client.delete(f'/api/notes/{first}', headers=headers).status_code == 204
+    with app.app_context():
+        assert blob_state() == (1, path)
+    assert os.path.exists(path)
+
+    assert client.delete(f'/api/notes/{second}', headers=headers).status_code == 204
+    with app.app_context():
+        assert FileBlob.query.count() == 0
+    assert not os.path.exists(path)
+    assert [name for name in os.listdir(os.path.dirname(path)) if name.endswith('.deleted')] == []
+
+
+def test_rolled_back_delete_restores_blob_file():
+    client, headers = fresh_client()
+    public_id = upload(client, headers, 'only')
+    with app.app_context():
+        _, path = blob_state()
+        note = Note.query.filter_by(public_id=public_id).one()
+        tombstone = release_file(note)
+        db.session.delete(note)
+        db.session.flush()
+        # Moved aside while the delete is in flight
+        assert tombstone and os.path.exists(tombstone) and not os.path.exists(path)
+
+        db.session.rollback()
+        assert os.path.exists(path) and not os.path.exists(tombstone)
+        assert blob_state() == (1, path)
+        assert Note.query.filter_by(public_id=public_id).count() == 1
+
+
+def test_reupload_after_delete_keeps_new_file():
+    client, headers = fresh_client()
+    public_id = upload(client, headers, 'old')
+    with app.app_context():
+        _, path = blob_state()
+        note = Note.query.filter_by(public_id=public_id).one()
+        tombstone = release_file(note)
+        db.session.delete(note)
+        db.session.commit()
+
+    # Same content uploaded between the commit and the deleting request's unlink
+    upload(client, headers, 'new')
+    assert remove_files([tombstone]) == [tombstone]
+    with app.app_context():
+        assert blob_state() == (1, path)
+    assert os.path.exists(path)
+
+
+if __name__ == '__main__':
+    test_identical_uploads_share_one_blob()
+    test_blob_file_removed_with_last_reference()
+    test_rolled_back_delete_restores_blob_file()
+    test_reupload_after_delete_keeps_new_file()
+    print('OK   blob store')
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Bulk tag/course attach and detach (/api/notes/bulk/tags, /api/notes/bulk/courses):
+ownership filtering, idempotent repeats and recommendation invalidation,
+against a throwaway SQLite database like test_query_counts.py.
+
+Run with `python test_bulk_links.py` or `pytest test_bulk_links.py`.
+"""
+import os
+import tempfile
+
+_db_dir = tempfile.mkdtemp(prefix='bulk_links_')
+# setdefault: when pytest collects several of these scripts, the first one's database wins
+os.environ.setdefault('TEST_DATABASE_URL', f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+os.environ.setdefault('UPLOADS_ROOT', os.path.join(_db_dir, 'uploads'))
+
+from app import create_app, db
+from app.models import User, Note, Tag, Course
+from app.models.recommendation import RecommendationState
+
+app = create_app('test')
+
+
+def setup_data():
+    """
+    alice owns three notes, bob one. carol is enrolled in MATH2318 and dave
+    bookmarked a third note of alice's tagged 'algebra', so both are in the
+    recommendation audience of any note that gets that course or tag.
+
+    Returns:
+        tuple: (client, {username: auth headers}, {note title: public id})
+    """
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    client = app.test_client()
+    headers = {}
+    for name in ('alice', 'bob', 'carol', 'dave'):
+        client.post('/api/auth/register', json={
+            'username': name, 'email': f'{name}@example.com', 'password': 'password123'
+        })
+        response = client.post('/api/auth/login', json={'email': f'{name}@example.com', 'password': 'password123'})
+        headers[name] = {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+    with app.app_context():
+        users = {user.username: user for user in User.query.all()}
+        course = Course(name='Linear Algebra', code='MATH2318')
+        course.users.append(users['carol'])
+        algebra = Tag(name='algebra')
+        notes = [Note(title=title, file_path=f'{title}.pdf', owner_id=users[owner].id, is_public=True)
+                 for title, owner in (('a1', 'alice'), ('a2', 'alice'), ('a3', 'alice'), ('b1', 'bob'))]
+        notes[2].tags.append(algebra)
+        notes[2].bookmarked_by.append(users['dave'])
+        db.session.add_all([course, algebra] + notes)
+        db.session.add_all([RecommendationState(user_id=users[name].id) for name in ('carol', 'dave')])
+        db.session.commit()
+        return client, headers, {note.title: note.public_id for note in notes}
+
+
+def links(model_name):
+    """{note title: sorted tag names or course codes}"""
+    with app.app_context():
+        if model_name == 'tags':
+            return {note.title: sorted(tag.name for tag in note.tags) for note in Note.query.all()}
+        return {note.title: sorted(course.code for course in note.courses) for note in Note.query.all()}
+
+
+def dirty_users():
+    """Usernames whose recommendations are marked dirty; clears the flags"""
+    with app.app_context():
+        states = RecommendationState.query.filter_by(dirty=True).all()
+        names = sorted(db.session.get(User, state.user_id).username for state in states)
+        for state in states:
+            state.dirty = False
+        db.session.commit()
+        return names
+
+
+def bulk(client, headers, kind, body):
+    response = client.post(f'/api/notes/bulk/{kind}', headers=headers, json=body)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_bulk_tags_change_only_callers_notes():
+    client, headers, notes = setup_data()
+    body = {'note_ids': [notes['a1'], notes['a2'], notes['b1'], 'no-such-note'], 'tags': ['Proofs', 'matrices']}
+
+    result = bulk(client, headers['alice'], 'tags', body)
+    assert result['changed'] == 4
+    assert result['forbidden_notes'] == [notes['b1']]
+    assert result['missing_notes'] == ['no-such-note']
+    assert links('tags') == {'a1': ['matrices', 'proofs'], 'a2': ['matrices', 'proofs'],
+                             'a3': ['algebra'], 'b1': []}
+
+    # Repeating the attach adds neither links nor tags
+    assert bulk(client, headers['alice'], 'tags', body)['changed'] == 0
+    with app.app_context():
+        assert Tag.query.count() == 3
+
+    # Bob may not detach tags from alice's notes
+    result = bulk(client, headers['bob'], 'tags', dict(body, action='detach'))
+    assert result['changed'] == 0
+    assert sorted(result['forbidden_notes']) == sorted([notes['a1'], notes['a2']])
+    assert links('tags')['a1'] == ['matrices', 'proofs']
+
+    result = bulk(client, headers['alice'], 'tags', dict(body, tags=['proofs'], action='detach'))
+    assert result['changed'] == 2
+    assert bulk(client, headers['alice'], 'tags', dict(body, tags=['proofs'], action='detach'))['changed'] == 0
+    assert links('tags')['a1'] == ['matrices']
+
+
+def test_bulk_courses_change_only_callers_notes():
+    client, headers, notes = setup_data()
+    body = {'note_ids': [notes['a1'], notes['b1']], 'course_codes': ['MATH2318', 'NOPE101']}
+
+    result = bulk(client, headers['alice'], 'courses', body)
+    assert result['changed'] == 1
+    assert result['forbidden_notes'] == [notes['b1']]
+    assert result['unknown_courses'] == ['NOPE101']
+    assert links('courses') == {'a1': ['MATH2318'], 'a2': [], 'a3': [], 'b1': []}
+
+    assert bulk(client, headers['alice'], 'courses', body)['changed'] == 0
+
+    result = bulk(client, headers['alice'], 'courses', dict(body, action='detach'))
+    assert result['changed'] == 1
+    assert links('courses')['a1'] == []
+
+
+def test_attach_and_detach_mark_audiences_dirty():
+    client, headers, notes = setup_data()
+    dirty_users()
+
+    # carol studies the course, dave bookmarked a note sharing the tag
+    bulk(client, headers['alice'], 'courses', {'note_ids': [notes['a1']], 'course_codes': ['MATH2318']})
+    assert dirty_users() == ['carol']
+    bulk(client, headers['alice'], 'courses', {'note_ids': [notes['a1']], 'course_codes': ['MATH2318'],
+                                               'action': 'detach'})
+    assert dirty_users() == ['carol']
+
+    bulk(client, headers['alice'], 'tags', {'note_ids': [notes['a2']], 'tags': ['algebra']})
+    assert dirty_users() == ['dave']
+    bulk(client, headers['alice'], 'tags', {'note_ids': [notes['a2']], 'tags': ['algebra'], 'action': 'detach'})
+    assert dirty_users() == ['dave']
+
+
+if __name__ == '__main__':
+    test_bulk_tags_change_only_callers_notes()
+    test_bulk_courses_change_only_callers_notes()
+    test_attach_and_detach_mark_audiences_dirty()
+    print('OK   bulk tag/course links')
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Course enrollment against a throwaway SQLite database (no running server),
+using Flask's test client like test_query_counts.py.
+
+Run with `python test_courses.py` or `pytest test_courses.py`.
+"""
+import os
+import tempfile
+
+_db_dir = tempfile.mkdtemp(prefix='courses_')
+# setdefault: when pytest collects several of these scripts, the first one's database wins
+os.environ.setdefault('TEST_DATABASE_URL', f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+os.environ.setdefault('UPLOADS_ROOT', os.path.join(_db_dir, 'uploads'))
+
+from app import create_app, db
+from app.models import Course
+
+app = create_app('test')
+
+
+def fresh_client():
+    """Empty database with one registered user; returns (client, auth headers)"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    client = app.test_client()
+    client.post('/api/auth/register', json={
+        'username': 'student', 'email': 'student@example.com', 'password': 'password123'
+    })
+    response = client.post('/api/auth/login', json={'email': 'student@example.com', 'password': 'password123'})
+    return client, {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+
+def enroll(client, headers, codes):
+    response = client.post('/api/courses/enroll', headers=headers, json={'course_codes': codes})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_enroll_creates_missing_courses_once():
+    client, headers = fresh_client()
+    result = enroll(client, headers, ['CS101', 'MATH203', 'CS101'])
+    assert result['courses'] == ['CS101', 'MATH203']
+    assert result['unresolved'] == []
+
+    # Enrolling again changes nothing
+    result = enroll(client, headers, ['CS101', 'MATH203'])
+    assert result['courses'] == []
+    my_courses = client.get('/api/courses/my-courses', headers=headers).get_json()
+    assert sorted(course['code'] for course in my_courses) == ['CS101', 'MATH203']
+
+
+def test_enroll_reports_code_whose_generated_name_is_taken():
+    client, headers = fresh_client()
+    with app.app_context():
+        # Holds the name the enrollment would give a new CS101 course
+        db.session.add(Course(name='Course CS101', code='LEGACY1'))
+        db.session.commit()
+
+    result = enroll(client, headers, ['CS101', 'ENG101'])
+    assert result['courses'] == ['ENG101']
+    assert result['unresolved'] == ['CS101']
+    with app.app_context():
+        assert Course.query.filter_by(code='CS101').first() is None
+
+
+if __name__ == '__main__':
+    test_enroll_creates_missing_courses_once()
+    test_enroll_reports_code_whose_generated_name_is_taken()
+    print('OK   course enrollment')
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Background OCR job queue: claiming, retries with backoff and stale-job
+recovery, against a throwaway SQLite database like test_query_counts.py.
+Gemini is never called; ocr_service.convert_to_markdown is stubbed.
+
+Run with `python test_ocr_queue.py` or `pytest test_ocr_queue.py`.
+"""
+import io
+import os
+import tempfile
+from datetime import datetime, timedelta
+from unittest import mock
+
+_db_dir = tempfile.mkdtemp(prefix='ocr_queue_')
+# setdefault: when pytest collects several of these scripts, the first one's database wins
+os.environ.setdefault('TEST_DATABASE_URL', f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+os.environ.setdefault('UPLOADS_ROOT', os.path.join(_db_dir, 'uploads'))
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models import Note
+from app.models.ocr_job import OCRJob
+from app.services.ocr_service import ocr_service
+from app.services.ocr_queue import claim_next_job, process_job, requeue_stale_jobs
+
+app = create_app('test')
+
+
+def upload_note():
+    """Fresh database with one uploaded note; returns its public id"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    client = app.test_client()
+    client.post('/api/auth/register', json={
+        'username': 'owner', 'email': 'owner@example.com', 'password': 'password123'
+    })
+    response = client.post('/api/auth/login', json={'email': 'owner@example.com', 'password': 'password123'})
+    headers = {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+    response = client.post('/api/notes', headers=headers, content_type='multipart/form-data', data={
+        'title': 'Lecture 1', 'file': (io.BytesIO(b'%PDF-1.4 lecture'), 'lecture.pdf')
+    })
+    # The upload only queues the conversion
+    assert response.status_code == 202, response.get_json()
+    assert response.get_json()['ocr_status'] == 'pending'
+    return response.get_json()['public_id']
+
+
+def write_markdown(input_file_path, output_filename=None, on_page=None):
+    """Stand-in for a successful Gemini conversion"""
+    path = os.path.join(ocr_service.markdown_dir, f"{output_filename}.md")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('# Lecture 1\n')
+    return path
+
+
+def fail_conversion(input_file_path, output_filename=None, on_page=None):
+    raise RuntimeError('Gemini unavailable')
+
+
+def job_for(public_id):
+    return OCRJob.query.join(Note).filter(Note.public_id == public_id).one()
+
+
+def make_runnable(job):
+    """Skip the backoff delay of a requeued job"""
+    job.run_after = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+
+def test_upload_queues_job_and_worker_completes_it():
+    public_id = upload_note()
+    with app.app_context():
+        job = job_for(public_id)
+        assert (job.status, job.attempts) == ('queued', 0)
+
+        claimed = claim_next_job('worker-a')
+        assert claimed.id == job.id
+        assert claimed.note.ocr_status == 'processing'
+        with mock.patch.object(ocr_service, 'convert_to_markdown', side_effect=write_markdown):
+            process_job(claimed)
+
+        job = job_for(public_id)
+        assert (job.status, job.locked_by) == ('completed', None)
+        assert job.note.ocr_status == 'completed'
+        assert job.note.has_markdown
+
+
+def test_claimed_job_is_not_claimed_again():
+    public_id = upload_note()
+    with app.app_context():
+        job = claim_next_job('worker-a')
+        assert (job.status, job.locked_by, job.attempts) == ('running', 'worker-a', 1)
+
+        assert claim_next_job('worker-b') is None
+        job = job_for(public_id)
+        assert (job.locked_by, job.attempts) == ('worker-a', 1)
+
+
+def test_claim_lost_to_another_worker_is_skipped():
+    public_id = upload_note()
+    raced = []
+
+    def other_worker_claims_first(conn, cursor, statement, parameters, context, executemany):
+        # Worker A takes the job between worker B's SELECT of candidates and its UPDATE
+        if statement.startswith('UPDATE ocr_job') and not raced:
+            raced.append(True)
+            cursor.execute("UPDATE ocr_job SET status = 'running', locked_by = 'worker-a'")
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', other_worker_claims_first)
+        try:
+            assert claim_next_job('worker-b') is None
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', other_worker_claims_first)
+        assert raced
+        job = job_for(public_id)
+        assert (job.locked_by, job.attempts) == ('worker-a', 0)
+        assert job.note.ocr_status == 'pending'
+
+
+def test_failed_job_backs_off_then_fails_for_good():
+    public_id = upload_note()
+    retry_delay = app.config['OCR_JOB_RETRY_DELAY']
+    with app.app_context(), mock.patch.object(ocr_service, 'convert_to_markdown', side_effect=fail_conversion):
+        for attempt in range(1, app.config['OCR_JOB_MAX_ATTEMPTS']):
+            before = datetime.utcnow()
+            process_job(claim_next_job('worker-a'))
+
+            job = job_for(public_id)
+            assert (job.status, job.attempts, job.locked_by) == ('queued', attempt, None)
+            assert job.last_error == 'Gemini unavailable'
+            assert job.note.ocr_status == 'pending'
+            # Exponential backoff: the delay doubles with every attempt
+            delay = retry_delay * 2 ** (attempt - 1)
+            assert before + timedelta(seconds=delay) <= job.run_after <= datetime.utcnow() + timedelta(seconds=delay)
+            assert claim_next_job('worker-a') is None
+            make_runnable(job)
+
+        process_job(claim_next_job('worker-a'))
+        job = job_for(public_id)
+        assert (job.status, job.attempts) == ('failed', app.config['OCR_JOB_MAX_ATTEMPTS'])
+        assert job.note.ocr_status == 'failed'
+        make_runnable(job)
+        assert claim_next_job('worker-a') is None
+
+
+def test_stale_running_job_is_requeued_then_failed():
+    public_id = upload_note()
+    timeout = timedelta(seconds=app.config['OCR_JOB_LOCK_TIMEOUT'])
+    with app.app_context():
+        claim_next_job('worker-a')
+        # A job still within its lock timeout is left alone
+        assert requeue_stale_jobs() == 0
+
+        job = job_for(public_id)
+        job.locked_at = datetime.utcnow() - timeout - timedelta(seconds=1)
+        db.session.commit()
+        assert requeue_stale_jobs() == 1
+        job = job_for(public_id)
+        assert (job.status, job.locked_by) == ('queued', None)
+        assert job.last_error == 'Worker worker-a timed out'
+        assert job.note.ocr_status == 'pending'
+
+        # Out of attempts: the abandoned job fails instead
+        job.attempts = job.max_attempts - 1
+        make_runnable(job)
+        claim_next_job('worker-b')
+        job = job_for(public_id)
+        job.locked_at = datetime.utcnow() - timeout - timedelta(seconds=1)
+        db.session.commit()
+        assert requeue_stale_jobs() == 1
+        job = job_for(public_id)
+        assert job.status == 'failed'
+        assert job.note.ocr_status == 'failed'
+
+
+def test_status_stream_ends_once_conversion_is_over():
+    public_id = upload_note()
+    client = app.test_client()
+    url = f'/api/notes/{public_id}/ocr-status/stream'
+
+    # Still pending: cut at the maximum duration with no end event, so EventSource reconnects
+    max_duration = app.config['SSE_MAX_DURATION']
+    app.config['SSE_MAX_DURATION'] = 0
+    try:
+        body = client.get(url).get_data(as_text=True)
+    finally:
+        app.config['SSE_MAX_DURATION'] = max_duration
+    assert body.startswith('event: ocr-status\n')
+    assert 'event: end' not in body and 'retry:' not in body
+
+    with app.app_context():
+        with mock.patch.object(ocr_service, 'convert_to_markdown', side_effect=write_markdown):
+            process_job(claim_next_job('worker-a'))
+
+    frames = client.get(url).get_data(as_text=True).split('\n\n')
+    assert frames[0].startswith('event: ocr-status\n')
+    assert frames[1] == (f"retry: {app.config['SSE_END_RETRY'] * 1000}\n"
+                         'event: end\ndata: {"ocr_status": "completed"}')
+    assert frames[2:] == ['']
+
+
+if __name__ == '__main__':
+    test_upload_queues_job_and_worker_completes_it()
+    test_claimed_job_is_not_claimed_again()
+    test_claim_lost_to_another_worker_is_skipped()
+    test_failed_job_backs_off_then_fails_for_good()
+    test_stale_running_job_is_requeued_then_failed()
+    test_status_stream_ends_once_conversion_is_over()
+    print('OK   OCR job queue')
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Keyset (cursor) pagination: walking every page must return each row exactly
+once, in order, including rows with identical timestamps, and bad cursors
+must be rejected with 400. Runs against a throwaway SQLite database like
+test_query_counts.py, so it also covers the SQLite text comparison of
+DateTime keys.
+
+Run with `python test_pagination.py` or `pytest test_pagination.py`.
+"""
+import os
+import json
+import base64
+import tempfile
+from datetime import datetime, timedelta
+
+_db_dir = tempfile.mkdtemp(prefix='pagination_')
+# setdefault: when pytest collects several of these scripts, the first one's database wins
+os.environ.setdefault('TEST_DATABASE_URL', f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+os.environ.setdefault('UPLOADS_ROOT', os.path.join(_db_dir, 'uploads'))
+
+from app import create_app, db
+from app.models import User, Note
+from app.services import search_index
+
+app = create_app('test')
+
+
+def setup_notes():
+    """
+    Public notes in groups that share a created_at (with and without
+    microseconds), inserted out of id order; returns their public ids
+    in the expected (created_at desc, id desc) order.
+    """
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        owner = User(username='owner', email='owner@example.com')
+        owner.set_password('password123')
+        db.session.add(owner)
+        db.session.flush()
+
+        base = datetime(2026, 3, 1, 9, 0, 0)
+        timestamps = [base, base + timedelta(microseconds=250), base - timedelta(hours=1)]
+        notes = []
+        for i in range(17):
+            notes.append(Note(title=f'Lecture {i}', file_path=f'note_{i}.pdf', owner_id=owner.id,
+                              is_public=True, created_at=timestamps[i % len(timestamps)]))
+        db.session.add_all(notes)
+        db.session.flush()
+        for note in notes:
+            # Identical text, so every search hit ties on rank
+            search_index.index_note(note, body='vector spaces')
+        db.session.commit()
+        expected = sorted(notes, key=lambda note: (note.created_at, note.id), reverse=True)
+        return [note.public_id for note in expected]
+
+
+def walk(client, per_page, url='/api/notes', **args):
+    """Follow next_cursor from the first page to the last; returns public ids in page order"""
+    seen, cursor, pages = [], '', 0
+    while cursor is not None:
+        response = client.get(url, query_string={'cursor': cursor, 'per_page': per_page, **args})
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        assert body['has_prev'] == (pages > 0)
+        seen += [item['public_id'] for item in body['items']]
+        cursor = body['next_cursor']
+        assert body['has_next'] == (cursor is not None)
+        pages += 1
+    return seen
+
+
+def test_walk_returns_every_row_once_in_order():
+    expected = setup_notes()
+    client = app.test_client()
+    # Page sizes that end pages inside and at the edge of a tie group
+    for per_page in (1, 2, 3, 5, 6, 17, 50):
+        assert walk(client, per_page) == expected, per_page
+
+
+def test_walk_search_results_with_tied_ranks():
+    expected = setup_notes()
+    client = app.test_client()
+    full = walk(client, 100, '/api/notes/search', q='vector')
+    assert sorted(full) == sorted(expected)
+    for per_page in (1, 4, 16):
+        assert walk(client, per_page, '/api/notes/search', q='vector') == full, per_page
+
+
+def test_with_total_counts_every_row():
+    expected = setup_notes()
+    client = app.test_client()
+    response = client.get('/api/notes', query_string={'cursor': '', 'per_page': 5, 'with_total': 'true'})
+    assert response.get_json()['total'] == len(expected)
+    response = client.get('/api/notes', query_string={'cursor': '', 'per_page': 5})
+    assert response.get_json()['total'] is None
+
+
+def encoded(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+
+def test_malformed_or_tampered_cursor_is_400():
+    setup_notes()
+    client = app.test_client()
+    cursors = [
+        'not a cursor!',                                # not base64
+        base64.urlsafe_b64encode(b'\xff\xfe').decode(),  # not JSON
+        encoded({'created_at': 1}),                     # not a list
+        encoded([1]),                                   # wrong number of keys
+        encoded([{'dt': 'yesterday'}, 1]),              # bad timestamp
+        encoded([{'other': 1}, 1]),                     # unknown object
+        encoded([[1, 2], 1]),                           # nested list
+        encoded([None, 1]),                             # null key
+        encoded(['2026-03-01 09:00:00.000000', True]),  # bool id
+    ]
+    for cursor in cursors:
+        response = client.get('/api/notes', query_string={'cursor': cursor})
+        assert response.status_code == 400, (cursor, response.status_code)
+
+
+if __name__ == '__main__':
+    test_walk_returns_every_row_once_in_order()
+    test_walk_search_results_with_tied_ranks()
+    test_with_total_counts_every_row()
+    test_malformed_or_tampered_cursor_is_400()
+    print('OK   keyset pagination')
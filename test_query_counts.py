@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+SQL statement budgets for list endpoints, and consistency of the
+denormalized statistics counters.
+
+Unlike the other test_*.py scripts this one needs no running server: it uses
+Flask's test client against a throwaway SQLite database and counts every
+statement sent to the database. The budgets must not depend on how many
+notes are returned, which is what catches N+1 relationship loading. The
+counters kept by the write endpoints must match what rebuild_statistics()
+computes from the source tables.
+
+Run with `python test_query_counts.py` or `pytest test_query_counts.py`.
+"""
+import io
+import os
+import tempfile
+from contextlib import contextmanager
+
+_db_dir = tempfile.mkdtemp(prefix='query_counts_')
+os.environ['TEST_DATABASE_URL'] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+os.environ['UPLOADS_ROOT'] = os.path.join(_db_dir, 'uploads')
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User, Note, Tag, Course
+from app.models.note_stats import NoteStatistics, UserStatistics
+from app.services.statistics import rebuild_statistics
+
+# Expected statements per request, independent of page size
+BUDGETS = {
+    '/api/notes': 2,                        # COUNT + page (owner joined)
+    '/api/notes?cursor=': 1,                # page only, no COUNT
+    '/api/notes/search?q=algebra': 3,       # COUNT + ranked page + snippets
+    '/api/users/me/bookmarks': 3,           # current user + COUNT + page
+}
+
+app = create_app('test')
+
+
+@contextmanager
+def count_queries():
+    """Collect the SQL statements executed inside the block"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def setup_data(note_count):
+    """Fresh database with `note_count` public notes by different owners, each tagged, in a course and bookmarked"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        reader = User(username='reader', email='reader@example.com')
+        reader.set_password('password123')
+        collaborator = User(username='collab', email='collab@example.com')
+        collaborator.set_password('password123')
+        tag = Tag(name='math')
+        course = Course(name='Linear Algebra', code='MATH2318')
+        db.session.add_all([reader, collaborator, tag, course])
+        db.session.flush()
+
+        from app.services import search_index
+        for i in range(note_count):
+            # A different owner per note, so lazy owner loads would scale with the page
+            owner = User(username=f'owner{i}', email=f'owner{i}@example.com')
+            owner.set_password('password123')
+            db.session.add(owner)
+            db.session.flush()
+            note = Note(title=f'Algebra lecture {i}', description='Vector spaces',
+                        file_path=f'note_{i}.pdf', owner_id=owner.id, is_public=True)
+            note.tags.append(tag)
+            note.courses.append(course)
+            note.collaborators.append(collaborator)
+            note.bookmarked_by.append(reader)
+            db.session.add(note)
+            db.session.flush()
+            search_index.index_note(note, body='')
+        db.session.commit()
+
+
+def login(client, email):
+    response = client.post('/api/auth/login', json={'email': email, 'password': 'password123'})
+    return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+
+def measure(note_count):
+    """Statement count per endpoint with `note_count` notes on the page"""
+    setup_data(note_count)
+    client = app.test_client()
+    headers = login(client, 'reader@example.com')
+
+    counts = {}
+    for url in BUDGETS:
+        separator = '&' if '?' in url else '?'
+        with count_queries() as statements:
+            response = client.get(f'{url}{separator}per_page=50', headers=headers)
+        assert response.status_code == 200, f'{url} returned {response.status_code}'
+        assert len(response.get_json()['items']) == note_count, url
+        counts[url] = len(statements)
+    return counts
+
+
+def stored_statistics():
+    """Every note_stats and user_stats row, as {(table, key): {column: value}}"""
+    rows = {}
+    for model in (NoteStatistics, UserStatistics):
+        columns = model.__table__.columns
+        for stats in model.query.all():
+            key = getattr(stats, columns.values()[0].name)
+            rows[(model.__tablename__, key)] = {c.name: getattr(stats, c.name) for c in columns}
+    return rows
+
+
+def exercise_write_endpoints():
+    """Fresh database, then drive every endpoint that moves a note or user counter"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    client = app.test_client()
+
+    for name in ('alice', 'bob', 'carol', 'dave', 'erin'):
+        response = client.post('/api/auth/register', json={
+            'username': name, 'email': f'{name}@example.com', 'password': 'password123'
+        })
+        assert response.status_code == 201, response.get_json()
+    with app.app_context():
+        User.query.filter_by(username='carol').update({'is_admin': True})
+        db.session.commit()
+    alice, bob, carol, dave = (login(client, f'{name}@example.com') for name in ('alice', 'bob', 'carol', 'dave'))
+
+    def create_note(headers, title):
+        # Different bytes per note, so each gets its own blob
+        response = client.post('/api/notes', headers=headers, content_type='multipart/form-data', data={
+            'title': title, 'file': (io.BytesIO(f'%PDF-1.4 {title}'.encode()), f'{title}.pdf')
+        })
+        assert response.status_code == 202, response.get_json()
+        return response.get_json()['public_id']
+
+    kept = create_note(alice, 'kept')
+    hidden = create_note(alice, 'hidden')
+    deleted = create_note(bob, 'deleted')
+    admin_deleted = create_note(alice, 'admin-deleted')
+
+    calls = [
+        ('put', f'/api/notes/{hidden}', alice, {'is_public': False}),
+        ('post', f'/api/notes/{kept}/collaborators', alice, {'username': 'bob'}),
+        ('post', f'/api/notes/{kept}/collaborators', alice, {'username': 'erin'}),
+    ]
+    for note in (kept, deleted, admin_deleted):
+        calls += [
+            ('post', f'/api/notes/{note}/comments', bob, {'content': 'Nice'}),
+            ('post', f'/api/notes/{note}/comments', dave, {'content': 'Thanks'}),
+            ('post', f'/api/notes/{note}/bookmark', dave, None),
+            ('post', f'/api/notes/{note}/bookmark', carol, None),
+            ('post', f'/api/notes/{note}/react', dave, {'reaction_type': 'concise'}),
+            ('post', f'/api/notes/{note}/react', bob, {'reaction_type': 'readable'}),
+            ('get', f'/api/notes/{note}', None, None),
+            ('get', f'/api/notes/{note}/download/original', None, None),
+        ]
+    calls += [
+        # Toggle a reaction off and remove a bookmark again
+        ('post', f'/api/notes/{kept}/react', bob, {'reaction_type': 'readable'}),
+        ('delete', f'/api/notes/{kept}/bookmark', carol, None),
+        ('post', '/api/users/alice/follow', bob, None),
+        ('post', '/api/users/alice/follow', dave, None),
+        ('post', '/api/users/bob/follow', dave, None),
+        ('post', '/api/users/bob/follow', alice, None),
+        ('post', '/api/users/alice/unfollow', bob, None),
+        ('delete', f'/api/notes/{deleted}', bob, None),
+        ('delete', f'/api/admin/notes/{admin_deleted}/delete', carol, None),
+    ]
+    for method, url, headers, body in calls:
+        response = getattr(client, method)(url, headers=headers, json=body)
+        assert response.status_code < 400, f'{method.upper()} {url}: {response.status_code}'
+
+    # Dave's comment would block deleting him, so an admin removes it first
+    dave_comment = [c['id'] for c in client.get(f'/api/notes/{kept}/comments').get_json()
+                    if c['author']['username'] == 'dave'][0]
+    response = client.delete(f'/api/admin/comments/{dave_comment}', headers=carol)
+    assert response.status_code == 200, response.get_json()
+    with app.app_context():
+        user_ids = {user.username: user.public_id for user in User.query.all()}
+    # Takes dave's follows and bookmark, and erin's collaboration, out of other rows' counters
+    for name in ('dave', 'erin'):
+        response = client.delete(f"/api/admin/users/{user_ids[name]}/delete", headers=carol)
+        assert response.status_code == 200, response.get_json()
+
+
+def test_statistics_match_rebuild():
+    exercise_write_endpoints()
+    with app.app_context():
+        maintained = stored_statistics()
+        rebuild_statistics()
+        db.session.expire_all()
+        rebuilt = stored_statistics()
+        db.session.rollback()
+    assert maintained == rebuilt
+
+
+def test_list_endpoints_within_budget():
+    counts = measure(3)
+    for url, budget in BUDGETS.items():
+        assert counts[url] <= budget, f'{url}: {counts[url]} statements, budget {budget}'
+
+
+def test_statement_count_independent_of_page_size():
+    assert measure(2) == measure(12)
+
+
+if __name__ == '__main__':
+    small, large = measure(2), measure(12)
+    print('=== SQL STATEMENTS PER REQUEST ===')
+    for url, budget in BUDGETS.items():
+        status = 'OK' if small[url] == large[url] <= budget else 'FAIL'
+        print(f'{status:4} {url}: {small[url]} (2 notes) / {large[url]} (12 notes), budget {budget}')
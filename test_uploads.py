@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Streaming note uploads: content sniffing, size limit and spooling to disk,
+against a throwaway SQLite database like test_query_counts.py.
+
+Run with `python test_uploads.py` or `pytest test_uploads.py`.
+"""
+import io
+import os
+import tempfile
+from unittest import mock
+
+_db_dir = tempfile.mkdtemp(prefix='uploads_')
+# setdefault: when pytest collects several of these scripts, the first one's database wins
+os.environ.setdefault('TEST_DATABASE_URL', f"sqlite:///{os.path.join(_db_dir, 'test.db')}")
+os.environ.setdefault('UPLOADS_ROOT', os.path.join(_db_dir, 'uploads'))
+
+from flask import request
+from app import create_app, db
+from app.models import Note, FileBlob
+from app.services.file_service import UploadSpool, get_upload_tmp_folder
+
+app = create_app('test')
+
+
+def fresh_client():
+    """Empty database with one registered user; returns (client, auth headers)"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    client = app.test_client()
+    client.post('/api/auth/register', json={
+        'username': 'owner', 'email': 'owner@example.com', 'password': 'password123'
+    })
+    response = client.post('/api/auth/login', json={'email': 'owner@example.com', 'password': 'password123'})
+    return client, {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+
+def upload(client, headers, content, filename):
+    return client.post('/api/notes', headers=headers, content_type='multipart/form-data', data={
+        'title': 'Upload', 'file': (io.BytesIO(content), filename)
+    })
+
+
+def spool_files():
+    folder = get_upload_tmp_folder()
+    return os.listdir(folder) if os.path.isdir(folder) else []
+
+
+def test_content_not_matching_extension_is_rejected():
+    client, headers = fresh_client()
+    response = upload(client, headers, b'MZ\x90\x00 a renamed executable', 'slides.pdf')
+    assert response.status_code == 415, response.status_code
+    with app.app_context():
+        assert Note.query.count() == 0
+    assert spool_files() == []
+
+
+def test_type_comes_from_content_not_extension():
+    client, headers = fresh_client()
+    response = upload(client, headers, b'%PDF-1.4 scanned', 'scan.png')
+    assert response.status_code == 202, response.get_json()
+    with app.app_context():
+        assert Note.query.one().file_path.endswith('.pdf')
+
+
+def test_oversized_upload_is_rejected_while_streaming():
+    client, headers = fresh_client()
+    limit = app.config['UPLOAD_MAX_FILE_SIZE']
+    app.config['UPLOAD_MAX_FILE_SIZE'] = 64 * 1024
+    try:
+        response = upload(client, headers, b'%PDF-1.4 ' + b'x' * 128 * 1024, 'big.pdf')
+    finally:
+        app.config['UPLOAD_MAX_FILE_SIZE'] = limit
+    assert response.status_code == 413, response.status_code
+    with app.app_context():
+        assert Note.query.count() == 0
+    assert spool_files() == []
+
+
+def test_large_upload_is_spooled_to_disk():
+    client, headers = fresh_client()
+    content = b'%PDF-1.4 ' + os.urandom(2 * 1024 * 1024)
+    spooled_sizes = []
+    claim = UploadSpool.claim
+
+    def record_spool(spool):
+        # By the time the view claims it, the whole upload is in the spool file
+        spooled_sizes.append(os.path.getsize(spool.path))
+        return claim(spool)
+
+    with mock.patch.object(UploadSpool, 'claim', autospec=True, side_effect=record_spool):
+        response = upload(client, headers, content, 'big.pdf')
+    assert response.status_code == 202, response.get_json()
+    assert spooled_sizes == [len(content)]
+    with app.app_context():
+        assert FileBlob.query.one().size == len(content)
+    assert spool_files() == []
+
+
+def test_only_note_upload_route_is_sniffed():
+    data = {'file': (io.BytesIO(b'plain text'), 'notes.txt')}
+    with app.test_request_context('/api/users', method='POST', data=data):
+        stream = request.files['file'].stream
+        assert not isinstance(stream, UploadSpool)
+        assert stream.read() == b'plain text'
+
+
+if __name__ == '__main__':
+    test_content_not_matching_extension_is_rejected()
+    test_type_comes_from_content_not_extension()
+    test_oversized_upload_is_rejected_while_streaming()
+    test_large_upload_is_spooled_to_disk()
+    test_only_note_upload_route_is_sniffed()
+    print('OK   note uploads')
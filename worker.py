@@ -0,0 +1,13 @@
+import os
+import sys
+import logging
+from app import create_app
+from app.services.ocr_queue import run_worker
+
+app = create_app(os.getenv('FLASK_CONFIG') or 'dev')
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    # `python worker.py --once` drains the queue and exits (handy for cron or tests)
+    run_worker(app, once='--once' in sys.argv[1:])